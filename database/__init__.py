@@ -1,4 +1,17 @@
+from . import aio
+from .connection import connect, get_engine, transaction
 from .database import DATABASE, init_db
+from .jobs_db import (
+    create_ingest_job,
+    delete_ingest_jobs,
+    fail_interrupted_ingest_jobs,
+    fail_worker_ingest_jobs,
+    find_completed_ingest_job,
+    get_ingest_job,
+    is_ingest_job_cancel_requested,
+    request_ingest_job_cancel,
+    update_ingest_job,
+)
 from .pdfChatbot import (
     delete_pdf_file,
     get_file_path_and_name,
@@ -6,15 +19,28 @@ from .pdfChatbot import (
     update_pdf_file,
 )
 from .vector_db import (
+    allocate_faiss_generation,
     delete_faiss_index_from_db,
+    delete_index_manifest,
     delete_pinecone_index_from_db,
+    delete_vector_ids,
+    find_index_type_db,
+    get_data_from_faiss_db,
     get_data_from_pinecone_db,
+    get_faiss_index_generation,
     get_file_from_faiss_db,
     get_index_name_type_db,
+    get_index_pdf_backend,
     get_pinecone_api_index_name_type_db,
+    get_vector_ids,
     insert_into_faiss_db,
     insert_into_file_uploads,
     insert_into_pinecone_db,
     insert_into_vector_db,
+    insert_vector_ids,
+    list_embedding_models,
+    list_faiss_artifacts,
+    publish_faiss_generation,
     set_agent_index_to_none,
+    update_file_upload,
 )
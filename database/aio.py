@@ -0,0 +1,127 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from . import jobs_db, pdfChatbot, rag_db, vector_db
+from .settings_cache import AGENT_SETTINGS_CACHE
+
+# Threads running database calls for the event loop; keep DB_POOL_SIZE above it
+DB_ASYNC_THREADS = int(os.getenv("DB_ASYNC_THREADS", "4"))
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DB_ASYNC_THREADS, thread_name_prefix="agentx-db"
+        )
+    return _executor
+
+
+async def run(fn, *args, **kwargs):
+    """
+    Runs a blocking database call on one of the database threads and returns
+    its result, so endpoints await queries instead of stalling the event
+    loop. Each call checks a connection out of the engine pool.
+    Exceptions, including HTTPException, are raised to the caller.
+
+    Usage:
+        index_type = await aio.run(get_index_name_type_db, user_id, index_name)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), functools.partial(fn, *args, **kwargs)
+    )
+
+
+def shutdown():
+    """Waits for running database calls and stops the database threads."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _reset_after_fork():
+    # The parent's threads do not exist in a forked child
+    global _executor
+    _executor = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _async(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+# multi_agent
+create_rag_db = _async(rag_db.create_rag_db)
+update_rag_db = _async(rag_db.update_rag_db)
+delete_rag_db = _async(rag_db.delete_rag_db)
+get_rag_settings = _async(rag_db.get_rag_settings)
+
+
+async def get_agent_settings(user_id: str, agent_name: str) -> dict:
+    """
+    Async get_agent_settings. Cached settings are returned on the event
+    loop; only a cache miss goes to a database thread.
+    """
+    settings = AGENT_SETTINGS_CACHE.get((user_id, agent_name))
+    if settings is not None:
+        return settings
+    return await run(rag_db.get_agent_settings, user_id, agent_name)
+
+
+# vector_db
+insert_into_vector_db = _async(vector_db.insert_into_vector_db)
+get_index_name_type_db = _async(vector_db.get_index_name_type_db)
+find_index_type_db = _async(vector_db.find_index_type_db)
+get_index_pdf_backend = _async(vector_db.get_index_pdf_backend)
+set_agent_index_to_none = _async(vector_db.set_agent_index_to_none)
+delete_from_vector_db = _async(vector_db.delete_from_vector_db)
+
+# pinecone_db
+insert_into_pinecone_db = _async(vector_db.insert_into_pinecone_db)
+get_data_from_pinecone_db = _async(vector_db.get_data_from_pinecone_db)
+get_pinecone_api_index_name_type_db = _async(
+    vector_db.get_pinecone_api_index_name_type_db
+)
+delete_pinecone_index_from_db = _async(vector_db.delete_pinecone_index_from_db)
+insert_vector_ids = _async(vector_db.insert_vector_ids)
+get_vector_ids = _async(vector_db.get_vector_ids)
+delete_vector_ids = _async(vector_db.delete_vector_ids)
+delete_index_manifest = _async(vector_db.delete_index_manifest)
+
+# faiss_db
+insert_into_faiss_db = _async(vector_db.insert_into_faiss_db)
+get_data_from_faiss_db = _async(vector_db.get_data_from_faiss_db)
+get_file_from_faiss_db = _async(vector_db.get_file_from_faiss_db)
+get_faiss_index_generation = _async(vector_db.get_faiss_index_generation)
+allocate_faiss_generation = _async(vector_db.allocate_faiss_generation)
+publish_faiss_generation = _async(vector_db.publish_faiss_generation)
+delete_faiss_index_from_db = _async(vector_db.delete_faiss_index_from_db)
+
+# file_uploads
+insert_into_file_uploads = _async(vector_db.insert_into_file_uploads)
+update_file_upload = _async(vector_db.update_file_upload)
+insert_pdf_file = _async(pdfChatbot.insert_pdf_file)
+update_pdf_file = _async(pdfChatbot.update_pdf_file)
+get_file_path_and_name = _async(pdfChatbot.get_file_path_and_name)
+delete_pdf_file = _async(pdfChatbot.delete_pdf_file)
+
+# ingest_jobs
+create_ingest_job = _async(jobs_db.create_ingest_job)
+update_ingest_job = _async(jobs_db.update_ingest_job)
+get_ingest_job = _async(jobs_db.get_ingest_job)
+find_completed_ingest_job = _async(jobs_db.find_completed_ingest_job)
+delete_ingest_jobs = _async(jobs_db.delete_ingest_jobs)
+request_ingest_job_cancel = _async(jobs_db.request_ingest_job_cancel)
+is_ingest_job_cancel_requested = _async(jobs_db.is_ingest_job_cancel_requested)
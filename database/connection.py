@@ -0,0 +1,198 @@
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+DATABASE = "agentX.db"
+
+# SQLAlchemy URL of the metadata store. Defaults to the SQLite file DATABASE;
+# point it at a networked RDBMS, e.g. postgresql+psycopg://user:pw@host/agentx,
+# to share the metadata between API hosts
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DATABASE}")
+
+# Connections kept open per process, and how many more may open under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Seconds to wait for a free pooled connection, and after which one is reopened
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Test pooled connections with a round trip before use, so connections the
+# server dropped are replaced instead of failing a request. Defaults to on for
+# networked databases and off for SQLite, whose connections cannot drop.
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING")
+
+# Compiled statements cached per engine, keyed by statement structure
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+
+# Durability of WAL commits: NORMAL syncs at checkpoints, FULL on every commit
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+# Page cache per connection in KiB, and how much of the file is read via mmap
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Seconds a connection waits for another process's write lock
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+# Prepared statements kept per SQLite connection, keyed by SQL text
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+_engine = None
+_engine_url = None
+_engine_lock = threading.Lock()
+_local = threading.local()
+# Serializes the write transactions of this process on SQLite
+_writer_lock = threading.Lock()
+
+
+def _configure_sqlite(engine: Engine):
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # Transactions are opened by _on_begin instead of the sqlite3 module
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        # Reads run in autocommit mode; writes claim the write lock up front
+        mode = conn.get_execution_options().get("sqlite_begin")
+        if mode:
+            conn.connection.driver_connection.execute(f"BEGIN {mode}")
+
+
+def _create_engine(url: str) -> Engine:
+    is_sqlite = url.startswith("sqlite")
+    connect_args = {}
+    if is_sqlite:
+        connect_args = {
+            "timeout": SQLITE_BUSY_TIMEOUT,
+            "cached_statements": SQLITE_STATEMENT_CACHE,
+            "check_same_thread": False,
+        }
+    if DB_POOL_PRE_PING is None:
+        pre_ping = not is_sqlite
+    else:
+        pre_ping = DB_POOL_PRE_PING.lower() in ("1", "true", "yes")
+    engine = create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=pre_ping,
+        query_cache_size=DB_QUERY_CACHE_SIZE,
+        connect_args=connect_args,
+    )
+    if is_sqlite:
+        _configure_sqlite(engine)
+    return engine
+
+
+def get_engine() -> Engine:
+    """
+    Returns the engine for DATABASE_URL, creating it on first use.
+
+    The engine pools connections, so pragmas and session setup run once per
+    connection and compiled statements are reused across calls.
+    """
+    global _engine, _engine_url
+    if _engine is None or _engine_url != DATABASE_URL:
+        with _engine_lock:
+            if _engine is None or _engine_url != DATABASE_URL:
+                if _engine is not None:
+                    _engine.dispose()
+                _engine = _create_engine(DATABASE_URL)
+                _engine_url = DATABASE_URL
+    return _engine
+
+
+@contextmanager
+def connect():
+    """
+    Yields a pooled connection for reads. On SQLite every statement runs in
+    autocommit mode and, with WAL, never waits for a writer. Inside a
+    transaction() block, the transaction's own connection is yielded so
+    reads see its changes.
+
+    Usage:
+        with connect() as conn:
+            conn.execute(select(...))
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+    with get_engine().connect() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the block as one write transaction on a pooled connection,
+    committing on success and rolling back on error. A transaction opened
+    inside another one on the same thread joins it.
+
+    On SQLite, write transactions of the process take turns, and BEGIN
+    IMMEDIATE claims the database write lock up front, so concurrent
+    writers queue instead of failing with "database is locked".
+
+    Usage:
+        with transaction() as conn:
+            conn.execute(insert(...))
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+
+    engine = get_engine()
+    is_sqlite = engine.dialect.name == "sqlite"
+    with _writer_lock if is_sqlite else nullcontext():
+        with engine.connect() as conn:
+            if is_sqlite:
+                conn.execution_options(sqlite_begin="IMMEDIATE")
+            _local.conn, _local.after_commit = conn, []
+            try:
+                with conn.begin():
+                    yield conn
+            finally:
+                callbacks = _local.after_commit
+                _local.conn = _local.after_commit = None
+    for callback in callbacks:
+        callback()
+
+
+def after_commit(callback):
+    """
+    Runs ``callback`` once the current write transaction commits, or right
+    away outside one. Rolled back transactions drop their callbacks.
+    """
+    callbacks = getattr(_local, "after_commit", None)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+def _reset_after_fork():
+    # A forked child must not reuse its parent's connections or lock state
+    global _local, _writer_lock, _engine_lock
+    _local = threading.local()
+    _writer_lock = threading.Lock()
+    _engine_lock = threading.Lock()
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
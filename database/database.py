@@ -1,86 +1,79 @@
-import sqlite3
+from sqlalchemy import inspect, text
 
-DATABASE = "agentX.db"
+from .connection import DATABASE, get_engine, transaction
+from .tables import metadata, multi_agent
 
 
-def init_db():
-    """Initialize the SQLite database."""
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
+def _add_column_if_missing(conn, table: str, column: str, definition: str):
+    """Add a column to an existing table created by an older schema."""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
 
-        # Create the table for vector DB configurations
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS vector_db (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            index_name TEXT NOT NULL,
-            db_type TEXT NOT NULL CHECK(db_type IN ('Pinecone', 'FAISS')), -- Specify DB type
-            UNIQUE(user_id, index_name) -- Composite unique constraint
-        )"""
-        )
 
-        # Table for Pinecone-specific configuration details
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS pinecone_db (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pinecone_api_key TEXT,
-            metric TEXT,
-            cloud TEXT,
-            region TEXT,
-            dimension INTEGER,
-            embedding TEXT NOT NULL,
-            index_name TEXT NOT NULL,  -- Foreign key for Pinecone index configuration
-            user_id TEXT NOT NULL,  -- Foreign key for user to associate with vector DB
-            FOREIGN KEY (index_name, user_id) REFERENCES vector_db(index_name, user_id) ON DELETE CASCADE
-        )"""
-        )
+def _drop_multi_agent_user_foreign_key(engine):
+    """
+    Rebuilds multi_agent without its foreign key on vector_db(user_id).
+    That column is not unique in vector_db, so with foreign keys enforced
+    SQLite rejects every write to either table. Only SQLite databases made
+    by older schemas have it.
+    """
+    if engine.dialect.name != "sqlite":
+        return
 
-        # Table for Faiss-specific configuration details
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS faiss_db (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            file_name TEXT,
-            file_path TEXT,
-            embedding TEXT NOT NULL,
-            index_name TEXT NOT NULL,  -- Foreign key for Faiss index configuration
-            user_id TEXT NOT NULL,  -- Foreign key for user to associate with vector DB
-            FOREIGN KEY (index_name, user_id) REFERENCES vector_db(index_name, user_id) ON DELETE CASCADE
-        )"""
-        )
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table("multi_agent"):
+            return
+        if not any(
+            fk["referred_table"] == "vector_db"
+            and fk["constrained_columns"] == ["user_id"]
+            for fk in inspector.get_foreign_keys("multi_agent")
+        ):
+            return
 
-        # Table for the multi-agent configurations
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS multi_agent (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            agent_name TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            index_name TEXT, -- Allowing NULL values here
-            llm_provider TEXT NOT NULL,
-            llm_model_name TEXT NOT NULL,
-            llm_api_key TEXT NOT NULL,
-            prompt_template TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES vector_db(user_id) ON DELETE CASCADE -- Ensures cascade delete
-        )"""
-        )
+        columns = ", ".join(c["name"] for c in inspector.get_columns("multi_agent"))
+        # Foreign keys can only be switched off outside a transaction
+        conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+        conn.commit()
+        try:
+            conn.execution_options(sqlite_begin="IMMEDIATE")
+            with conn.begin():
+                conn.exec_driver_sql("DROP INDEX IF EXISTS idx_multi_agent_user_agent")
+                conn.exec_driver_sql("ALTER TABLE multi_agent RENAME TO multi_agent_old")
+                multi_agent.create(conn)
+                conn.exec_driver_sql(
+                    f"INSERT INTO multi_agent ({columns}) "
+                    f"SELECT {columns} FROM multi_agent_old"
+                )
+                conn.exec_driver_sql("DROP TABLE multi_agent_old")
+        finally:
+            conn.execution_options(sqlite_begin=None)
+            conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+            conn.commit()
 
-        # Table to store file uploads
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS file_uploads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            index_name TEXT NOT NULL,
-            file_name TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (index_name, user_id) REFERENCES vector_db(index_name, user_id) ON DELETE CASCADE, 
-            UNIQUE(user_id, index_name) -- Composite unique constraint
+
+def init_db():
+    """Create the metadata tables and bring older schemas up to date."""
+    # Foreign keys of tables made by older schemas can only change by a rebuild
+    _drop_multi_agent_user_foreign_key(get_engine())
+
+    with transaction() as conn:
+        metadata.create_all(conn)
+
+        # Columns added after the first release of each table
+        _add_column_if_missing(conn, "ingest_jobs", "content_hash", "TEXT")
+        _add_column_if_missing(conn, "ingest_jobs", "report", "TEXT")
+        _add_column_if_missing(conn, "ingest_jobs", "worker", "TEXT")
+        _add_column_if_missing(conn, "vector_db", "pdf_backend", "TEXT")
+        _add_column_if_missing(conn, "faiss_db", "index_path", "TEXT")
+        _add_column_if_missing(
+            conn, "faiss_db", "generation", "INTEGER NOT NULL DEFAULT 0"
         )
-        """
+        _add_column_if_missing(
+            conn, "faiss_db", "last_generation", "INTEGER NOT NULL DEFAULT 0"
         )
 
-        conn.commit()
+        # create_all only indexes the tables it creates
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -0,0 +1,303 @@
+import os
+import socket
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from .connection import connect, transaction
+from .tables import ingest_jobs
+
+# Columns a worker may update while a job runs
+JOB_FIELDS = {
+    "status",
+    "stage",
+    "chunks_total",
+    "chunks_embedded",
+    "chunks_upserted",
+    "error",
+    "report",
+    "started_at",
+    "finished_at",
+}
+
+# Statements are built once, so progress updates only bind their parameters
+_INSERT_JOB = insert(ingest_jobs)
+_SELECT_JOB = select(ingest_jobs).where(ingest_jobs.c.id == bindparam("job_id"))
+# Sets the columns given as parameters besides job_id
+_UPDATE_JOB = update(ingest_jobs).where(ingest_jobs.c.id == bindparam("job_id"))
+_REQUEST_CANCEL = (
+    update(ingest_jobs)
+    .where(
+        ingest_jobs.c.id == bindparam("job_id"),
+        ingest_jobs.c.status.in_(("queued", "running")),
+    )
+    .values(cancel_requested=1)
+)
+_SELECT_CANCEL_REQUESTED = select(ingest_jobs.c.cancel_requested).where(
+    ingest_jobs.c.id == bindparam("job_id")
+)
+# The last job that ingested a file; only its content is in the index now
+_SELECT_LATEST_COMPLETED_JOB = (
+    select(ingest_jobs.c.id, ingest_jobs.c.content_hash)
+    .where(
+        ingest_jobs.c.user_id == bindparam("user_id"),
+        ingest_jobs.c.index_name == bindparam("index_name"),
+        ingest_jobs.c.file_name == bindparam("file_name"),
+        ingest_jobs.c.status == "completed",
+    )
+    .order_by(ingest_jobs.c.finished_at.desc())
+    .limit(1)
+)
+# Finished jobs of an index, or of one file of it; running jobs keep their rows
+_DELETE_FINISHED_JOBS = delete(ingest_jobs).where(
+    ingest_jobs.c.user_id == bindparam("user_id"),
+    ingest_jobs.c.index_name == bindparam("index_name"),
+    ingest_jobs.c.status.not_in(("queued", "running")),
+)
+_DELETE_FINISHED_FILE_JOBS = _DELETE_FINISHED_JOBS.where(
+    ingest_jobs.c.file_name == bindparam("file_name")
+)
+_FAIL_WORKER_JOBS = (
+    update(ingest_jobs)
+    .where(
+        ingest_jobs.c.worker == bindparam("worker_id"),
+        ingest_jobs.c.status.in_(("queued", "running")),
+    )
+    .values(status="failed", error="Interrupted: the worker process exited.")
+)
+
+# Unfinished jobs of the workers of one host, to check which are gone
+_SELECT_HOST_UNFINISHED_JOBS = select(ingest_jobs.c.id, ingest_jobs.c.worker).where(
+    ingest_jobs.c.worker.like(bindparam("worker_prefix")),
+    ingest_jobs.c.status.in_(("queued", "running")),
+)
+_FAIL_INTERRUPTED_JOBS = (
+    update(ingest_jobs)
+    .where(
+        ingest_jobs.c.id.in_(bindparam("job_ids", expanding=True)),
+        ingest_jobs.c.status.in_(("queued", "running")),
+    )
+    .values(status="failed", error="Interrupted by server restart.")
+)
+
+
+def worker_id(pid: int = None) -> str:
+    """
+    Returns the ``host:pid`` a job records for the process running it, by
+    default the current one.
+    """
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def create_ingest_job(
+    user_id: str, index_name: str, file_name: str, content_hash: str = None
+) -> str:
+    """
+    Creates a queued ingestion job and returns its ID.
+    """
+    job_id = uuid.uuid4().hex
+    try:
+        with transaction() as conn:
+            conn.execute(
+                _INSERT_JOB,
+                {
+                    "id": job_id,
+                    "user_id": user_id,
+                    "index_name": index_name,
+                    "file_name": file_name,
+                    "content_hash": content_hash,
+                    "worker": worker_id(),
+                    "status": "queued",
+                    "stage": "queued",
+                    "created_at": time.time(),
+                },
+            )
+        return job_id
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while creating ingestion job: {str(db_error)}",
+        )
+
+
+def update_ingest_job(job_id: str, **fields):
+    """
+    Updates the given columns of an ingestion job.
+    """
+    unknown = set(fields) - JOB_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown ingestion job fields: {sorted(unknown)}")
+    if not fields:
+        return
+
+    try:
+        with transaction() as conn:
+            conn.execute(_UPDATE_JOB, {**fields, "job_id": job_id})
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while updating ingestion job: {str(db_error)}",
+        )
+
+
+def get_ingest_job(job_id: str):
+    """
+    Returns an ingestion job as a dictionary, or None if it does not exist.
+    """
+    try:
+        with connect() as conn:
+            row = conn.execute(_SELECT_JOB, {"job_id": job_id}).mappings().first()
+            return dict(row) if row else None
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching ingestion job: {str(db_error)}",
+        )
+
+
+def find_completed_ingest_job(
+    user_id: str, index_name: str, file_name: str, content_hash: str
+):
+    """
+    Returns the ID of the latest completed job for the same file if it
+    ingested the same content, or None. Older jobs are not considered, since
+    a later upload of the file replaced what they ingested.
+    """
+    try:
+        with connect() as conn:
+            row = conn.execute(
+                _SELECT_LATEST_COMPLETED_JOB,
+                {
+                    "user_id": user_id,
+                    "index_name": index_name,
+                    "file_name": file_name,
+                },
+            ).first()
+            if row is None or row.content_hash != content_hash:
+                return None
+            return row.id
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching ingestion job: {str(db_error)}",
+        )
+
+
+def delete_ingest_jobs(user_id: str, index_name: str, file_name: str = None):
+    """
+    Forgets the finished jobs of an index, or of one of its files, so
+    uploads after the index or file was deleted are ingested again.
+    """
+    params = {"user_id": user_id, "index_name": index_name}
+    try:
+        with transaction() as conn:
+            if file_name is None:
+                conn.execute(_DELETE_FINISHED_JOBS, params)
+            else:
+                conn.execute(
+                    _DELETE_FINISHED_FILE_JOBS, {**params, "file_name": file_name}
+                )
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while deleting ingestion jobs: {str(db_error)}",
+        )
+
+
+def request_ingest_job_cancel(job_id: str) -> bool:
+    """
+    Flags a queued or running job for cancellation.
+
+    Returns False if the job does not exist or has already finished.
+    """
+    try:
+        with transaction() as conn:
+            result = conn.execute(_REQUEST_CANCEL, {"job_id": job_id})
+            return result.rowcount > 0
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while cancelling ingestion job: {str(db_error)}",
+        )
+
+
+def is_ingest_job_cancel_requested(job_id: str) -> bool:
+    try:
+        with connect() as conn:
+            return bool(
+                conn.execute(_SELECT_CANCEL_REQUESTED, {"job_id": job_id}).scalar()
+            )
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching ingestion job: {str(db_error)}",
+        )
+
+
+def fail_worker_ingest_jobs(pid: int) -> int:
+    """
+    Marks the queued and running jobs of an exited worker process on this
+    host as failed, since they died with it.
+
+    Returns the number of jobs failed.
+    """
+    try:
+        with transaction() as conn:
+            result = conn.execute(
+                _FAIL_WORKER_JOBS,
+                {"worker_id": worker_id(pid), "finished_at": time.time()},
+            )
+            return result.rowcount
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while failing ingestion jobs: {str(db_error)}",
+        )
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The PID was reused by a process of another user
+        pass
+    return True
+
+
+def fail_interrupted_ingest_jobs() -> int:
+    """
+    Marks jobs left queued or running by processes of this host that have
+    exited as failed. Jobs of live workers, and of other hosts sharing the
+    database, are left alone.
+
+    Returns the number of jobs failed.
+    """
+    host = socket.gethostname()
+    try:
+        with transaction() as conn:
+            rows = conn.execute(
+                _SELECT_HOST_UNFINISHED_JOBS, {"worker_prefix": f"{host}:%"}
+            ).all()
+            dead = []
+            for row in rows:
+                # LIKE treats "_" in a host name as a wildcard
+                worker_host, pid = row.worker.rsplit(":", 1)
+                if worker_host == host and not _is_running(int(pid)):
+                    dead.append(row.id)
+            if not dead:
+                return 0
+            result = conn.execute(
+                _FAIL_INTERRUPTED_JOBS,
+                {"job_ids": dead, "finished_at": time.time()},
+            )
+            return result.rowcount
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while failing ingestion jobs: {str(db_error)}",
+        )
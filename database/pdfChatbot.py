@@ -1,12 +1,23 @@
 import os
-import sqlite3
 
 from fastapi import HTTPException
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
 
-from .database import DATABASE
+from .connection import connect, transaction
+from .tables import faiss_db, file_uploads, index_key, of_index
 
 MEDIA_FOLDER = "./media"
 
+_INSERT_FILE_UPLOAD = insert(file_uploads)
+_DELETE_FILE_UPLOAD = delete(file_uploads).where(of_index(file_uploads))
+_SELECT_FAISS_FILE = select(faiss_db.c.file_path).where(of_index(faiss_db))
+_UPDATE_FAISS_FILE = (
+    update(faiss_db)
+    .where(of_index(faiss_db))
+    .values(file_path=bindparam("new_file_path"), file_name=bindparam("new_file_name"))
+)
+
 
 def insert_pdf_file(user_id: str, index_name: str, file_name: str, file_path: str):
     """
@@ -19,31 +30,31 @@ def insert_pdf_file(user_id: str, index_name: str, file_name: str, file_path: st
                 status_code=400, detail="Invalid input. All parameters are required."
             )
 
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO file_uploads (user_id, index_name, file_name, file_path)
-                VALUES (?, ?, ?, ?)
-            """,
-                (user_id, index_name, file_name, file_path),
+        with transaction() as conn:
+            conn.execute(
+                _INSERT_FILE_UPLOAD,
+                {
+                    "user_id": user_id,
+                    "index_name": index_name,
+                    "file_name": file_name,
+                    "file_path": file_path,
+                },
             )
-            conn.commit()
 
         return True
 
-    except sqlite3.IntegrityError:
+    except IntegrityError:
         raise HTTPException(
             status_code=409,
             detail="File already exists or index/user combination is not unique.",
         )
 
-    except sqlite3.OperationalError as e:
+    except OperationalError as e:
         raise HTTPException(
             status_code=400, detail=f"Database operation failed: {str(e)}"
         )
 
-    except sqlite3.Error as e:
+    except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, detail=f"Unexpected database error: {str(e)}"
         )
@@ -82,18 +93,11 @@ def update_pdf_file(user_id: str, index_name: str, file_name: str, file_path: st
         new_file_dest = os.path.join(MEDIA_FOLDER, new_file_name)
 
         # Update the database with the new file path
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
+        with transaction() as conn:
             # Check if the file exists in the database before updating
-            cursor.execute(
-                """
-                SELECT * FROM faiss_db WHERE user_id = ? AND index_name = ?
-            """,
-                (user_id, index_name),
-            )
-
-            file_record = cursor.fetchone()
+            file_record = conn.execute(
+                _SELECT_FAISS_FILE, index_key(user_id, index_name)
+            ).first()
 
             if not file_record:
                 raise HTTPException(
@@ -110,25 +114,24 @@ def update_pdf_file(user_id: str, index_name: str, file_name: str, file_path: st
             # conn.commit()
             # #  with sqlite3.connect(DATABASE) as conn:
             # cursor = conn.cursor()
-            cursor.execute(
-                """
-                UPDATE faiss_db
-                SET file_path = ?, file_name = ?
-                WHERE user_id = ? AND index_name = ?
-            """,
-                (new_file_dest, file_name, user_id, index_name),
+            conn.execute(
+                _UPDATE_FAISS_FILE,
+                {
+                    **index_key(user_id, index_name),
+                    "new_file_path": new_file_dest,
+                    "new_file_name": file_name,
+                },
             )
-            conn.commit()
 
         return True
 
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=f"File operation failed: {str(e)}")
-    except sqlite3.OperationalError as e:
+    except OperationalError as e:
         raise HTTPException(
             status_code=400, detail=f"Database operation failed: {str(e)}"
         )
-    except sqlite3.Error as e:
+    except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, detail=f"Unexpected database error: {str(e)}"
         )
@@ -141,17 +144,10 @@ def get_file_path_and_name(user_id: str, index_name: str):
     Retrieves the file path for all files uploaded by a specific user and index name.
     """
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT file_path
-                FROM faiss_db
-                WHERE user_id = ? AND index_name = ?
-            """,
-                (user_id, index_name),
-            )
-            results = cursor.fetchone()
+        with connect() as conn:
+            results = conn.execute(
+                _SELECT_FAISS_FILE, index_key(user_id, index_name)
+            ).first()
 
             if not results:
                 raise HTTPException(
@@ -163,7 +159,7 @@ def get_file_path_and_name(user_id: str, index_name: str):
             # return [result[0] for result in results]
             return results[0]  # Return only the file path
 
-    except sqlite3.Error as e:
+    except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, detail=f"Unexpected database error: {str(e)}"
         )
@@ -201,18 +197,13 @@ def delete_pdf_file(user_id: str, index_name: str):
             )
 
         # Delete the record from the database
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                DELETE FROM file_uploads WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
+        with transaction() as conn:
+            result = conn.execute(
+                _DELETE_FILE_UPLOAD, index_key(user_id, index_name)
             )
-            conn.commit()
 
             # Check if any record was deleted
-            if cursor.rowcount == 0:
+            if result.rowcount == 0:
                 raise HTTPException(
                     status_code=404,
                     detail="No file found for the given user and index.",
@@ -220,11 +211,11 @@ def delete_pdf_file(user_id: str, index_name: str):
 
         return True
 
-    except sqlite3.OperationalError as e:
+    except OperationalError as e:
         raise HTTPException(
             status_code=400, detail=f"Database operation failed: {str(e)}"
         )
-    except sqlite3.Error as e:
+    except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, detail=f"Unexpected database error: {str(e)}"
         )
@@ -1,10 +1,29 @@
-import sqlite3
-
-from database import get_index_name_type_db
 from fastapi import HTTPException
 from schemas.agent_schemas import CreateAgentRequest, DeleteAgent, UpdateAgentRequest
+from sqlalchemy import and_, bindparam, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .connection import connect, transaction
+from .settings_cache import AGENT_SETTINGS_CACHE, invalidate_agent_settings
+from .tables import faiss_db, multi_agent, pinecone_db, vector_db
+
+
+def _of_agent():
+    return and_(
+        multi_agent.c.user_id == bindparam("key_user_id"),
+        multi_agent.c.agent_name == bindparam("key_agent_name"),
+    )
 
-from .database import DATABASE
+
+def _agent_key(user_id: str, agent_name: str) -> dict:
+    return {"key_user_id": user_id, "key_agent_name": agent_name}
+
+
+_INSERT_AGENT = insert(multi_agent)
+_SELECT_AGENT = select(multi_agent.c.id).where(_of_agent()).limit(1)
+# Sets the columns given as parameters besides the agent key
+_UPDATE_AGENT = update(multi_agent).where(_of_agent())
+_DELETE_AGENT = delete(multi_agent).where(_of_agent())
 
 
 def create_rag_db(request: CreateAgentRequest):
@@ -12,28 +31,22 @@ def create_rag_db(request: CreateAgentRequest):
     Create a new Agent entry in the database.
     """
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO multi_agent (
-                    agent_name, user_id, index_name,
-                    llm_provider, llm_model_name, llm_api_key, prompt_template
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    request.agent_name,
-                    request.user_id,
-                    request.index_name,
-                    request.llm_provider,
-                    request.llm_model_name,
-                    request.llm_api_key,
-                    request.prompt_template,
-                ),
+        with transaction() as conn:
+            conn.execute(
+                _INSERT_AGENT,
+                {
+                    "agent_name": request.agent_name,
+                    "user_id": request.user_id,
+                    "index_name": request.index_name,
+                    "llm_provider": request.llm_provider,
+                    "llm_model_name": request.llm_model_name,
+                    "llm_api_key": request.llm_api_key,
+                    "prompt_template": request.prompt_template,
+                },
             )
-            conn.commit()
+            invalidate_agent_settings(request.user_id)
         return f"Agent settings for index '{request.index_name}' created successfully."
-    except sqlite3.IntegrityError:
+    except IntegrityError:
         raise HTTPException(
             status_code=400,
             detail=f"Agent settings for index '{request.index_name}' already exist.",
@@ -45,50 +58,37 @@ def update_rag_db(request: UpdateAgentRequest):
     Update existing Agent settings in the database.
     """
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
-            update_fields = []
-            update_values = []
+        with transaction() as conn:
+            update_fields = {}
 
             if request.index_name:
-                update_fields.append("index_name = ?")
-                update_values.append(request.index_name)
+                update_fields["index_name"] = request.index_name
             if request.llm_provider:
-                update_fields.append("llm_provider = ?")
-                update_values.append(request.llm_provider)
+                update_fields["llm_provider"] = request.llm_provider
             if request.llm_model_name:
-                update_fields.append("llm_model_name = ?")
-                update_values.append(request.llm_model_name)
+                update_fields["llm_model_name"] = request.llm_model_name
             if request.llm_api_key:
-                update_fields.append("llm_api_key = ?")
-                update_values.append(request.llm_api_key)
+                update_fields["llm_api_key"] = request.llm_api_key
             if request.prompt_template:
-                update_fields.append("prompt_template = ?")
-                update_values.append(request.prompt_template)
+                update_fields["prompt_template"] = request.prompt_template
 
             if not update_fields:
                 raise HTTPException(
                     status_code=400, detail="No fields to update were provided."
                 )
 
-            update_values.extend([request.user_id, request.agent_name])
-
-            update_query = f"""
-                UPDATE multi_agent
-                SET {', '.join(update_fields)}
-                WHERE user_id = ? AND agent_name = ?
-            """
-
-            cursor.execute(update_query, tuple(update_values))
+            result = conn.execute(
+                _UPDATE_AGENT,
+                {**update_fields, **_agent_key(request.user_id, request.agent_name)},
+            )
 
-            if cursor.rowcount == 0:
+            if result.rowcount == 0:
                 raise HTTPException(
                     status_code=404,
                     detail=f"No Agent settings found for user_id '{request.user_id}' and index_name '{request.index_name}'.",
                 )
+            invalidate_agent_settings(request.user_id)
 
-            conn.commit()
         return f"Agent settings for index '{request.index_name}' updated successfully."
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -99,83 +99,129 @@ def delete_rag_db(request: DeleteAgent):
     Delete Agent settings from the database, checking if the record exists.
     """
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
+        with transaction() as conn:
             # Check if the agent settings exist
-            cursor.execute(
-                """
-                SELECT 1 FROM multi_agent WHERE user_id = ? AND agent_name = ? LIMIT 1
-                """,
-                (request.user_id, request.agent_name),
-            )
-            result = cursor.fetchone()
+            result = conn.execute(
+                _SELECT_AGENT, _agent_key(request.user_id, request.agent_name)
+            ).first()
 
             if not result:
                 # If no record is found, return a message with 404 status code
                 return {"message": f"Agent '{request.agent_name}' not found for user '{request.user_id}'"}, 404
 
             # If record exists, proceed with deletion
-            cursor.execute(
-                """
-                DELETE FROM multi_agent WHERE user_id = ? AND agent_name = ?
-                """,
-                (request.user_id, request.agent_name),
+            conn.execute(
+                _DELETE_AGENT, _agent_key(request.user_id, request.agent_name)
             )
-            conn.commit()
+            invalidate_agent_settings(request.user_id)
 
         return {"message": f"Agent settings for index '{request.agent_name}' deleted successfully."}, 200
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Agent settings with the type, embedding model and Pinecone key of the
+# agent's index, resolved in one statement
+_AGENT_SETTINGS_QUERY = (
+    select(
+        multi_agent.c.agent_name,
+        multi_agent.c.index_name,
+        multi_agent.c.llm_provider,
+        multi_agent.c.llm_model_name,
+        multi_agent.c.llm_api_key,
+        multi_agent.c.prompt_template,
+        vector_db.c.db_type,
+        func.coalesce(pinecone_db.c.embedding, faiss_db.c.embedding).label(
+            "embedding"
+        ),
+        pinecone_db.c.pinecone_api_key,
+        vector_db.c.pdf_backend,
+    )
+    .select_from(
+        multi_agent.outerjoin(
+            vector_db,
+            and_(
+                vector_db.c.user_id == multi_agent.c.user_id,
+                vector_db.c.index_name == multi_agent.c.index_name,
+            ),
+        )
+        .outerjoin(
+            pinecone_db,
+            and_(
+                vector_db.c.db_type == "Pinecone",
+                pinecone_db.c.user_id == multi_agent.c.user_id,
+                pinecone_db.c.index_name == multi_agent.c.index_name,
+            ),
+        )
+        .outerjoin(
+            faiss_db,
+            and_(
+                vector_db.c.db_type == "FAISS",
+                faiss_db.c.user_id == multi_agent.c.user_id,
+                faiss_db.c.index_name == multi_agent.c.index_name,
+            ),
+        )
+    )
+    .where(_of_agent())
+    .limit(1)
+)
+
 
-def get_rag_settings(user_id: str, agent_name: str):
+def get_agent_settings(user_id: str, agent_name: str) -> dict:
     """
-    Retrieves Agent settings from the database based on user_id.
+    Returns an agent's settings together with its index's ``db_type``,
+    ``embedding``, ``pinecone_api_key`` and ``pdf_backend``.
+
+    Settings are served from an in-process cache that the agent and index
+    write paths invalidate, so repeated questions to an agent do not touch
+    the database.
+
+    Raises:
+    - HTTPException: 404 if the agent does not exist.
     """
+    key = (user_id, agent_name)
+    settings = AGENT_SETTINGS_CACHE.get(key)
+    if settings is not None:
+        return settings
+
+    version = AGENT_SETTINGS_CACHE.version
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
-            # Step 1: Fetch agent details
-            cursor.execute(
-                """
-                SELECT agent_name, index_name, llm_provider,
-                       llm_model_name, llm_api_key, prompt_template
-                FROM multi_agent WHERE user_id = ? AND agent_name = ?
-                """,
-                (user_id, agent_name),
+        with connect() as conn:
+            row = (
+                conn.execute(_AGENT_SETTINGS_QUERY, _agent_key(user_id, agent_name))
+                .mappings()
+                .first()
             )
-            print(user_id, agent_name)
-            result = cursor.fetchone()
-            # if not result:
-            #     raise Exception("Agent not found")
-            print("\n\n\n",result[1])
-            if not result:
-                raise Exception("No Agent Found")
-            index_type = get_index_name_type_db(user_id, result[1])
-            print("index type",index_type)
-            if not index_type:
-                raise Exception("Database type not found")
-
-            # Step 3: Determine the database type (Pinecone or FAISS)
-            database_final = "pinecone_db" if index_type == "Pinecone" else "faiss_db"
-
-            # Step 4: Select embedding based on the database type
-            # Dynamic SQL query to select embeddings from the appropriate table
-            query = f"""
-                SELECT embedding FROM {database_final} WHERE user_id = ? AND index_name = ?
-            """
-            cursor.execute(query, (user_id, result[1]))
-            embedding = cursor.fetchone()
-
-            # If embeddings are found, include it in the result
-            if embedding:
-                result = result + (embedding[0],)  # Append the embedding to the result
-
-            return result
-    except sqlite3.Error as e:
+    except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    # except sqlite3.Error as e:
-    #     raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if row is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No Agent '{agent_name}' found for user_id '{user_id}'.",
+        )
+    settings = dict(row)
+    AGENT_SETTINGS_CACHE.put(key, settings, version)
+    return settings
+
+
+def get_rag_settings(user_id: str, agent_name: str):
+    """
+    Retrieves Agent settings from the database based on user_id.
+    """
+    settings = get_agent_settings(user_id, agent_name)
+    if not settings["db_type"]:
+        raise HTTPException(status_code=500, detail="Database type not found")
+
+    result = (
+        settings["agent_name"],
+        settings["index_name"],
+        settings["llm_provider"],
+        settings["llm_model_name"],
+        settings["llm_api_key"],
+        settings["prompt_template"],
+    )
+    # If embeddings are found, include it in the result
+    if settings["embedding"]:
+        result = result + (settings["embedding"],)
+    return result
@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from functools import partial
+
+from .connection import after_commit
+
+# Seconds an agent's resolved settings are served from memory. Changes made
+# by this process invalidate them at once; the TTL bounds how long other
+# worker processes can serve settings that were changed elsewhere.
+AGENT_SETTINGS_TTL = float(os.getenv("AGENT_SETTINGS_TTL", "30"))
+
+
+class SettingsCache:
+    """
+    In-process read-through cache of resolved agent settings, keyed by
+    ``(user_id, agent_name)``.
+
+    A lookup records the cache version before reading the database and only
+    stores its result if no invalidation happened meanwhile, so a read that
+    raced a write never caches the old row.
+    """
+
+    def __init__(self, ttl: float = AGENT_SETTINGS_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def put(self, key, value, version: int):
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id: str = None):
+        """Drops the cached settings of one user, or of everyone."""
+        with self._lock:
+            self._version += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == user_id]:
+                    del self._entries[key]
+
+
+AGENT_SETTINGS_CACHE = SettingsCache()
+
+
+def invalidate_agent_settings(user_id: str = None):
+    """
+    Drops a user's cached agent settings once the current write transaction
+    commits. Call it from every write that changes an agent or its index.
+    """
+    after_commit(partial(AGENT_SETTINGS_CACHE.invalidate, user_id))
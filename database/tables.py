@@ -0,0 +1,208 @@
+from functools import lru_cache
+
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    DateTime,
+    Float,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    and_,
+    bindparam,
+    func,
+    insert,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+
+metadata = MetaData()
+
+# Length of names and IDs that take part in keys and indexes
+KEY_LENGTH = 255
+
+
+def _index_foreign_key():
+    # Rows of an index's tables go with its vector_db entry
+    return ForeignKeyConstraint(
+        ["index_name", "user_id"],
+        ["vector_db.index_name", "vector_db.user_id"],
+        ondelete="CASCADE",
+    )
+
+
+# Vector DB configurations, one per index of a user
+vector_db = Table(
+    "vector_db",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", String(KEY_LENGTH), nullable=False),
+    Column("index_name", String(KEY_LENGTH), nullable=False),
+    Column("db_type", String(16), nullable=False),
+    # PDF extraction engine chosen for an index; NULL uses the deployment default
+    Column("pdf_backend", String(64)),
+    CheckConstraint("db_type IN ('Pinecone', 'FAISS')"),
+    UniqueConstraint("user_id", "index_name"),
+    sqlite_autoincrement=True,
+)
+
+# Pinecone-specific configuration details
+pinecone_db = Table(
+    "pinecone_db",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("pinecone_api_key", Text),
+    Column("metric", String(64)),
+    Column("cloud", String(64)),
+    Column("region", String(64)),
+    Column("dimension", Integer),
+    Column("embedding", String(KEY_LENGTH), nullable=False),
+    Column("index_name", String(KEY_LENGTH), nullable=False),
+    Column("user_id", String(KEY_LENGTH), nullable=False),
+    _index_foreign_key(),
+    Index("idx_pinecone_db_user_index", "user_id", "index_name"),
+    sqlite_autoincrement=True,
+)
+
+# FAISS-specific configuration details
+faiss_db = Table(
+    "faiss_db",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("file_name", Text),
+    Column("file_path", Text),
+    Column("embedding", String(KEY_LENGTH), nullable=False),
+    Column("index_name", String(KEY_LENGTH), nullable=False),
+    Column("user_id", String(KEY_LENGTH), nullable=False),
+    # Folder of a prebuilt FAISS index artifact; NULL rebuilds from file_path
+    Column("index_path", Text),
+    # Generation served from index_path, and the last generation handed to a build
+    Column("generation", Integer, nullable=False, server_default="0"),
+    Column("last_generation", Integer, nullable=False, server_default="0"),
+    _index_foreign_key(),
+    Index("idx_faiss_db_user_index", "user_id", "index_name"),
+    sqlite_autoincrement=True,
+)
+
+# Agents belong to a user and optionally point at one of the user's indexes.
+# Agents are looked up by (user_id, agent_name) and joined to their index's
+# configuration by (user_id, index_name).
+multi_agent = Table(
+    "multi_agent",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("agent_name", String(KEY_LENGTH), nullable=False),
+    Column("user_id", String(KEY_LENGTH), nullable=False),
+    Column("index_name", String(KEY_LENGTH)),
+    Column("llm_provider", String(64), nullable=False),
+    Column("llm_model_name", String(KEY_LENGTH), nullable=False),
+    Column("llm_api_key", Text, nullable=False),
+    Column("prompt_template", Text, nullable=False),
+    Index("idx_multi_agent_user_agent", "user_id", "agent_name"),
+    sqlite_autoincrement=True,
+)
+
+# Uploaded source file of a FAISS index
+file_uploads = Table(
+    "file_uploads",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", String(KEY_LENGTH), nullable=False),
+    Column("index_name", String(KEY_LENGTH), nullable=False),
+    Column("file_name", Text, nullable=False),
+    Column("file_path", Text, nullable=False),
+    Column("uploaded_at", DateTime, server_default=func.current_timestamp()),
+    _index_foreign_key(),
+    UniqueConstraint("user_id", "index_name"),
+    sqlite_autoincrement=True,
+)
+
+# Vector IDs written for each source file of a Pinecone index
+vector_manifest = Table(
+    "vector_manifest",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", String(KEY_LENGTH), nullable=False),
+    Column("index_name", String(KEY_LENGTH), nullable=False),
+    # Stable hash of (user_id, index_name, file_name)
+    Column("file_id", String(64), nullable=False),
+    Column("file_name", Text, nullable=False),
+    Column("vector_id", String(KEY_LENGTH), nullable=False),
+    _index_foreign_key(),
+    UniqueConstraint("user_id", "index_name", "vector_id"),
+    Index("idx_vector_manifest_file", "user_id", "index_name", "file_id"),
+    sqlite_autoincrement=True,
+)
+
+# Background ingestion jobs
+ingest_jobs = Table(
+    "ingest_jobs",
+    metadata,
+    Column("id", String(32), primary_key=True),
+    Column("user_id", String(KEY_LENGTH), nullable=False),
+    Column("index_name", String(KEY_LENGTH), nullable=False),
+    Column("file_name", Text),
+    Column("status", String(16), nullable=False),
+    Column("stage", String(32)),
+    Column("chunks_total", Integer, nullable=False, server_default="0"),
+    Column("chunks_embedded", Integer, nullable=False, server_default="0"),
+    Column("chunks_upserted", Integer, nullable=False, server_default="0"),
+    Column("error", Text),
+    Column("cancel_requested", Integer, nullable=False, server_default="0"),
+    # Unix timestamps, used for throughput
+    Column("created_at", Float, nullable=False),
+    Column("started_at", Float),
+    Column("finished_at", Float),
+    Column("content_hash", String(64)),
+    # JSON report of bulk jobs
+    Column("report", Text),
+    # "host:pid" of the worker process running the job
+    Column("worker", String(128)),
+    CheckConstraint(
+        "status IN ('queued', 'running', 'completed', 'failed', 'cancelled')"
+    ),
+)
+
+
+def of_index(table: Table):
+    """
+    Filters ``table`` to one index of a user. Statements built with it are
+    bound with index_key() when executed.
+    """
+    return and_(
+        table.c.user_id == bindparam("key_user_id"),
+        table.c.index_name == bindparam("key_index_name"),
+    )
+
+
+def index_key(user_id: str, index_name: str) -> dict:
+    """Parameters of an of_index() filter."""
+    return {"key_user_id": user_id, "key_index_name": index_name}
+
+
+def insert_ignoring_conflicts(conn, table: Table, *unique_columns: str):
+    """
+    Returns an INSERT into ``table`` that skips rows clashing with the
+    unique constraint on ``unique_columns``, in the connection's dialect.
+    Bind the column values when executing it.
+    """
+    return _insert_ignoring_conflicts(conn.dialect.name, table, unique_columns)
+
+
+@lru_cache(maxsize=None)
+def _insert_ignoring_conflicts(dialect: str, table: Table, unique_columns: tuple):
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(
+            index_elements=unique_columns
+        )
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(
+            index_elements=unique_columns
+        )
+    if dialect in ("mysql", "mariadb"):
+        return insert(table).prefix_with("IGNORE")
+    raise NotImplementedError(f"INSERT ... ON CONFLICT is not supported on {dialect}.")
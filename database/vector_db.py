@@ -1,9 +1,22 @@
-import sqlite3
-
 from fastapi import HTTPException
 from schemas.index_schemas import PineconeSetup
-
-from .database import DATABASE
+from sqlalchemy import bindparam, case, delete, func, insert, select, union, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from .connection import connect, transaction
+from .jobs_db import delete_ingest_jobs
+from .settings_cache import invalidate_agent_settings
+from .tables import (
+    faiss_db,
+    file_uploads,
+    index_key,
+    insert_ignoring_conflicts,
+    multi_agent,
+    of_index,
+    pinecone_db,
+    vector_db,
+    vector_manifest,
+)
 
 
 # Custom exception class for database operations
@@ -13,36 +26,112 @@ class DatabaseError(Exception):
         super().__init__(self.message)
 
 
-def insert_into_vector_db(user_id: str, index_name: str, db_type: str):
+# Statements are built once, so each call only binds its parameters and the
+# engine reuses the compiled SQL
+_SELECT_VECTOR_DB = select(vector_db.c.db_type, vector_db.c.pdf_backend).where(
+    of_index(vector_db)
+)
+_INSERT_VECTOR_DB = insert(vector_db)
+_DELETE_VECTOR_DB = delete(vector_db).where(of_index(vector_db))
+
+_SELECT_PINECONE_DB = select(pinecone_db).where(of_index(pinecone_db))
+_INSERT_PINECONE_DB = insert(pinecone_db)
+_DELETE_PINECONE_DB = delete(pinecone_db).where(of_index(pinecone_db))
+
+_SELECT_FAISS_DB = select(
+    faiss_db.c.file_name,
+    faiss_db.c.file_path,
+    faiss_db.c.embedding,
+    faiss_db.c.index_path,
+    faiss_db.c.generation,
+    faiss_db.c.last_generation,
+    faiss_db.c.id,
+).where(of_index(faiss_db))
+_INSERT_FAISS_DB = insert(faiss_db)
+_DELETE_FAISS_DB = delete(faiss_db).where(of_index(faiss_db))
+_ALLOCATE_FAISS_GENERATION = (
+    update(faiss_db)
+    .where(of_index(faiss_db))
+    .values(
+        last_generation=case(
+            (
+                faiss_db.c.last_generation > faiss_db.c.generation,
+                faiss_db.c.last_generation,
+            ),
+            else_=faiss_db.c.generation,
+        )
+        + 1
+    )
+)
+# Replaces the live generation only with a newer one
+_PUBLISH_FAISS_GENERATION = (
+    update(faiss_db)
+    .where(of_index(faiss_db), faiss_db.c.generation < bindparam("new_generation"))
+    .values(
+        index_path=bindparam("new_index_path"),
+        generation=bindparam("new_generation"),
+        embedding=func.coalesce(bindparam("new_embedding"), faiss_db.c.embedding),
+        file_name=func.coalesce(bindparam("new_file_name"), faiss_db.c.file_name),
+        file_path=func.coalesce(bindparam("new_file_path"), faiss_db.c.file_path),
+    )
+)
+# Replaces the live generation only if it is still the one a change started from
+_SWAP_FAISS_GENERATION = _PUBLISH_FAISS_GENERATION.where(
+    faiss_db.c.generation == bindparam("base_generation")
+)
+
+_UPDATE_FILE_UPLOAD = (
+    update(file_uploads)
+    .where(of_index(file_uploads))
+    .values(file_name=bindparam("new_file_name"), file_path=bindparam("new_file_path"))
+)
+
+_DETACH_AGENTS = update(multi_agent).where(of_index(multi_agent)).values(index_name=None)
+
+_SELECT_VECTOR_IDS = select(vector_manifest.c.vector_id).where(
+    of_index(vector_manifest), vector_manifest.c.file_id == bindparam("file_id")
+)
+_DELETE_VECTOR_ID = delete(vector_manifest).where(
+    of_index(vector_manifest), vector_manifest.c.vector_id == bindparam("vector_id")
+)
+_DELETE_INDEX_MANIFEST = delete(vector_manifest).where(of_index(vector_manifest))
+
+_LIST_FAISS_ARTIFACTS = select(
+    faiss_db.c.user_id, faiss_db.c.index_name, faiss_db.c.embedding
+).where(faiss_db.c.index_path.is_not(None))
+_LIST_EMBEDDING_MODELS = union(
+    select(pinecone_db.c.embedding), select(faiss_db.c.embedding)
+)
+
+
+def insert_into_vector_db(
+    user_id: str, index_name: str, db_type: str, pdf_backend: str = None
+):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
+        with transaction() as conn:
             # Check if a record with the same user_id and index_name already exists
-            cursor.execute(
-                """
-            SELECT 1 FROM vector_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
+            existing = conn.execute(
+                _SELECT_VECTOR_DB, index_key(user_id, index_name)
+            ).first()
 
-            if cursor.fetchone():  # If a record is found, raise an error
+            if existing:  # If a record is found, raise an error
                 raise DatabaseError(
                     f"A record with user_id: {user_id} and index_name: {index_name} already exists."
                 )
 
             # If no conflict, insert the new record
-            cursor.execute(
-                """
-            INSERT INTO vector_db (user_id, index_name, db_type) 
-            VALUES (?, ?, ?);
-            """,
-                (user_id, index_name, db_type),
+            conn.execute(
+                _INSERT_VECTOR_DB,
+                {
+                    "user_id": user_id,
+                    "index_name": index_name,
+                    "db_type": db_type,
+                    "pdf_backend": pdf_backend,
+                },
             )
+            invalidate_agent_settings(user_id)
 
-            conn.commit()
-
-    except sqlite3.DatabaseError as db_error:
+    except SQLAlchemyError as db_error:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
     except Exception as e:
         raise HTTPException(
@@ -54,26 +143,22 @@ def insert_into_pinecone_db(
     pinecone_setup: PineconeSetup, user_id: str, index_name: str, embedding: str
 ):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-            INSERT INTO pinecone_db (pinecone_api_key, metric, cloud, region, dimension, index_name, user_id, embedding) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    pinecone_setup.pinecone_api_key,
-                    pinecone_setup.metric,
-                    pinecone_setup.cloud,
-                    pinecone_setup.region,
-                    pinecone_setup.dimension,
-                    index_name,
-                    user_id,
-                    embedding,
-                ),
+        with transaction() as conn:
+            conn.execute(
+                _INSERT_PINECONE_DB,
+                {
+                    "pinecone_api_key": pinecone_setup.pinecone_api_key,
+                    "metric": pinecone_setup.metric,
+                    "cloud": pinecone_setup.cloud,
+                    "region": pinecone_setup.region,
+                    "dimension": pinecone_setup.dimension,
+                    "index_name": index_name,
+                    "user_id": user_id,
+                    "embedding": embedding,
+                },
             )
-            conn.commit()
-    except sqlite3.DatabaseError as db_error:
+            invalidate_agent_settings(user_id)
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while inserting into Pinecone DB: {str(db_error)}",
@@ -87,22 +172,17 @@ def insert_into_pinecone_db(
 
 def get_data_from_pinecone_db(user_id: str, index_name: str):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-            SELECT * FROM pinecone_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
-            result = cursor.fetchone()
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_PINECONE_DB, index_key(user_id, index_name)
+            ).first()
 
             if result is None:
                 raise DatabaseError(
                     f"No data found for user_id: {user_id} and index_name: {index_name} in Pinecone DB."
                 )
-            return result
-    except sqlite3.DatabaseError as db_error:
+            return tuple(result)
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while fetching from Pinecone DB: {str(db_error)}",
@@ -118,17 +198,19 @@ def insert_into_faiss_db(
     user_id: str, index_name: str, file_name: str, file_path: str, embedding: str
 ):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-            INSERT INTO faiss_db (index_name, user_id, file_name, file_path, embedding)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-                (index_name, user_id, file_name, file_path, embedding),
+        with transaction() as conn:
+            conn.execute(
+                _INSERT_FAISS_DB,
+                {
+                    "index_name": index_name,
+                    "user_id": user_id,
+                    "file_name": file_name,
+                    "file_path": file_path,
+                    "embedding": embedding,
+                },
             )
-            conn.commit()
-    except sqlite3.DatabaseError as db_error:
+            invalidate_agent_settings(user_id)
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while inserting into Faiss DB: {str(db_error)}",
@@ -144,18 +226,17 @@ def insert_into_file_uploads(
     user_id: str, index_name: str, file_name: str, file_path: str
 ):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-            INSERT INTO file_uploads (user_id, index_name, file_name, file_path) 
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id, index_name) DO NOTHING;
-            """,
-                (user_id, index_name, file_name, file_path),
+        with transaction() as conn:
+            conn.execute(
+                insert_ignoring_conflicts(conn, file_uploads, "user_id", "index_name"),
+                {
+                    "user_id": user_id,
+                    "index_name": index_name,
+                    "file_name": file_name,
+                    "file_path": file_path,
+                },
             )
-            conn.commit()
-    except sqlite3.DatabaseError as db_error:
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while inserting into file uploads: {str(db_error)}",
@@ -169,18 +250,16 @@ def insert_into_file_uploads(
 
 def update_file_upload(user_id: str, index_name: str, file_name: str, file_path: str):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-            UPDATE file_uploads
-            SET file_name = ?, file_path = ?
-            WHERE user_id = ? AND index_name = ?;
-            """,
-                (file_name, file_path, user_id, index_name),
+        with transaction() as conn:
+            conn.execute(
+                _UPDATE_FILE_UPLOAD,
+                {
+                    **index_key(user_id, index_name),
+                    "new_file_name": file_name,
+                    "new_file_path": file_path,
+                },
             )
-            conn.commit()
-    except sqlite3.DatabaseError as db_error:
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while updating file upload: {str(db_error)}",
@@ -194,22 +273,17 @@ def update_file_upload(user_id: str, index_name: str, file_name: str, file_path:
 
 def get_file_from_faiss_db(user_id: str, index_name: str):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-            SELECT file_path FROM faiss_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
-            result = cursor.fetchone()
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_FAISS_DB, index_key(user_id, index_name)
+            ).first()
 
             if result is None:
                 raise DatabaseError(
                     f"No file found for user_id: {user_id} and index_name: {index_name} in Faiss DB."
                 )
-            return result[0]
-    except sqlite3.DatabaseError as db_error:
+            return result.file_path
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while fetching file from Faiss DB: {str(db_error)}",
@@ -221,24 +295,182 @@ def get_file_from_faiss_db(user_id: str, index_name: str):
         )
 
 
-def get_index_name_type_db(user_id: str, index_name: str):
+def get_data_from_faiss_db(user_id: str, index_name: str):
+    try:
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_FAISS_DB, index_key(user_id, index_name)
+            ).first()
+
+            if result is None:
+                raise DatabaseError(
+                    f"No data found for user_id: {user_id} and index_name: {index_name} in Faiss DB."
+                )
+            return tuple(result[:4])
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching from Faiss DB: {str(db_error)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred while fetching from Faiss DB: {str(e)}",
+        )
+
+
+def allocate_faiss_generation(user_id: str, index_name: str):
+    """
+    Reserves the next generation number of a FAISS index for a build.
+    Numbers are never reused, so concurrent builds write to distinct folders.
+
+    Returns:
+        tuple[int, int]: The generation number, and the id of the index's
+        row, which tells this index apart from one of the same name that
+        was deleted.
+    """
+    try:
+        with transaction() as conn:
+            result = conn.execute(
+                _ALLOCATE_FAISS_GENERATION, index_key(user_id, index_name)
+            )
+            if result.rowcount == 0:
+                raise DatabaseError(
+                    f"No Faiss index found for user_id: {user_id} and index_name: {index_name}."
+                )
+            row = conn.execute(_SELECT_FAISS_DB, index_key(user_id, index_name)).one()
+            return row.last_generation, row.id
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while allocating Faiss generation: {str(db_error)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred while allocating Faiss generation: {str(e)}",
+        )
+
+
+def publish_faiss_generation(
+    user_id: str,
+    index_name: str,
+    generation: int,
+    index_path: str,
+    embedding: str = None,
+    file_name: str = None,
+    file_path: str = None,
+    base_generation: int = None,
+):
+    """
+    Points a FAISS index at a newly built generation, together with the
+    embedding model and source file it was built from.
+
+    The swap only happens if ``generation`` is newer than the live one, so
+    a slow build can never replace a later one. With ``base_generation``,
+    it also requires the live generation to still be ``base_generation``,
+    so a change made to an older generation never drops the changes
+    published since.
+
+    Returns:
+        tuple[bool, str, str]: Whether the generation was published, and the
+        artifact folder and source file path it replaced.
+    """
+    try:
+        with transaction() as conn:
+            previous = conn.execute(
+                _SELECT_FAISS_DB, index_key(user_id, index_name)
+            ).first()
+            params = {
+                **index_key(user_id, index_name),
+                "new_index_path": index_path,
+                "new_generation": generation,
+                "new_embedding": embedding,
+                "new_file_name": file_name,
+                "new_file_path": file_path,
+            }
+            if base_generation is None:
+                result = conn.execute(_PUBLISH_FAISS_GENERATION, params)
+            else:
+                result = conn.execute(
+                    _SWAP_FAISS_GENERATION,
+                    {**params, "base_generation": base_generation},
+                )
+            if result.rowcount == 0:
+                return False, None, None
+            # The embedding model may have changed with the generation
+            invalidate_agent_settings(user_id)
+            return True, previous.index_path, previous.file_path
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while publishing Faiss generation: {str(db_error)}",
+        )
+
+
+def get_faiss_index_generation(user_id: str, index_name: str):
+    """
+    Returns the artifact folder and generation served for a FAISS index,
+    with the id of the index's row, or ``(None, 0, None)`` if it has no
+    prebuilt artifact.
+    """
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT db_type FROM vector_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_FAISS_DB, index_key(user_id, index_name)
+            ).first()
+            return (
+                (result.index_path, result.generation, result.id)
+                if result and result.index_path
+                else (None, 0, None)
             )
-            result = cursor.fetchone()
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching Faiss generation: {str(db_error)}",
+        )
+
+
+def list_faiss_artifacts():
+    """
+    Returns ``(user_id, index_name, embedding)`` for every FAISS index that
+    is served from a prebuilt artifact.
+    """
+    try:
+        with connect() as conn:
+            return [tuple(row) for row in conn.execute(_LIST_FAISS_ARTIFACTS)]
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while listing Faiss indexes: {str(db_error)}",
+        )
+
+
+def list_embedding_models():
+    """Returns the names of the embedding models used by registered indexes."""
+    try:
+        with connect() as conn:
+            return sorted(conn.execute(_LIST_EMBEDDING_MODELS).scalars())
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while listing embedding models: {str(db_error)}",
+        )
+
+
+def get_index_name_type_db(user_id: str, index_name: str):
+    try:
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_VECTOR_DB, index_key(user_id, index_name)
+            ).first()
             print(user_id, index_name)
             if result is None:
                 raise DatabaseError(
                     f"No db_type found for user_id: {user_id} and index_name: {index_name}."
                 )
-            return result[0]
-    except sqlite3.DatabaseError as db_error:
+            return result.db_type
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while fetching db_type: {str(db_error)}",
@@ -250,24 +482,49 @@ def get_index_name_type_db(user_id: str, index_name: str):
         )
 
 
+def find_index_type_db(user_id: str, index_name: str):
+    """Returns the db_type of an index, or None if it is not registered."""
+    try:
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_VECTOR_DB, index_key(user_id, index_name)
+            ).first()
+            return result.db_type if result else None
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching db_type: {str(db_error)}",
+        )
+
+
+def get_index_pdf_backend(user_id: str, index_name: str):
+    """Returns the PDF backend chosen for an index, or None for the default."""
+    try:
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_VECTOR_DB, index_key(user_id, index_name)
+            ).first()
+            return result.pdf_backend if result else None
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching PDF backend: {str(db_error)}",
+        )
+
+
 def get_pinecone_api_index_name_type_db(user_id: str, index_name: str):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT pinecone_api_key FROM pinecone_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
-            result = cursor.fetchone()
+        with connect() as conn:
+            result = conn.execute(
+                _SELECT_PINECONE_DB, index_key(user_id, index_name)
+            ).first()
 
             if result is None:
                 raise DatabaseError(
                     f"No Pinecone API key found for user_id: {user_id} and index_name: {index_name}."
                 )
-            return result[0]
-    except sqlite3.DatabaseError as db_error:
+            return result.pinecone_api_key
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while fetching Pinecone API key: {str(db_error)}",
@@ -281,35 +538,26 @@ def get_pinecone_api_index_name_type_db(user_id: str, index_name: str):
 
 def delete_pinecone_index_from_db(user_id: str, index_name: str):
     try:
-        # delete_from_vector_db(user_id, index_name)
-        set_agent_index_to_none(user_id, index_name)
-
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
-        # Check if the record exists for the given user_id and index_name
-        cursor.execute(
-            """
-        SELECT 1 FROM pinecone_db WHERE user_id = ? AND index_name = ?;
-        """,
-            (user_id, index_name),
-        )
-        if cursor.fetchone() is None:
-            raise DatabaseError(
-                f"No Pinecone index found for user_id: {user_id} and index_name: {index_name}."
-            )
+        with transaction() as conn:
+            # Check if the record exists for the given user_id and index_name
+            existing = conn.execute(
+                _SELECT_PINECONE_DB, index_key(user_id, index_name)
+            ).first()
+            if existing is None:
+                raise DatabaseError(
+                    f"No Pinecone index found for user_id: {user_id} and index_name: {index_name}."
+                )
 
-        # Delete the record
-        cursor.execute(
-            """
-        DELETE FROM pinecone_db WHERE user_id = ? AND index_name = ?;
-        """,
-            (user_id, index_name),
-        )
-        conn.commit()
+            # Removing the vector_db entry cascades to pinecone_db and the manifest
+            set_agent_index_to_none(user_id, index_name)
+            delete_index_manifest(user_id, index_name)
+            delete_ingest_jobs(user_id, index_name)
 
-        return True
-    except sqlite3.DatabaseError as db_error:
+            # Delete the record
+            conn.execute(_DELETE_PINECONE_DB, index_key(user_id, index_name))
+
+            return True
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while deleting Pinecone index: {str(db_error)}",
@@ -323,34 +571,25 @@ def delete_pinecone_index_from_db(user_id: str, index_name: str):
 
 def delete_faiss_index_from_db(user_id: str, index_name: str):
     try:
-        # delete_from_vector_db(user_id, index_name)
-        set_agent_index_to_none(user_id, index_name)
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
+        with transaction() as conn:
             # Check if the record exists for the given user_id and index_name
-            cursor.execute(
-                """
-            SELECT 1 FROM faiss_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
-            if cursor.fetchone() is None:
+            existing = conn.execute(
+                _SELECT_FAISS_DB, index_key(user_id, index_name)
+            ).first()
+            if existing is None:
                 raise DatabaseError(
                     f"No Faiss index found for user_id: {user_id} and index_name: {index_name}."
                 )
 
+            # Removing the vector_db entry cascades to faiss_db and file_uploads
+            set_agent_index_to_none(user_id, index_name)
+            delete_ingest_jobs(user_id, index_name)
+
             # Delete the record
-            cursor.execute(
-                """
-            DELETE FROM faiss_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
-            conn.commit()
+            conn.execute(_DELETE_FAISS_DB, index_key(user_id, index_name))
 
             return True
-    except sqlite3.DatabaseError as db_error:
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while deleting Faiss index: {str(db_error)}",
@@ -364,22 +603,14 @@ def delete_faiss_index_from_db(user_id: str, index_name: str):
 
 def set_agent_index_to_none(user_id: str, index_name: str):
     try:
-        delete_from_vector_db(user_id, index_name)
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
-        # Update the agent record for the given user_id to set index_name to None
-        cursor.execute(
-            """
-        UPDATE multi_agent
-        SET index_name = NULL
-        WHERE user_id = ? AND index_name = ?;
-        """,
-            (user_id, index_name),
-        )
-        conn.commit()
+        with transaction() as conn:
+            delete_from_vector_db(user_id, index_name)
+
+            # Update the agent record for the given user_id to set index_name to None
+            conn.execute(_DETACH_AGENTS, index_key(user_id, index_name))
+            invalidate_agent_settings(user_id)
         return True
-    except sqlite3.DatabaseError as db_error:
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while updating agent index: {str(db_error)}",
@@ -393,32 +624,22 @@ def set_agent_index_to_none(user_id: str, index_name: str):
 
 def delete_from_vector_db(user_id: str, index_name: str):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-
+        with transaction() as conn:
             # Check if the record exists for the given user_id and index_name
-            cursor.execute(
-                """
-            SELECT 1 FROM vector_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
-            if cursor.fetchone() is None:
+            existing = conn.execute(
+                _SELECT_VECTOR_DB, index_key(user_id, index_name)
+            ).first()
+            if existing is None:
                 raise DatabaseError(
                     f"No record found for user_id: {user_id} and index_name: {index_name} in vector_db."
                 )
 
             # Delete the record
-            cursor.execute(
-                """
-            DELETE FROM vector_db WHERE user_id = ? AND index_name = ?;
-            """,
-                (user_id, index_name),
-            )
-            conn.commit()
+            conn.execute(_DELETE_VECTOR_DB, index_key(user_id, index_name))
+            invalidate_agent_settings(user_id)
 
             return True
-    except sqlite3.DatabaseError as db_error:
+    except SQLAlchemyError as db_error:
         raise HTTPException(
             status_code=500,
             detail=f"Database error while deleting record from vector_db: {str(db_error)}",
@@ -428,3 +649,98 @@ def delete_from_vector_db(user_id: str, index_name: str):
             status_code=500,
             detail=f"An unexpected error occurred while deleting record from vector_db: {str(e)}",
         )
+
+
+def insert_vector_ids(
+    user_id: str, index_name: str, file_id: str, file_name: str, vector_ids: list
+):
+    try:
+        if not vector_ids:
+            return
+        with transaction() as conn:
+            conn.execute(
+                insert_ignoring_conflicts(
+                    conn, vector_manifest, "user_id", "index_name", "vector_id"
+                ),
+                [
+                    {
+                        "user_id": user_id,
+                        "index_name": index_name,
+                        "file_id": file_id,
+                        "file_name": file_name,
+                        "vector_id": vector_id,
+                    }
+                    for vector_id in vector_ids
+                ],
+            )
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while recording vector IDs: {str(db_error)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred while recording vector IDs: {str(e)}",
+        )
+
+
+def get_vector_ids(user_id: str, index_name: str, file_id: str):
+    try:
+        with connect() as conn:
+            return list(
+                conn.execute(
+                    _SELECT_VECTOR_IDS,
+                    {**index_key(user_id, index_name), "file_id": file_id},
+                ).scalars()
+            )
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while fetching vector IDs: {str(db_error)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred while fetching vector IDs: {str(e)}",
+        )
+
+
+def delete_vector_ids(user_id: str, index_name: str, vector_ids: list):
+    try:
+        if not vector_ids:
+            return
+        with transaction() as conn:
+            conn.execute(
+                _DELETE_VECTOR_ID,
+                [
+                    {**index_key(user_id, index_name), "vector_id": vector_id}
+                    for vector_id in vector_ids
+                ],
+            )
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while deleting vector IDs: {str(db_error)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred while deleting vector IDs: {str(e)}",
+        )
+
+
+def delete_index_manifest(user_id: str, index_name: str):
+    try:
+        with transaction() as conn:
+            conn.execute(_DELETE_INDEX_MANIFEST, index_key(user_id, index_name))
+    except SQLAlchemyError as db_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error while deleting vector manifest: {str(db_error)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred while deleting vector manifest: {str(e)}",
+        )
@@ -1,9 +1,11 @@
 import os
 
 import database
+import rag_app
 import router
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from html_router.html_router import html_app
 # Initialize the FastAPI app
 app = FastAPI(
@@ -22,9 +24,15 @@ app.add_middleware(
 
 # Initialize the database
 database.init_db()
+database.fail_interrupted_ingest_jobs()
 if not os.path.exists("media"):
     os.makedirs("media")
 
+# Warm models and indexes in the background; /ready reports when it is done
+app.add_event_handler("startup", rag_app.start_warmup)
+# Let running database calls finish before the worker exits
+app.add_event_handler("shutdown", database.aio.shutdown)
+
 app.include_router(html_app, prefix="", tags=["HTML API"])
 app.include_router(router.index_router, prefix="/index", tags=["Index API"])
 app.include_router(router.agent_router, prefix="/agent", tags=["Agent API"])
@@ -42,3 +50,15 @@ def root():
         "redoc_url": "/redoc",
         "version": "1.0.0",
     }
+
+
+# Readiness endpoint
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once this worker has warmed its embedding models
+    and indexes, 503 while warm-up is still running. Route traffic to a
+    worker only after it reports ready.
+    """
+    status = rag_app.warmup_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -1,7 +1,9 @@
 import os
 
 from fastapi import APIRouter, File, Form, UploadFile
-from pypdf import PdfReader
+from rag_app.config import MAX_UPLOAD_BYTES
+from rag_app.document_loader import iter_pdf_pages
+from rag_app.uploads import save_upload_file
 
 # # Define a directory for temporary file storage
 TEMP_DIR = "temp_uploads"
@@ -11,21 +13,22 @@ os.makedirs(TEMP_DIR, exist_ok=True)
 # Function to extract text from a PDF file
 def extract_text_from_pdf(file_path: str) -> str:
     try:
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        # Pages are extracted in parallel for large PDFs
+        return "\n".join(iter_pdf_pages(file_path)).strip()
     except Exception as e:
         raise ValueError(f"Error reading PDF file: {e}")
 
 
 # Utility function to handle file uploads and temporary storage
-def save_uploaded_file(file: UploadFile) -> str:
+async def save_uploaded_file(
+    file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES
+) -> str:
     try:
         temp_file_path = os.path.join(TEMP_DIR, file.filename)
-        with open(temp_file_path, "wb") as temp_file:
-            temp_file.write(file.file.read())
+        # Streamed in bounded chunks without blocking the event loop; a
+        # failed upload leaves no file behind
+        await save_upload_file(file, temp_file_path, max_bytes=max_bytes)
         return temp_file_path
     except Exception as e:
-        raise ValueError(f"Error saving uploaded file: {e}")
+        detail = getattr(e, "detail", None) or str(e)
+        raise ValueError(f"Error saving uploaded file: {detail}")
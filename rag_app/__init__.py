@@ -1,16 +1,81 @@
-from .agent_services import (
-    create_agent_logic,
-    delete_agent_logic,
-    get_agent_details,
-    query_agent_logic,
-    update_agent_logic,
-)
-from .data_embed import initialize_embeddings
-from .document_loader import data_splitter
-from .pine_create import check_pinecone_index, create_pinecone_index
-from .pine_insert import (
-    delete_pinecone_index,
-    insert_data_to_pinecone,
-    update_data_in_pinecone,
-)
-from .rag_main import Agent
+import importlib
+
+# Public names by the submodule defining them. A submodule is imported on
+# first use of one of its names, so importing rag_app does not load torch,
+# LangChain or the vector store clients until a request or job needs them.
+_EXPORTS = {
+    "agent_services": (
+        "create_agent_logic",
+        "delete_agent_logic",
+        "get_agent_details",
+        "query_agent_logic",
+        "update_agent_logic",
+    ),
+    "data_embed": ("get_embeddings", "initialize_embeddings", "preload_embeddings"),
+    "embed_batching": ("BatchingEmbeddings", "MicroBatcher"),
+    "embedding_backends": (
+        "export_model",
+        "load_sentence_transformer",
+        "resolve_embedding_backend",
+    ),
+    "embedding_service": ("EmbeddingServiceClient", "EmbeddingServiceError"),
+    "document_loader": (
+        "buffer_splitter",
+        "data_splitter",
+        "iter_buffer_splitter",
+        "iter_data_splitter",
+        "resolve_pdf_backend",
+    ),
+    "faiss_insert": ("delete_document_from_faiss", "insert_data_to_faiss"),
+    "faiss_store": ("load_faiss_index",),
+    "index_registry": (
+        "acquire_faiss_index",
+        "drop_faiss_index",
+        "faiss_lock_stats",
+        "preload_faiss_indexes",
+    ),
+    "index_snapshot": (
+        "SnapshotError",
+        "export_index_snapshot",
+        "import_index_snapshot",
+    ),
+    "ingest_jobs": (
+        "cancel_ingest_job",
+        "create_ingest_job",
+        "get_ingest_job_status",
+        "run_faiss_bulk_insert",
+        "run_faiss_rebuild",
+        "run_pinecone_bulk_insert",
+        "run_pinecone_insert",
+        "run_pinecone_update",
+        "start_ingest_job",
+    ),
+    "pine_create": ("check_pinecone_index", "create_pinecone_index"),
+    "pine_insert": (
+        "delete_document_from_pinecone",
+        "delete_pinecone_index",
+        "insert_data_to_pinecone",
+        "update_data_in_pinecone",
+    ),
+    "rag_main": ("Agent",),
+    "uploads": ("save_upload_file", "spool_upload_file"),
+    "warmup": ("preload", "start_warmup", "warmup_status"),
+}
+
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULE_OF)
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Later lookups find the name directly
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,15 +1,8 @@
 import logging
-import sqlite3
-
-from database import get_index_name_type_db
-from database.rag_db import (
-    create_rag_db,
-    delete_rag_db,
-    get_rag_settings,
-    update_rag_db,
-)
+
+from database import aio
 from fastapi import HTTPException
-from langchain_huggingface import HuggingFaceEmbeddings
+from rag_app.data_embed import get_embeddings
 from rag_app.rag_main import Agent
 from schemas.agent_schemas import (
     CreateAgentRequest,
@@ -17,6 +10,8 @@ from schemas.agent_schemas import (
     QuerAgentRequest,
     UpdateAgentRequest,
 )
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
 
 # Configure logging
 logging.basicConfig(
@@ -31,9 +26,9 @@ async def get_agent_details(request):
     Business logic to create Agent settings for a user.
     """
     try:
-        data = get_rag_settings(request.user_id, request.agent_name)
+        data = await aio.get_rag_settings(request.user_id, request.agent_name)
         return data
-    except sqlite3.IntegrityError:
+    except IntegrityError:
         logger.error(f"Agent settings for index '{request.agent_name}' not found.")
         raise HTTPException(
             status_code=400,
@@ -49,9 +44,9 @@ async def create_agent_logic(request: CreateAgentRequest):
     Business logic to create Agent settings for a user.
     """
     try:
-        message = create_rag_db(request)
+        message = await aio.create_rag_db(request)
         return message
-    except sqlite3.IntegrityError:
+    except IntegrityError:
         logger.error(f"Agent settings for index '{request.index_name}' already exist.")
         raise HTTPException(
             status_code=400,
@@ -67,7 +62,7 @@ async def update_agent_logic(request: UpdateAgentRequest):
     Business logic to update Agent settings.
     """
     try:
-        message = update_rag_db(request)
+        message = await aio.update_rag_db(request)
         return message
     except Exception as e:
         logger.exception("Unexpected error occurred in update_agent_logic.")
@@ -79,38 +74,30 @@ async def delete_agent_logic(request: DeleteAgent):
     Business logic to delete an Agent index.
     """
     try:
-        message, status_code = delete_rag_db(request)
+        message, status_code = await aio.delete_rag_db(request)
         print(message)
         return message, status_code  # Return message and status code
     except Exception as e:
         logger.exception("Unexpected error occurred in delete_agent_logic.")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def setup_rag(result, question, user_id, index_type):
+async def setup_rag(settings, question, user_id):
     try:
-        (
-            agent_name,
-            index_name,
-            llm_provider,
-            llm_model_name,
-            llm_api_key,
-            prompt_template,
-            embeddings_model,
-        ) = result
-        embeddings= HuggingFaceEmbeddings(
-                        model_name=embeddings_model
-                    ) 
-        # embeddings = HuggingFaceEmbeddings(model_name=str(embeddings_model))
-        response = Agent(
-            index_name=index_name,
+        # A model's first use loads it, and may export it, which takes seconds
+        embeddings = await run_in_threadpool(get_embeddings, settings["embedding"])
+        # Retrieval and the LLM call block, so they run off the event loop
+        response = await run_in_threadpool(
+            Agent,
+            index_name=settings["index_name"],
             embeddings=embeddings,
-            model_name=llm_model_name,
-            api_key=llm_api_key,
-            prompt_template=prompt_template,
-            use_llm=llm_provider,
+            model_name=settings["llm_model_name"],
+            api_key=settings["llm_api_key"],
+            prompt_template=settings["prompt_template"],
+            use_llm=settings["llm_provider"],
             question=question,
             user_id=user_id,
-            index_type=index_type,
+            index_type=settings["db_type"],
+            pinecone_api_key=settings["pinecone_api_key"],
         )
 
         return response
@@ -125,19 +112,19 @@ async def query_agent_logic(request: QuerAgentRequest):
     Business logic to handle querying of an Agent pipeline with proper debugging.
     """
     try:
-        result = get_rag_settings(request.user_id, request.agent_name)
-        index_type = get_index_name_type_db(request.user_id, result[1])
+        # Agent, index type, embedding model and Pinecone key in one cached lookup
+        settings = await aio.get_agent_settings(request.user_id, request.agent_name)
 
-        if not result:
-            logger.warning(f"No Agent settings found for user_id '{request.user_id}'.")
+        if not settings["db_type"]:
+            logger.warning(
+                f"Index of Agent '{request.agent_name}' not found for user_id '{request.user_id}'."
+            )
             raise HTTPException(
                 status_code=404,
-                detail=f"No Agent settings found for user_id '{request.user_id}'.",
+                detail=f"Index of Agent '{request.agent_name}' not found.",
             )
 
-        response = await setup_rag(
-            result, request.question, request.user_id, index_type
-        )
+        response = await setup_rag(settings, request.question, request.user_id)
 
         return response
 
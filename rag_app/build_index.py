@@ -0,0 +1,274 @@
+"""
+Builds a FAISS index offline from a directory of PDF and TXT files.
+
+Files are parsed and split in parallel across processes with the same
+loaders and splitter as online FAISS builds, embedded in large
+batches, and written as a FAISS index plus docstore artifact. The artifact
+is published in agentX.db as the index's next generation, so agents switch
+to it atomically, and python -m rag_app.index_snapshot ships it to serving
+nodes.
+
+Usage:
+    python -m rag_app.build_index corpus/ --user-id alice --index-name handbook
+    python -m rag_app.build_index corpus/ --user-id alice --index-name handbook \\
+        --embedding sentence-transformers/all-MiniLM-L6-v2 --batch-size 256
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import database
+from fastapi import HTTPException
+
+from . import document_loader
+from .config import EMBED_SORT_WINDOW, FAISS_INDEX_DIR
+from .data_embed import get_embeddings
+from .faiss_store import save_faiss_index
+from .index_registry import publish_faiss_index
+from .ingest_pipeline import IngestPipeline, add_documents_to_faiss
+
+DEFAULT_EMBEDDING = "sentence-transformers/all-mpnet-base-v2"
+
+# File types the online upload endpoints accept
+SOURCE_SUFFIXES = (".pdf", ".txt")
+
+
+def find_source_files(directory: str):
+    """Returns the PDF and TXT files under a directory, sorted by path."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(
+            os.path.join(root, name)
+            for name in files
+            if name.lower().endswith(SOURCE_SUFFIXES)
+        )
+    return sorted(paths)
+
+
+def _init_worker():
+    # Files are the unit of parallelism here, so pages are not sharded again
+    document_loader.PDF_PARSE_WORKERS = 1
+
+
+def _split_file(path: str, pdf_backend: str):
+    """Parses and splits one file in a worker process."""
+    return document_loader.faiss_data_splitter(path, pdf_backend)
+
+
+def iter_file_chunks(paths, pdf_backend: str = None, workers: int = 1, counts=None):
+    """
+    Yields the chunks of every file in path order while files are parsed and
+    split in parallel. At most two files per worker are held in memory.
+    ``counts``, if given, receives the number of chunks per file.
+    """
+    if workers <= 1:
+        for path in paths:
+            chunks = document_loader.faiss_data_splitter(path, pdf_backend)
+            if counts is not None:
+                counts[path] = len(chunks)
+            yield from chunks
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as pool:
+        pending = deque()
+        try:
+            for path in paths:
+                pending.append((path, pool.submit(_split_file, path, pdf_backend)))
+                if len(pending) >= workers * 2:
+                    done_path, future = pending.popleft()
+                    chunks = future.result()
+                    if counts is not None:
+                        counts[done_path] = len(chunks)
+                    yield from chunks
+            while pending:
+                done_path, future = pending.popleft()
+                chunks = future.result()
+                if counts is not None:
+                    counts[done_path] = len(chunks)
+                yield from chunks
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def register_faiss_index(
+    user_id: str,
+    index_name: str,
+    embedding: str,
+    source: str,
+    pdf_backend: str = None,
+):
+    """
+    Creates the agentX.db entries of a FAISS index if it does not exist yet.
+    Its artifact is recorded when a generation is published.
+
+    Raises:
+    - ValueError: If the name is already used by a Pinecone index.
+    """
+    database.init_db()
+    index_type = database.find_index_type_db(user_id, index_name)
+    if index_type is None:
+        database.insert_into_vector_db(user_id, index_name, "FAISS", pdf_backend)
+        file_name = os.path.basename(os.path.normpath(source))
+        database.insert_into_faiss_db(
+            user_id, index_name, file_name, source, embedding
+        )
+    elif index_type != "FAISS":
+        raise ValueError(
+            f"Index '{index_name}' of user '{user_id}' is a {index_type} index."
+        )
+
+
+def build_faiss_index(
+    source: str,
+    embedding: str = DEFAULT_EMBEDDING,
+    pdf_backend: str = None,
+    workers: int = 1,
+    batch_size: int = 256,
+):
+    """
+    Parses, splits and embeds every PDF and TXT file under ``source`` into
+    an in-memory FAISS store.
+
+    Returns:
+    - tuple: The FAISS vector store and the manifest to save with it.
+    """
+    paths = find_source_files(source)
+    if not paths:
+        raise ValueError(f"No PDF or TXT files found under '{source}'.")
+    pdf_backend = document_loader.resolve_pdf_backend(pdf_backend)
+
+    embeddings = get_embeddings(embedding)
+    counts = {}
+    started = time.perf_counter()
+    with IngestPipeline() as pipeline:
+        chunks = pipeline.stage(
+            "parse",
+            iter_file_chunks(paths, pdf_backend, workers, counts),
+            queue_size=EMBED_SORT_WINDOW,
+        )
+        vector_store = add_documents_to_faiss(
+            embeddings, chunks, batch_size=batch_size
+        )
+
+    manifest = {
+        "embedding": embedding,
+        "pdf_backend": pdf_backend,
+        "chunk_size": document_loader.CHUNK_SIZE,
+        "chunk_overlap": document_loader.CHUNK_OVERLAP,
+        "files": [
+            {"file_name": os.path.relpath(path, source), "chunks": counts.get(path, 0)}
+            for path in paths
+        ],
+        "built_at": time.time(),
+        "build_seconds": round(time.perf_counter() - started, 3),
+    }
+    return vector_store, manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m rag_app.build_index",
+        description="Build a FAISS index artifact offline from a directory of files.",
+    )
+    parser.add_argument("source", help="Directory of PDF and TXT files")
+    parser.add_argument("--user-id", required=True, help="Owner of the index")
+    parser.add_argument("--index-name", required=True, help="Name of the index")
+    parser.add_argument(
+        "--embedding",
+        default=DEFAULT_EMBEDDING,
+        help=f"HuggingFace embedding model (default: {DEFAULT_EMBEDDING})",
+    )
+    parser.add_argument(
+        "--pdf-backend",
+        choices=list(document_loader.PDF_BACKENDS),
+        help="PDF extraction engine (default: PDF_BACKEND)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes parsing files in parallel (default: all cores)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Chunks embedded per forward pass (default: 256)",
+    )
+    parser.add_argument(
+        "--output",
+        help=(
+            "Artifact folder (default: a new generation folder under "
+            f"{FAISS_INDEX_DIR}/<user-id>/<index-name>)"
+        ),
+    )
+    parser.add_argument(
+        "--no-register",
+        action="store_true",
+        help="Only write the artifact, do not record it in agentX.db",
+    )
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        parser.error(f"'{args.source}' is not a directory")
+    if args.no_register and not args.output:
+        parser.error("--no-register requires --output")
+
+    try:
+        vector_store, manifest = build_faiss_index(
+            args.source,
+            embedding=args.embedding,
+            pdf_backend=args.pdf_backend,
+            workers=args.workers,
+            batch_size=args.batch_size,
+        )
+        print(
+            f"Built {vector_store.index.ntotal} vectors from "
+            f"{len(manifest['files'])} files in {manifest['build_seconds']}s."
+        )
+        write = partial(save_faiss_index, vector_store, manifest=manifest)
+        if args.no_register:
+            write(args.output)
+            print(f"Saved index to {args.output}")
+            return
+
+        register_faiss_index(
+            args.user_id,
+            args.index_name,
+            args.embedding,
+            args.source,
+            manifest["pdf_backend"],
+        )
+        manifest = publish_faiss_index(
+            args.user_id,
+            args.index_name,
+            write,
+            index_path=args.output,
+            file_name=os.path.basename(os.path.normpath(args.source)),
+            file_path=args.source,
+        )
+    except (ValueError, RuntimeError) as e:
+        parser.exit(1, f"Error: {e}\n")
+    except HTTPException as e:
+        parser.exit(1, f"Error: {e.detail}\n")
+
+    if manifest["generation"] is None:
+        parser.exit(1, "Error: a newer build was published while this one ran.\n")
+    print(
+        f"Published generation {manifest['generation']} of index "
+        f"'{args.index_name}' for user '{args.user_id}'."
+    )
+
+
+if __name__ == "__main__":
+    main()
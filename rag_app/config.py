@@ -0,0 +1,136 @@
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Number of chunks embedded per forward pass during ingestion
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Chunks pulled from the splitter and length-sorted per embedding window
+EMBED_SORT_WINDOW = int(os.getenv("EMBED_SORT_WINDOW", "512"))
+
+# Items buffered between concurrent ingestion stages (parse, split, embed, write)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+# Pinecone upsert batching: vectors and serialized bytes per request
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+UPSERT_MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", "2000000"))
+
+# Number of upsert requests allowed in flight at once
+UPSERT_MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "4"))
+
+# Retries for transient Pinecone errors, with exponential backoff
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "5"))
+UPSERT_BACKOFF_SECONDS = float(os.getenv("UPSERT_BACKOFF_SECONDS", "0.5"))
+
+# Optional data-plane host, e.g. a local Pinecone stand-in for testing
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")
+
+# New serverless indexes are polled for readiness with exponential backoff,
+# starting at PINECONE_READY_POLL_SECONDS and giving up after the timeout
+PINECONE_READY_POLL_SECONDS = float(os.getenv("PINECONE_READY_POLL_SECONDS", "0.5"))
+PINECONE_READY_TIMEOUT = float(os.getenv("PINECONE_READY_TIMEOUT", "300"))
+
+# Vectors embedded ahead while a new index is still being provisioned
+PROVISIONING_BUFFER_VECTORS = int(os.getenv("PROVISIONING_BUFFER_VECTORS", "4096"))
+
+# Number of background ingestion jobs processed concurrently
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# Files of one bulk upload or archive ingested concurrently
+BULK_INGEST_WORKERS = int(os.getenv("BULK_INGEST_WORKERS", "4"))
+
+# Uploads are streamed to disk in chunks of this size and rejected past the limit
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+
+# Uploads parsed from memory spill to an anonymous temp file past this size
+SPOOL_MAX_MEMORY = int(os.getenv("SPOOL_MAX_MEMORY", str(16 * 1024 * 1024)))
+
+# PDF text extraction is sharded by page range across this many processes,
+# but only for documents with at least PDF_PARALLEL_MIN_PAGES pages
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+
+# PDF text extraction engine: pypdf, pypdfium2 or pymupdf; indexes may override it
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf").lower()
+
+# Root directory for persisted FAISS index artifacts, one folder per user/index
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", os.path.join("media", "faiss"))
+
+# Load FAISS index artifacts with IO_FLAG_MMAP instead of reading them into memory
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() in ("1", "true", "yes")
+
+# Largest index snapshot accepted by /index/import
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_BYTES", str(8 * 1024 * 1024 * 1024)))
+
+# Embedding models loaded before the server forks its workers, comma-separated.
+# The models of registered indexes are preloaded as well.
+PRELOAD_EMBEDDING_MODELS = [
+    name.strip()
+    for name in os.getenv("PRELOAD_EMBEDDING_MODELS", "").split(",")
+    if name.strip()
+]
+
+# Load every FAISS index artifact before the server forks its workers
+PRELOAD_FAISS_INDEXES = os.getenv("PRELOAD_FAISS_INDEXES", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Warm the embedding models and FAISS indexes in the background when a worker
+# starts; /ready answers 503 until warm-up has finished
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Unix socket of the embedding service (python -m rag_app.embedding_service).
+# When set, HuggingFace models are run by the service instead of in-process.
+EMBEDDING_SERVICE_SOCKET = os.getenv("EMBEDDING_SERVICE_SOCKET")
+
+# Inference threads of the embedding service, shared by all of its models
+EMBEDDING_SERVICE_THREADS = int(
+    os.getenv("EMBEDDING_SERVICE_THREADS", str(os.cpu_count() or 1))
+)
+
+# Seconds a client waits for the embedding service to answer one request
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "120"))
+
+# Concurrent query embeddings of a model are coalesced into one forward pass.
+# While the model is busy, the first query of the next pass waits up to
+# EMBED_BATCH_WINDOW_MS for others, or until EMBED_BATCH_MAX texts are
+# collected. 0 embeds every query on its own.
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+
+# Inference backend of sentence-transformers models: torch, onnx, or onnx-int8
+# for an ONNX export with dynamically quantized int8 weights.
+# EMBEDDING_MODEL_BACKENDS sets it per model, comma-separated, e.g.
+# "sentence-transformers/all-mpnet-base-v2=onnx-int8,intfloat/e5-small-v2=onnx"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_MODEL_BACKENDS = {
+    name.strip(): backend.strip().lower()
+    for name, _, backend in (
+        entry.rpartition("=")
+        for entry in os.getenv("EMBEDDING_MODEL_BACKENDS", "").split(",")
+        if entry.strip()
+    )
+}
+
+# ONNX exports are cached here, one folder per model and backend
+EMBEDDING_EXPORT_DIR = os.getenv(
+    "EMBEDDING_EXPORT_DIR", os.path.join("media", "models")
+)
+
+# Instruction set int8 exports are quantized for: arm64, avx2, avx512 or
+# avx512_vnni. Detected from the CPU when unset.
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION")
+
+# An export is used only if each of its parity sample vectors has at least
+# this cosine similarity to the torch model's; otherwise torch is used
+EMBEDDING_PARITY_MIN_COSINE = float(os.getenv("EMBEDDING_PARITY_MIN_COSINE", "0.98"))
@@ -1,13 +1,52 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_mistralai import MistralAIEmbeddings
-from langchain_ollama import OllamaEmbeddings
-from langchain_openai import OpenAIEmbeddings
+import logging
+import os
+import threading
+
+from .config import EMBED_BATCH_SIZE, EMBED_BATCH_WINDOW_MS, EMBEDDING_SERVICE_SOCKET
+
+logger = logging.getLogger(__name__)
+
+# Embedding models loaded by this process, keyed by (model_type, model_name)
+_models = {}
+_models_lock = threading.Lock()
+
+# Keys of models on ONNX Runtime. Their sessions start inference threads when
+# loaded, which a forked child does not inherit, so children load them again.
+_onnx_models = set()
+# ONNX models a forked child inherited from its parent, which it must not run
+_inherited_onnx_models = []
+
+
+def _drop_onnx_models():
+    for key in _onnx_models:
+        embeddings = _models.pop(key, None)
+        if embeddings is not None:
+            _inherited_onnx_models.append(embeddings)
+    _onnx_models.clear()
+
+
+os.register_at_fork(after_in_child=_drop_onnx_models)
+
+
+def is_inherited_onnx_model(embeddings) -> bool:
+    """
+    Returns whether ``embeddings`` is an ONNX Runtime model that this forked
+    process inherited from its parent, so objects holding it, such as
+    preloaded vector stores, must be loaded again with get_embeddings().
+    """
+    return any(embeddings is model for model in _inherited_onnx_models)
 
 
 def initialize_embeddings(model_type, model_name):
     """
     Initialize embeddings based on the selected model type and name.
 
+    With EMBEDDING_SERVICE_SOCKET set, HuggingFace models are clients of the
+    embedding service rather than models loaded in this process. Otherwise
+    they run on the model's backend (see rag_app.embedding_backends), and
+    their concurrent query embeddings are coalesced into batched forward
+    passes, per EMBED_BATCH_WINDOW_MS and EMBED_BATCH_MAX.
+
     Args:
         model_type (str): Type of model ('huggingface', 'openai', 'ollama', 'mistral').
         model_name (str): Model name to be used for initialization.
@@ -18,13 +57,146 @@ def initialize_embeddings(model_type, model_name):
     Raises:
         ValueError: If the model type is unsupported.
     """
+    # Provider packages are imported only when one of their models is used
     if model_type == "huggingface":
-        return HuggingFaceEmbeddings(model_name=model_name)
+        if EMBEDDING_SERVICE_SOCKET:
+            # The model runs in the shared embedding service
+            from .embedding_service import EmbeddingServiceClient
+
+            return EmbeddingServiceClient(model_name)
+
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        from .embed_batching import BatchingEmbeddings
+        from .embedding_backends import sentence_transformer_args
+
+        name_or_path, model_kwargs = sentence_transformer_args(model_name)
+        embeddings = HuggingFaceEmbeddings(
+            model_name=name_or_path,
+            model_kwargs=model_kwargs,
+            encode_kwargs={"batch_size": EMBED_BATCH_SIZE},
+        )
+        if EMBED_BATCH_WINDOW_MS <= 0:
+            return embeddings
+        return BatchingEmbeddings(embeddings)
     elif model_type == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
         return OpenAIEmbeddings(model=model_name)
     elif model_type == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+
         return OllamaEmbeddings(model=model_name)
     elif model_type == "mistral":
+        from langchain_mistralai import MistralAIEmbeddings
+
         return MistralAIEmbeddings(model=model_name)
     else:
         raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def get_embeddings(model_name, model_type="huggingface"):
+    """
+    Return the embeddings instance of a model shared by the whole process,
+    loading it on first use.
+
+    Models are loaded once per process instead of once per request or job.
+    Models loaded before the server forks its workers are shared by them
+    copy-on-write, except ONNX Runtime models, which each worker loads
+    again from their cached export.
+
+    Args:
+        model_name (str): Model name to be used for initialization.
+        model_type (str): Type of model, as for initialize_embeddings.
+
+    Returns:
+        Embeddings instance based on the provided type and name.
+    """
+    key = (model_type, model_name)
+    embeddings = _models.get(key)
+    if embeddings is None:
+        with _models_lock:
+            embeddings = _models.get(key)
+            if embeddings is None:
+                embeddings = initialize_embeddings(model_type, model_name)
+                _models[key] = embeddings
+                if _runs_on_onnx(model_type, model_name):
+                    _onnx_models.add(key)
+    return embeddings
+
+
+def _runs_on_onnx(model_type, model_name):
+    if model_type != "huggingface" or EMBEDDING_SERVICE_SOCKET:
+        return False
+    from .embedding_backends import resolve_embedding_backend
+
+    return resolve_embedding_backend(model_name) != "torch"
+
+
+def preload_embeddings(model_names, model_type="huggingface"):
+    """
+    Load embedding models ahead of their first request.
+
+    Models that fail to load are logged and skipped, so one bad name does
+    not keep the server from starting.
+
+    Args:
+        model_names (Iterable[str]): Models to load.
+        model_type (str): Type of the models.
+
+    Returns:
+        list[str]: The models that were loaded.
+    """
+    loaded = []
+    for model_name in model_names:
+        try:
+            get_embeddings(model_name, model_type)
+        except Exception:
+            logger.exception(f"Could not preload embedding model '{model_name}'.")
+            continue
+        loaded.append(model_name)
+    return loaded
+
+
+def iter_embedding_batches(embeddings, texts, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed texts in batches, one embedding call per batch.
+
+    Texts are grouped by length before batching so each batch pads to a
+    similar sequence length.
+
+    Args:
+        embeddings: LangChain Embeddings instance.
+        texts (list[str]): Texts to embed.
+        batch_size (int): Number of texts per embedding call.
+
+    Yields:
+        tuple[list[int], list[list[float]]]: Positions of the batch in
+        ``texts`` and the matching vectors.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be positive, got {batch_size}")
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for start in range(0, len(order), batch_size):
+        batch = order[start : start + batch_size]
+        yield batch, embeddings.embed_documents([texts[i] for i in batch])
+
+
+def embed_documents_batched(embeddings, texts, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed texts in length-sorted batches and return the vectors in input order.
+
+    Args:
+        embeddings: LangChain Embeddings instance.
+        texts (list[str]): Texts to embed.
+        batch_size (int): Number of texts per embedding call.
+
+    Returns:
+        list[list[float]]: One vector per input text.
+    """
+    vectors = [None] * len(texts)
+    for batch, batch_vectors in iter_embedding_batches(embeddings, texts, batch_size):
+        for i, vector in zip(batch, batch_vectors):
+            vectors[i] = vector
+    return vectors
@@ -1,26 +1,362 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+import io
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+from langchain.text_splitter import (
+    CharacterTextSplitter,
+    RecursiveCharacterTextSplitter,
+)
 from langchain_community.document_loaders.csv_loader import CSVLoader
+from langchain_core.documents import Document
+from pypdf import PdfReader
 
+from .config import PDF_BACKEND, PDF_PARALLEL_MIN_PAGES, PDF_PARSE_WORKERS
 
-def text_loader(filename):
-    """Loads and returns documents from a text file."""
+# Splitter settings shared by every ingestion path
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 10
+
+# Splitter settings of FAISS indexes, which every FAISS build path shares
+FAISS_CHUNK_SIZE = 1000
+FAISS_CHUNK_OVERLAP = 150
+
+# Text files are read and split in blocks of this many characters
+TEXT_BLOCK_SIZE = 1024 * 1024
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+# PDFium is not thread-safe, even across documents, so every call into it
+# from this process goes through one lock. Large PDFs still extract in
+# parallel, in the page-range worker processes.
+_pdfium_lock = threading.RLock()
+
+# Document cached per worker process so consecutive shards skip re-parsing
+_worker_document = None
+_worker_document_key = None
+
+
+class PdfBackendUnavailable(RuntimeError):
+    """Raised when the package of a PDF backend is not installed."""
+
+
+class PypdfDocument:
+    """PDF text extraction with pypdf, the pure-Python default."""
+
+    def __init__(self, source):
+        self._reader = PdfReader(source)
+
+    def __len__(self):
+        return len(self._reader.pages)
+
+    def page_text(self, number: int) -> str:
+        return self._reader.pages[number].extract_text()
+
+    def close(self):
+        pass
+
+
+class PdfiumDocument:
+    """
+    PDF text extraction with pypdfium2, bindings to Chrome's PDFium.
+    Calls are serialized with the other PDFium documents of the process.
+    PDFium reads a buffer on demand, so an upload is never held in memory.
+    """
+
+    def __init__(self, source):
+        import pypdfium2
+
+        if isinstance(source, os.PathLike):
+            source = os.fspath(source)
+        with _pdfium_lock:
+            self._pdf = pypdfium2.PdfDocument(source)
+
+    def __len__(self):
+        with _pdfium_lock:
+            return len(self._pdf)
+
+    def page_text(self, number: int) -> str:
+        with _pdfium_lock:
+            page = self._pdf[number]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    # PDFium separates lines with CRLF
+                    return text_page.get_text_range().replace("\r\n", "\n")
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+
+    def close(self):
+        with _pdfium_lock:
+            self._pdf.close()
+
+
+class PymupdfDocument:
+    """
+    PDF text extraction with PyMuPDF, bindings to MuPDF.
+    MuPDF opens a path or bytes in memory, so a buffer that is not already
+    in memory is opened from a scratch copy on disk.
+    """
+
+    def __init__(self, source):
+        try:
+            import pymupdf
+        except ImportError:
+            # Releases before 1.24 only ship the legacy module name
+            import fitz as pymupdf
+
+        self._scratch = ExitStack()
+        if isinstance(source, io.BytesIO):
+            self._doc = pymupdf.open(stream=source, filetype="pdf")
+            return
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+            source = self._scratch.enter_context(scratch_file(source, ".pdf"))
+        try:
+            self._doc = pymupdf.open(os.fspath(source), filetype="pdf")
+        except BaseException:
+            self._scratch.close()
+            raise
+
+    def __len__(self):
+        return self._doc.page_count
+
+    def page_text(self, number: int) -> str:
+        return self._doc.load_page(number).get_text()
+
+    def close(self):
+        try:
+            self._doc.close()
+        finally:
+            self._scratch.close()
+
+
+# Extraction engines selectable with PDF_BACKEND or per index
+PDF_BACKENDS = {
+    "pypdf": PypdfDocument,
+    "pypdfium2": PdfiumDocument,
+    "pymupdf": PymupdfDocument,
+}
+
+
+def resolve_pdf_backend(backend=None) -> str:
+    """
+    Returns the name of the PDF backend to use, defaulting to PDF_BACKEND.
+    Raises ValueError for an unknown name.
+    """
+    backend = (backend or PDF_BACKEND).lower()
+    if backend not in PDF_BACKENDS:
+        raise ValueError(
+            f"Unknown PDF backend '{backend}'. "
+            f"Choose one of: {', '.join(PDF_BACKENDS)}."
+        )
+    return backend
+
+
+def open_pdf(source, backend=None):
+    """
+    Opens a PDF from a path or binary buffer with the chosen backend.
+    The returned document has ``len()``, ``page_text(number)`` and ``close()``.
+    """
+    backend = resolve_pdf_backend(backend)
     try:
-        loader = TextLoader(filename)
-        documents = loader.load()
-        return documents
+        return PDF_BACKENDS[backend](source)
+    except ImportError as e:
+        raise PdfBackendUnavailable(
+            f"PDF backend '{backend}' is not installed: {e}. "
+            f"Install the '{backend}' package or choose another backend."
+        )
+
+
+def _last_word_break(text: str) -> int:
+    """Returns where the whitespace before the last word of text starts, or 0."""
+    end = len(text)
+    while end and not text[end - 1].isspace():
+        end -= 1
+    while end and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def _iter_text_blocks(stream, source):
+    """
+    Yields a text stream as documents of about TEXT_BLOCK_SIZE characters.
+    Blocks end before a whitespace run, so no word is cut in two, and the
+    next block starts with that whitespace. Only words longer than a block
+    are cut, and the last block of the stream is never split.
+    """
+    rest = ""
+    while read := stream.read(TEXT_BLOCK_SIZE):
+        block = rest + read
+        # A short read ends the stream, so no word continues past the block
+        end = len(block) if len(read) < TEXT_BLOCK_SIZE else _last_word_break(block)
+        if not end and len(block) < 2 * TEXT_BLOCK_SIZE:
+            rest = block
+            continue
+        end = end or len(block)
+        rest = block[end:]
+        yield Document(page_content=block[:end], metadata={"source": source})
+    if rest:
+        yield Document(page_content=rest, metadata={"source": source})
+
+
+def iter_text_documents(filename):
+    """Yields the documents of a text file block by block."""
+    try:
+        with open(filename, encoding="utf-8") as stream:
+            yield from _iter_text_blocks(stream, filename)
     except Exception as e:
         raise RuntimeError(f"Error loading text file '{filename}': {e}")
 
 
-def pdf_loader(filename):
-    """Loads and returns documents from a PDF file."""
+def text_loader(filename):
+    """Loads and returns documents from a text file."""
+    return list(iter_text_documents(filename))
+
+
+def _get_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawn rather than fork: the API process runs threads
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_pool
+
+
+def _extract_page_range(backend, path, start, end):
+    """Extracts the text of pages [start, end) in a worker process."""
+    global _worker_document, _worker_document_key
+    stat = os.stat(path)
+    key = (backend, path, stat.st_mtime_ns, stat.st_size)
+    if _worker_document_key != key:
+        if _worker_document is not None:
+            _worker_document.close()
+        _worker_document = None
+        _worker_document = open_pdf(path, backend)
+        _worker_document_key = key
+    return [_worker_document.page_text(i) for i in range(start, end)]
+
+
+def _iter_pages_in_pool(backend, path, total_pages, workers):
+    """
+    Yields page texts in order while shards are extracted in parallel.
+    At most two shards per worker are in flight, which bounds memory when
+    the consumer is slower than the parser.
+    """
+    # A few shards per worker keeps the load balanced across uneven pages
+    shard_size = max(1, math.ceil(total_pages / (workers * 4)))
+    pool = _get_pdf_pool()
+    pending = deque()
+    try:
+        for start in range(0, total_pages, shard_size):
+            end = min(start + shard_size, total_pages)
+            pending.append(
+                pool.submit(_extract_page_range, backend, path, start, end)
+            )
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _iter_page_texts(document, source, backend, workers, min_pages):
+    total_pages = len(document)
+    if workers <= 1 or total_pages < min_pages:
+        for number in range(total_pages):
+            yield document.page_text(number)
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        yield from _iter_pages_in_pool(
+            backend, os.fspath(source), total_pages, workers
+        )
+        return
+
+    # Worker processes need a path to open, so share the buffer through one
+    source.seek(0)
+    with scratch_file(source, suffix=".pdf") as path:
+        yield from _iter_pages_in_pool(backend, path, total_pages, workers)
+
+
+def iter_pdf_pages(
+    source,
+    workers=PDF_PARSE_WORKERS,
+    min_pages=PDF_PARALLEL_MIN_PAGES,
+    backend=None,
+):
+    """
+    Yields the text of every page of a PDF, in page order, as it is extracted.
+
+    Documents with at least ``min_pages`` pages are split into page ranges
+    that are extracted in parallel across a process pool; smaller ones are
+    extracted in this process. ``source`` is a path or a binary buffer and
+    ``backend`` names an entry of PDF_BACKENDS.
+    """
+    backend = resolve_pdf_backend(backend)
+    document = open_pdf(source, backend)
+    try:
+        yield from _iter_page_texts(document, source, backend, workers, min_pages)
+    finally:
+        document.close()
+
+
+def extract_pdf_pages(
+    source,
+    workers=PDF_PARSE_WORKERS,
+    min_pages=PDF_PARALLEL_MIN_PAGES,
+    backend=None,
+):
+    """Returns the text of every page of a PDF, in page order."""
+    return list(iter_pdf_pages(source, workers, min_pages, backend))
+
+
+def iter_pdf_documents(source, name, backend=None):
+    """
+    Yields one document per PDF page as it is extracted.
+    The metadata matches PyPDFLoader's 'source' and 'page' keys whichever
+    backend is used.
+    """
     try:
-        pdfloader = PyPDFLoader(filename)
-        documents = pdfloader.load()
-        return documents
+        backend = resolve_pdf_backend(backend)
+        document = open_pdf(source, backend)
+        try:
+            total_pages = len(document)
+            texts = _iter_page_texts(
+                document, source, backend, PDF_PARSE_WORKERS, PDF_PARALLEL_MIN_PAGES
+            )
+            for number, text in enumerate(texts):
+                yield Document(
+                    page_content=text,
+                    metadata={
+                        "source": name,
+                        "page": number,
+                        "total_pages": total_pages,
+                    },
+                )
+        finally:
+            document.close()
     except Exception as e:
-        raise RuntimeError(f"Error loading PDF file '{filename}': {e}")
+        raise RuntimeError(f"Error loading PDF file '{name}': {e}")
+
+
+def pdf_loader(filename, backend=None):
+    """Loads and returns one document per page from a PDF file."""
+    return list(iter_pdf_documents(filename, filename, backend))
 
 
 def csv_loader(filename):
@@ -33,31 +369,213 @@ def csv_loader(filename):
         raise RuntimeError(f"Error loading CSV file '{filename}': {e}")
 
 
-def read_data(filename):
+def iter_documents(filename, pdf_backend=None):
     """
-    Determines file type by its extension and loads the corresponding documents or data.
-    Returns a list of documents.
+    Determines file type by its extension and yields its documents as they
+    are loaded.
     """
     file_extension = filename.split(".")[-1].lower()
     try:
         if file_extension == "txt":
-            return text_loader(filename)
+            yield from iter_text_documents(filename)
         elif file_extension == "pdf":
-            return pdf_loader(filename)
+            yield from iter_pdf_documents(filename, filename, pdf_backend)
         else:
             raise ValueError(f"Unsupported file type: {file_extension}")
     except Exception as e:
         raise RuntimeError(f"Error processing file '{filename}': {e}")
 
 
-def data_splitter(filename):
+def read_data(filename, pdf_backend=None):
     """
-    Splits documents into smaller chunks for processing using RecursiveCharacterTextSplitter.
-    Returns the split documents.
+    Determines file type by its extension and loads the corresponding documents or data.
+    Returns a list of documents.
     """
-    documents = read_data(filename)
+    return list(iter_documents(filename, pdf_backend))
+
+
+def text_buffer_loader(buffer, source):
+    """Loads and returns documents from a binary buffer holding a text file."""
+    return list(iter_text_buffer_documents(buffer, source))
+
+
+def iter_text_buffer_documents(buffer, source):
+    """Yields the documents of a binary buffer holding a text file."""
     try:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=10)
-        return text_splitter.split_documents(documents)
+        stream = io.TextIOWrapper(buffer, encoding="utf-8")
+        try:
+            yield from _iter_text_blocks(stream, source)
+        finally:
+            # Leave the caller's buffer open
+            stream.detach()
+    except Exception as e:
+        raise RuntimeError(f"Error loading text file '{source}': {e}")
+
+
+def pdf_buffer_loader(buffer, source, backend=None):
+    """Loads and returns one document per page from a binary buffer holding a PDF."""
+    return list(iter_pdf_documents(buffer, source, backend))
+
+
+@contextmanager
+def scratch_file(buffer, suffix=""):
+    """
+    Copies a buffer to a uniquely named temporary file for loaders that need
+    a path, and removes the file afterwards.
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as scratch:
+        shutil.copyfileobj(buffer, scratch)
+    try:
+        yield scratch.name
+    finally:
+        os.remove(scratch.name)
+
+
+def iter_documents_from_buffer(buffer, filename, pdf_backend=None):
+    """
+    Yields documents from a binary file-like object such as BytesIO or a
+    SpooledTemporaryFile, using the filename's extension to pick the loader.
+    Text and PDF files are parsed straight from the buffer; other types
+    raise ValueError.
+    """
+    file_extension = filename.split(".")[-1].lower()
+    if file_extension not in ("txt", "pdf"):
+        raise ValueError(f"Unsupported file type: {file_extension}")
+    try:
+        if file_extension == "txt":
+            yield from iter_text_buffer_documents(buffer, filename)
+        else:
+            yield from iter_pdf_documents(buffer, filename, pdf_backend)
+    except Exception as e:
+        raise RuntimeError(f"Error processing file '{filename}': {e}")
+
+
+def read_data_from_buffer(buffer, filename, pdf_backend=None):
+    """Loads and returns the documents of a file held in a binary buffer."""
+    return list(iter_documents_from_buffer(buffer, filename, pdf_backend))
+
+
+def _overlap_tail(text, size):
+    """Returns up to ``size`` trailing characters of text, starting at a word."""
+    if size <= 0 or not text:
+        return ""
+    if len(text) <= size:
+        return text
+    start = len(text) - size
+    while start < len(text) and not text[start - 1].isspace():
+        start += 1
+    return text[start:].lstrip()
+
+
+def iter_split_documents(
+    documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+):
+    """
+    Splits documents into chunks one document at a time, yielding each chunk
+    as soon as it is produced.
+
+    The last ``chunk_overlap`` characters of each document's final chunk are
+    carried into the next document, so overlap is preserved across page
+    boundaries without holding more than one page in memory. The carry is
+    joined with a newline, unless the document starts with whitespace, as
+    the blocks after the first of a text file do.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    carry = ""
+    try:
+        for document in documents:
+            if not document.page_content.strip():
+                continue
+            text = document.page_content
+            if carry:
+                separator = "" if text[:1].isspace() else "\n"
+                text = f"{carry}{separator}{text}"
+            chunks = text_splitter.split_text(text)
+            for chunk in chunks:
+                yield Document(page_content=chunk, metadata=dict(document.metadata))
+            carry = _overlap_tail(chunks[-1], chunk_overlap) if chunks else ""
+    except RuntimeError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Error splitting documents: {e}")
+
+
+def remove_ws(page):
+    """Remove any newlines, extra spaces, etc., from page content."""
+    page_content = page.page_content.replace("\n", " ").strip()
+    page.page_content = page_content
+    return page
+
+
+def iter_faiss_split_documents(documents):
+    """
+    Splits documents into the chunks FAISS indexes are built from, one
+    document at a time. Each document is cut into sections, flattened onto
+    one line and split into chunks of FAISS_CHUNK_SIZE characters.
+
+    Online builds, rebuilds, bulk appends and the offline builder all split
+    with this, so chunks of one index always match.
+    """
+    page_splitter = RecursiveCharacterTextSplitter()
+    text_splitter = CharacterTextSplitter(
+        separator="\n",
+        chunk_size=FAISS_CHUNK_SIZE,
+        chunk_overlap=FAISS_CHUNK_OVERLAP,
+        length_function=len,
+    )
+    # Both splitters work on each page independently, so splitting page by
+    # page gives the same chunks as splitting the whole list at once
+    for page in documents:
+        for section in page_splitter.split_documents([page]):
+            yield from text_splitter.split_documents([remove_ws(section)])
+
+
+def iter_faiss_data_splitter(filename, pdf_backend=None):
+    """Yields the FAISS chunks of a file on disk as it is parsed."""
+    return iter_faiss_split_documents(iter_documents(filename, pdf_backend))
+
+
+def faiss_data_splitter(filename, pdf_backend=None):
+    """
+    Loads a file from disk and splits it into FAISS chunks.
+    Returns the split documents.
+    """
+    return list(iter_faiss_data_splitter(filename, pdf_backend))
+
+
+def split_documents(documents):
+    """
+    Splits documents into smaller chunks for processing using RecursiveCharacterTextSplitter.
+    Returns the split documents.
+    """
+    return list(iter_split_documents(documents))
+
+
+def iter_data_splitter(filename, pdf_backend=None):
+    """Yields the chunks of a file on disk as it is parsed."""
+    return iter_split_documents(iter_documents(filename, pdf_backend))
+
+
+def data_splitter(filename, pdf_backend=None):
+    """
+    Loads a file from disk and splits it into chunks.
+    Returns the split documents.
+    """
+    return list(iter_data_splitter(filename, pdf_backend))
+
+
+def iter_buffer_splitter(buffer, filename, pdf_backend=None):
+    """Yields the chunks of a file held in a binary buffer as it is parsed."""
+    return iter_split_documents(
+        iter_documents_from_buffer(buffer, filename, pdf_backend)
+    )
+
+
+def buffer_splitter(buffer, filename, pdf_backend=None):
+    """
+    Loads a file from a binary buffer and splits it into chunks.
+    Returns the split documents.
+    """
+    return list(iter_buffer_splitter(buffer, filename, pdf_backend))
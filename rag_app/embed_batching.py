@@ -0,0 +1,111 @@
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from .config import EMBED_BATCH_MAX, EMBED_BATCH_WINDOW_MS
+
+
+class _Batch:
+    def __init__(self):
+        self.texts = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent embedding calls into one call of ``embed_batch``.
+
+    The first caller of a batch leads it: it embeds the batch on its own
+    thread and hands every caller its rows. Batches of a batcher are
+    embedded one at a time. While one runs, the leader of the next waits up
+    to ``window`` seconds, or until ``max_batch`` texts have joined, and the
+    batch keeps collecting until the running one is done, so batches grow
+    with the load instead of the callers competing for the cores. An idle
+    batcher embeds right away, adding no latency. Calls of ``max_batch``
+    texts or more are embedded directly.
+    """
+
+    def __init__(
+        self,
+        embed_batch,
+        window: float = EMBED_BATCH_WINDOW_MS / 1000,
+        max_batch: int = EMBED_BATCH_MAX,
+    ):
+        self.embed_batch = embed_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._open = None
+
+    def embed(self, texts):
+        """
+        Returns the vectors of ``texts``, embedded along with those of
+        concurrent callers.
+
+        Returns:
+        - Rows of what ``embed_batch`` returns, one per text.
+        """
+        texts = list(texts)
+        if self.window <= 0 or len(texts) >= self.max_batch:
+            return self.embed_batch(texts)
+
+        with self._lock:
+            batch = self._open
+            leader = batch is None or len(batch.texts) + len(texts) > self.max_batch
+            if leader:
+                # A full batch stays with its leader; later callers start another
+                batch = self._open = _Batch()
+            start = len(batch.texts)
+            batch.texts.extend(texts)
+            if len(batch.texts) >= self.max_batch:
+                batch.full.set()
+
+        if leader:
+            self._run(batch)
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.vectors[start : start + len(texts)]
+
+    def _run(self, batch: _Batch):
+        if self._run_lock.locked():
+            batch.full.wait(self.window)
+        with self._run_lock:
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            try:
+                batch.vectors = self.embed_batch(batch.texts)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    LangChain Embeddings whose embed_query() calls are coalesced into
+    embed_documents() calls of the wrapped model. Only wrap models whose
+    query vectors are their document vectors, as with HuggingFaceEmbeddings.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        window: float = EMBED_BATCH_WINDOW_MS / 1000,
+        max_batch: int = EMBED_BATCH_MAX,
+    ):
+        self.embeddings = embeddings
+        self._batcher = MicroBatcher(embeddings.embed_documents, window, max_batch)
+
+    def embed_documents(self, texts):
+        # Document embedding is batched by its callers already
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str):
+        return self._batcher.embed([text])[0]
@@ -0,0 +1,352 @@
+"""
+Embedding service: one process that owns the sentence-transformers models
+and embeds texts for every API worker and ingestion job on the host.
+
+Models run on their configured backend, torch or ONNX Runtime (see
+rag_app.embedding_backends).
+
+Workers set EMBEDDING_SERVICE_SOCKET and get an EmbeddingServiceClient
+from get_embeddings() instead of loading the model themselves, so a host
+holds one copy of each model, and EMBEDDING_SERVICE_THREADS bounds the
+inference threads of all workers together. Each model embeds one batch at
+a time with every inference thread, rather than workers oversubscribing
+the cores with concurrent batches, and small requests arriving together,
+such as the query embeddings of concurrent chats, share one batch.
+
+Protocol, over a Unix stream socket, one request at a time per connection:
+
+- Request: a 4-byte big-endian length, then a JSON object
+  ``{"op": "embed", "model": name, "texts": [...]}`` (or ``{"op": "ping"}``).
+- Response: a header of status (1 byte), dimension (4 bytes) and payload
+  length (8 bytes), big-endian, then the payload. On success the payload
+  is the row-major little-endian float32 matrix of the vectors, sent
+  straight from the model's output array and received into the buffer the
+  client's array is built on. On error it is a UTF-8 message.
+
+Usage:
+    python -m rag_app.embedding_service --socket /run/agentx/embed.sock
+    EMBEDDING_SERVICE_SOCKET=/run/agentx/embed.sock python serve.py
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import (
+    EMBED_BATCH_SIZE,
+    EMBEDDING_SERVICE_SOCKET,
+    EMBEDDING_SERVICE_THREADS,
+    EMBEDDING_SERVICE_TIMEOUT,
+    PRELOAD_EMBEDDING_MODELS,
+)
+from .embed_batching import MicroBatcher
+from .embedding_backends import load_sentence_transformer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+_REQUEST_HEADER = struct.Struct("!I")
+_RESPONSE_HEADER = struct.Struct("!BIQ")
+_STATUS_OK = 0
+_STATUS_ERROR = 1
+
+# Vectors travel as little-endian float32, the models' native output
+VECTOR_DTYPE = np.dtype("<f4")
+
+# Largest request the service reads, to bound the memory one client can take
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+class EmbeddingServiceError(RuntimeError):
+    """Raised when the embedding service rejects or fails a request."""
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Embedding service connection closed.")
+        received += count
+    return buffer
+
+
+class EmbeddingServiceClient(Embeddings):
+    """
+    LangChain Embeddings backed by the embedding service, a drop-in for
+    HuggingFaceEmbeddings of the same model.
+
+    Each thread keeps its own connection, opened on first use and reopened
+    once if the service restarted in between.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        socket_path: str = EMBEDDING_SERVICE_SOCKET,
+        timeout: float = EMBEDDING_SERVICE_TIMEOUT,
+    ):
+        if not socket_path:
+            raise ValueError("The embedding service socket path is not set.")
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        # A forked process must not share its parent's connection
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _request(self, request: dict):
+        payload = json.dumps(request).encode("utf-8")
+        message = _REQUEST_HEADER.pack(len(payload)) + payload
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(message)
+                status, dim, size = _RESPONSE_HEADER.unpack(
+                    _recv_exactly(sock, _RESPONSE_HEADER.size)
+                )
+                body = _recv_exactly(sock, size)
+                break
+            except ConnectionError:
+                # The service may have restarted since the connection opened
+                self._close()
+                if attempt:
+                    raise
+            except OSError:
+                self._close()
+                raise
+        if status != _STATUS_OK:
+            raise EmbeddingServiceError(body.decode("utf-8", "replace"))
+        return dim, body
+
+    def embed_documents_array(self, texts) -> np.ndarray:
+        """Returns the vectors of ``texts`` as one float32 array, without copying."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=VECTOR_DTYPE)
+        dim, body = self._request(
+            {"op": "embed", "model": self.model_name, "texts": texts}
+        )
+        return np.frombuffer(body, dtype=VECTOR_DTYPE).reshape(-1, dim)
+
+    def embed_documents(self, texts):
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_query(self, text: str):
+        return self.embed_documents_array([text])[0].tolist()
+
+    def ping(self) -> bool:
+        """Returns whether the service answers."""
+        try:
+            self._request({"op": "ping"})
+        except (OSError, EmbeddingServiceError):
+            return False
+        return True
+
+
+class _Model:
+    """
+    A loaded model, the lock that lets it run one batch at a time and the
+    batcher that coalesces concurrent small requests.
+    """
+
+    def __init__(self, model_name: str, threads: int = None):
+        self.model = load_sentence_transformer(model_name, threads=threads)
+        self.lock = threading.Lock()
+        self.batcher = MicroBatcher(self._encode)
+
+    def _encode(self, texts) -> np.ndarray:
+        with self.lock:
+            vectors = self.model.encode(
+                texts, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False
+            )
+        return np.ascontiguousarray(vectors, dtype=VECTOR_DTYPE)
+
+    def embed(self, texts) -> np.ndarray:
+        # Newlines are replaced as HuggingFaceEmbeddings does, so vectors match
+        texts = [text.replace("\n", " ") for text in texts]
+        # Rows of a shared batch are contiguous, so they are sent without a copy
+        return self.batcher.embed(texts)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves the embedding protocol on a Unix socket, one thread per
+    connection. Models are loaded on their first request, or up front with
+    load().
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, threads: int = None):
+        # Inference threads of the ONNX models; torch's are set process-wide
+        self.threads = threads
+        self._models = {}
+        self._models_lock = threading.Lock()
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                # Left behind by a service that is no longer running
+                os.remove(socket_path)
+            else:
+                raise OSError(f"An embedding service is already on {socket_path}.")
+            finally:
+                probe.close()
+        super().__init__(socket_path, _EmbeddingHandler)
+        os.chmod(socket_path, 0o660)
+
+    def load(self, model_name: str) -> _Model:
+        model = self._models.get(model_name)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    logger.info(f"Loading embedding model '{model_name}'.")
+                    model = _Model(model_name, self.threads)
+                    self._models[model_name] = model
+        return model
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class _EmbeddingHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                header = _recv_exactly(sock, _REQUEST_HEADER.size)
+            except ConnectionError:
+                return
+            (size,) = _REQUEST_HEADER.unpack(header)
+            if size > MAX_REQUEST_BYTES:
+                self._send_error(f"Request of {size} bytes exceeds the limit.")
+                return
+            try:
+                request = json.loads(_recv_exactly(sock, size))
+                if request.get("op") == "ping":
+                    sock.sendall(_RESPONSE_HEADER.pack(_STATUS_OK, 0, 0))
+                    continue
+                if request.get("op") != "embed":
+                    raise ValueError(f"Unknown operation '{request.get('op')}'.")
+                model = self.server.load(request["model"])
+                vectors = model.embed(request["texts"])
+            except ConnectionError:
+                return
+            except Exception as e:
+                logger.exception("Embedding request failed.")
+                self._send_error(str(e))
+                continue
+            sock.sendall(
+                _RESPONSE_HEADER.pack(_STATUS_OK, vectors.shape[1], vectors.nbytes)
+            )
+            sock.sendall(memoryview(vectors).cast("B"))
+
+    def _send_error(self, message: str):
+        body = message.encode("utf-8")
+        self.request.sendall(_RESPONSE_HEADER.pack(_STATUS_ERROR, 0, len(body)))
+        self.request.sendall(body)
+
+
+def _set_inference_threads(threads: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m rag_app.embedding_service",
+        description="Serve sentence-transformers embeddings over a Unix socket.",
+    )
+    parser.add_argument(
+        "--socket",
+        default=EMBEDDING_SERVICE_SOCKET,
+        required=EMBEDDING_SERVICE_SOCKET is None,
+        help="Socket path (default: EMBEDDING_SERVICE_SOCKET)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=EMBEDDING_SERVICE_THREADS,
+        help="Inference threads shared by all models",
+    )
+    parser.add_argument(
+        "--model",
+        action="append",
+        default=[],
+        help="Model to load at startup; repeatable. The models of registered "
+        "indexes and PRELOAD_EMBEDDING_MODELS are loaded as well.",
+    )
+    args = parser.parse_args(argv)
+
+    import database
+
+    database.init_db()
+    models = dict.fromkeys(
+        args.model + PRELOAD_EMBEDDING_MODELS + database.list_embedding_models()
+    )
+
+    _set_inference_threads(args.threads)
+    server = EmbeddingServer(args.socket, args.threads)
+    for model_name in models:
+        try:
+            server.load(model_name)
+        except Exception:
+            logger.exception(f"Could not load embedding model '{model_name}'.")
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever(), so it must run on another thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info(
+        f"Embedding service listening on {args.socket} with {args.threads} threads."
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
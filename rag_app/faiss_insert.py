@@ -0,0 +1,111 @@
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from functools import partial
+
+import database
+
+from .data_embed import get_embeddings
+from .index_registry import acquire_faiss_index, commit_faiss_index
+from .index_snapshot import ensure_faiss_artifact
+from .ingest_pipeline import IngestPipeline, iter_embedded_windows
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def open_faiss_index(user_id: str, index_name: str):
+    """
+    Pins the live store of a FAISS index for changes made in place, first
+    building its artifact if it has none yet.
+
+    Yields:
+    - tuple: The LockedFAISS store and the index's embedding model.
+    """
+    ensure_faiss_artifact(user_id, index_name)
+    _, _, embedding, _ = database.get_data_from_faiss_db(user_id, index_name)
+    embeddings = get_embeddings(embedding)
+    lease = acquire_faiss_index(user_id, index_name, embeddings)
+    if lease is None:
+        raise RuntimeError(f"Index '{index_name}' has no FAISS artifact.")
+    with lease as vector_store:
+        yield vector_store, embeddings
+
+
+def insert_data_to_faiss(vector_store, embeddings, docs, file_name: str, progress=None):
+    """
+    Embeds documents and appends them to a live FAISS store.
+
+    Each embedded window is added in one write, so searches wait for at most
+    one window at a time; embedding runs outside the lock, overlapped with
+    the writes. Every chunk records ``file_name`` as its source. If anything
+    fails, the chunks added so far are removed again.
+
+    Returns:
+    - list: The docstore IDs of the added chunks.
+    """
+    added = []
+    try:
+        with IngestPipeline() as pipeline:
+            embedded = pipeline.stage("embed", iter_embedded_windows(embeddings, docs))
+            for window, vectors in embedded:
+                if progress:
+                    progress.add_total(len(window))
+                    progress.add_embedded(len(window))
+                text_embeddings = [
+                    (doc.page_content, vector) for doc, vector in zip(window, vectors)
+                ]
+                metadatas = [{**doc.metadata, "source": file_name} for doc in window]
+                added.extend(
+                    vector_store.add_embeddings(
+                        text_embeddings,
+                        metadatas=metadatas,
+                        ids=[uuid.uuid4().hex for _ in window],
+                    )
+                )
+                if progress:
+                    progress.add_upserted(len(window))
+    except BaseException:
+        vector_store.discard(added)
+        raise
+    return added
+
+
+def _is_from_file(file_name: str, doc) -> bool:
+    return os.path.basename(str(doc.metadata.get("source", ""))) == file_name
+
+
+def _drop_file(file_name: str, manifest: dict) -> dict:
+    files = [f for f in manifest.get("files", []) if f["file_name"] != file_name]
+    return {**manifest, "files": files}
+
+
+def delete_document_from_faiss(user_id: str, index_name: str, file_name: str) -> int:
+    """
+    Removes every chunk of one source file from a FAISS index and persists
+    the result as the index's next generation. Searches keep running while
+    the chunks are looked up and saved, and wait only for the removal
+    itself.
+
+    Returns:
+    - int: Number of vectors deleted.
+    """
+    with open_faiss_index(user_id, index_name) as (vector_store, _):
+        ids = vector_store.find_ids(partial(_is_from_file, file_name))
+        if not ids:
+            logger.info(f"No chunks of '{file_name}' found in Index '{index_name}'.")
+            return 0
+        deleted = vector_store.discard(ids)
+        commit_faiss_index(
+            user_id,
+            index_name,
+            vector_store,
+            edit_manifest=partial(_drop_file, file_name),
+        )
+    logger.info(f"Deleted {deleted} vectors of '{file_name}' from '{index_name}'.")
+    return deleted
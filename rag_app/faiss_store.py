@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import uuid
+
+import faiss
+from langchain_community.vectorstores import FAISS
+
+from .config import FAISS_INDEX_DIR, FAISS_MMAP
+from .index_lock import ReadWriteLock
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Artifact layout: LangChain's index.faiss and index.pkl plus our manifest
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+MANIFEST_FILE = "index.json"
+ARTIFACT_VERSION = 1
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class LockedFAISS(FAISS):
+    """
+    A FAISS store that is safe to search while it is being modified.
+
+    FAISS indexes and the docstore beside them must not be read while they
+    are mutated. Searches hold ``lock`` for reading, so they run in
+    parallel; adds and deletes hold it for writing, one call at a time.
+    Writers should pass whole batches, so searches are held up once per
+    batch rather than once per vector. Queries are embedded before the lock
+    is taken.
+    """
+
+    def __init__(self, *args, lock: ReadWriteLock = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = lock or ReadWriteLock()
+
+    @classmethod
+    def from_store(cls, store: FAISS, lock: ReadWriteLock = None):
+        """Wraps the index and docstore of an existing FAISS store."""
+        return cls(
+            store.embedding_function,
+            store.index,
+            store.docstore,
+            store.index_to_docstore_id,
+            relevance_score_fn=store.override_relevance_score_fn,
+            normalize_L2=store._normalize_L2,
+            distance_strategy=store.distance_strategy,
+            lock=lock,
+        )
+
+    def similarity_search_with_score_by_vector(self, *args, **kwargs):
+        with self.lock.read():
+            return super().similarity_search_with_score_by_vector(*args, **kwargs)
+
+    def max_marginal_relevance_search_with_score_by_vector(self, *args, **kwargs):
+        with self.lock.read():
+            return super().max_marginal_relevance_search_with_score_by_vector(
+                *args, **kwargs
+            )
+
+    def get_by_ids(self, ids):
+        with self.lock.read():
+            return super().get_by_ids(ids)
+
+    def save_local(self, folder_path: str, index_name: str = "index"):
+        with self.lock.read():
+            super().save_local(folder_path, index_name)
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        with self.lock.write():
+            return super().add_embeddings(
+                text_embeddings, metadatas=metadatas, ids=ids, **kwargs
+            )
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        # Embed outside the lock, then add the batch in one write
+        texts = list(texts)
+        embeddings = self._embed_documents(texts)
+        return self.add_embeddings(
+            zip(texts, embeddings), metadatas=metadatas, ids=ids, **kwargs
+        )
+
+    def delete(self, ids=None, **kwargs):
+        with self.lock.write():
+            return super().delete(ids, **kwargs)
+
+    def discard(self, ids) -> int:
+        """
+        Deletes whichever of ``ids`` are still in the store, in one write.
+
+        Returns:
+        - int: The number of vectors removed.
+        """
+        with self.lock.write():
+            present = set(self.index_to_docstore_id.values())
+            ids = [id_ for id_ in ids if id_ in present]
+            if ids:
+                super().delete(ids)
+        return len(ids)
+
+    def find_ids(self, predicate) -> list:
+        """Returns the IDs of the stored documents ``predicate`` accepts."""
+        with self.lock.read():
+            return [
+                id_
+                for id_ in self.index_to_docstore_id.values()
+                if predicate(self.docstore.search(id_))
+            ]
+
+    def merge_from(self, target: FAISS):
+        with self.lock.write():
+            super().merge_from(target)
+
+
+def _path_segment(name: str) -> str:
+    segment = _UNSAFE_PATH_CHARS.sub("_", name)
+    # Never let a name resolve to the current or parent directory
+    return segment if segment.strip(".") else f"_{segment}"
+
+
+def faiss_index_dir(user_id: str, index_name: str, root: str = FAISS_INDEX_DIR) -> str:
+    """Returns the default artifact folder of a user's FAISS index."""
+    return os.path.join(root, _path_segment(user_id), _path_segment(index_name))
+
+
+def staging_dir(index_path: str) -> str:
+    """Creates an empty folder next to ``index_path`` to build an artifact in."""
+    parent = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(parent, exist_ok=True)
+    path = f"{index_path}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(path)
+    return path
+
+
+def publish_faiss_artifact(staging_path: str, index_path: str, manifest: dict) -> dict:
+    """
+    Writes the manifest of a staged artifact and moves it to ``index_path``.
+
+    A previous artifact at ``index_path`` is renamed aside before the new
+    one is renamed in, so a reader sees either complete artifact but may
+    find none in between. Indexes published to their default generation
+    folders never hit that window, since each generation gets a new folder.
+
+    Returns:
+    - dict: The manifest as written, including vector count and dimension.
+    """
+    index = faiss.read_index(
+        os.path.join(staging_path, INDEX_FILE), faiss.IO_FLAG_MMAP
+    )
+    manifest = {
+        **manifest,
+        "version": ARTIFACT_VERSION,
+        "vectors": index.ntotal,
+        "dimension": index.d,
+    }
+    with open(os.path.join(staging_path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    retired_path = None
+    if os.path.exists(index_path):
+        retired_path = f"{index_path}.old-{uuid.uuid4().hex}"
+        os.replace(index_path, retired_path)
+    os.replace(staging_path, index_path)
+    if retired_path:
+        shutil.rmtree(retired_path, ignore_errors=True)
+
+    logger.info(
+        f"Saved FAISS index with {manifest['vectors']} vectors to '{index_path}'."
+    )
+    return manifest
+
+
+def save_faiss_index(vector_store, index_path: str, manifest: dict) -> dict:
+    """
+    Writes a FAISS index, its docstore and a manifest to ``index_path``.
+
+    The artifact is written to a sibling folder and moved into place once
+    complete by publish_faiss_artifact, so a reader never sees a half-written
+    index and a failed build leaves the previous artifact untouched.
+
+    Returns:
+    - dict: The manifest as written, including vector count and dimension.
+    """
+    staging_path = staging_dir(index_path)
+    try:
+        vector_store.save_local(staging_path)
+        return publish_faiss_artifact(staging_path, index_path, manifest)
+    except BaseException:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+
+
+def write_faiss_docstore(path: str, docstore, index_to_docstore_id: dict):
+    """Writes a docstore in the layout FAISS.load_local expects."""
+    with open(os.path.join(path, DOCSTORE_FILE), "wb") as f:
+        pickle.dump((docstore, index_to_docstore_id), f)
+
+
+def read_faiss_docstore(index_path: str):
+    """
+    Returns the ``(docstore, index_to_docstore_id)`` pair of an artifact.
+    The docstore is a pickle, so only artifacts written here are read.
+    """
+    with open(os.path.join(index_path, DOCSTORE_FILE), "rb") as f:
+        return pickle.load(f)
+
+
+def read_faiss_manifest(index_path: str) -> dict:
+    """Returns the manifest of a FAISS index artifact."""
+    with open(os.path.join(index_path, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def load_faiss_index(
+    index_path: str, embeddings, mmap: bool = FAISS_MMAP, lock: ReadWriteLock = None
+):
+    """
+    Loads a FAISS index artifact written by save_faiss_index as a
+    LockedFAISS store guarded by ``lock``.
+
+    With ``mmap`` the index is opened with IO_FLAG_MMAP, so its pages are
+    read on demand and shared between processes serving the same artifact.
+    ``embeddings`` must be the model the index was built with; it is only
+    used to embed queries.
+    """
+    flags = faiss.IO_FLAG_MMAP if mmap else 0
+    index = faiss.read_index(os.path.join(index_path, INDEX_FILE), flags)
+    docstore, index_to_docstore_id = read_faiss_docstore(index_path)
+    return LockedFAISS(embeddings, index, docstore, index_to_docstore_id, lock=lock)
+
+
+def delete_faiss_index(index_path: str):
+    """Removes a FAISS index artifact folder, if it exists."""
+    shutil.rmtree(index_path, ignore_errors=True)
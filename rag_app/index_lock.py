@@ -0,0 +1,131 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LockStats:
+    """Acquisition counts and wait times of one side of a ReadWriteLock."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, waited: float):
+        self.acquired += 1
+        if waited > 0:
+            self.contended += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def as_dict(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "mean_wait_ms": round(
+                self.wait_seconds * 1000 / self.acquired if self.acquired else 0.0, 3
+            ),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+        }
+
+
+class ReadWriteLock:
+    """
+    Lets any number of readers, or a single writer, hold the lock.
+
+    The lock is phase-fair: a reader arriving while a writer holds or waits
+    for the lock waits for that one writer only, and readers waiting when a
+    writer releases are admitted before the next writer. Writers therefore
+    never starve, and a steady stream of small write batches delays a
+    search by at most one batch. Time spent waiting is recorded per side.
+
+    Usage:
+        with lock.read():
+            index.search(vectors, k)
+        with lock.write():
+            index.add(vectors)
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+        self._readers_waiting = 0
+        # Readers a released writer let through ahead of the next writer
+        self._reader_grants = 0
+        self._write_epoch = 0
+        self.read_stats = LockStats()
+        self.write_stats = LockStats()
+
+    def acquire_read(self):
+        with self._cond:
+            waited = 0.0
+            if self._writer or self._writers_waiting:
+                started = time.perf_counter()
+                epoch = self._write_epoch
+                self._readers_waiting += 1
+                while self._writer or (
+                    self._writers_waiting and self._write_epoch == epoch
+                ):
+                    self._cond.wait()
+                self._readers_waiting -= 1
+                if self._write_epoch != epoch and self._reader_grants:
+                    self._reader_grants -= 1
+                    if not self._reader_grants:
+                        self._cond.notify_all()
+                waited = time.perf_counter() - started
+            self._readers += 1
+            self.read_stats.record(waited)
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            waited = 0.0
+            if self._writer or self._readers or self._reader_grants:
+                started = time.perf_counter()
+                self._writers_waiting += 1
+                while self._writer or self._readers or self._reader_grants:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                waited = time.perf_counter() - started
+            self._writer = True
+            self.write_stats.record(waited)
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._write_epoch += 1
+            self._reader_grants = self._readers_waiting
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def stats(self) -> dict:
+        """Returns the wait-time counters of both sides."""
+        with self._cond:
+            return {
+                "read": self.read_stats.as_dict(),
+                "write": self.write_stats.as_dict(),
+            }
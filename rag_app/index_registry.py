@@ -0,0 +1,520 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+import database
+
+from .data_embed import get_embeddings, is_inherited_onnx_model
+from .faiss_store import (
+    LockedFAISS,
+    delete_faiss_index,
+    faiss_index_dir,
+    load_faiss_index,
+    read_faiss_manifest,
+    save_faiss_index,
+)
+from .index_lock import ReadWriteLock
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class IndexGeneration:
+    """
+    One immutable build of an index, shared by the searches running on it.
+
+    Its version is ``(index_id, generation)``: the id of the index's
+    faiss_db row, which is never reused, and the generation number, which
+    starts over when an index is deleted and created again. Versions order
+    the builds of a name across its incarnations.
+    """
+
+    def __init__(self, key, version: tuple, index_path: str, vector_store):
+        self.key = key
+        self.version = version
+        self.generation = version[1]
+        self.index_path = index_path
+        self.vector_store = vector_store
+        self.refs = 0
+        self.retired = False
+        self.on_released = None
+
+
+class IndexRegistry:
+    """
+    Serves every index from its current generation and swaps generations
+    atomically.
+
+    A search pins the generation it starts on with acquire(). A rebuild
+    installs the next generation with publish(), a single pointer swap
+    under a lock, so new searches move over at once while running ones
+    finish on the generation they pinned. A retired generation is released,
+    and its artifact removed, when its last search completes.
+
+    Every index also has a ReadWriteLock that its LockedFAISS stores search
+    and mutate under, so appends and deletes can be applied to the live
+    generation, and a writer mutex that orders the changes and publishes
+    of one index within this process.
+
+    Usage:
+        with INDEX_REGISTRY.acquire(key, index_path, version, load) as store:
+            store.similarity_search(question)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = {}
+        self._load_locks = {}
+        self._rw_locks = {}
+        self._writer_locks = {}
+
+    def _pin_current(self, key, version: tuple):
+        with self._lock:
+            entry = self._current.get(key)
+            if entry is not None and entry.version >= version:
+                entry.refs += 1
+                return entry
+        return None
+
+    def _load_lock(self, key):
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def lock(self, key) -> ReadWriteLock:
+        """Returns the readers-writer lock that guards the stores of ``key``."""
+        with self._lock:
+            return self._rw_locks.setdefault(key, ReadWriteLock())
+
+    @contextmanager
+    def writer(self, key):
+        """Serializes the changes and publishes of ``key`` in this process."""
+        with self._lock:
+            writer_lock = self._writer_locks.setdefault(key, threading.RLock())
+        with writer_lock:
+            yield
+
+    def current(self, key):
+        """Returns the generation of ``key`` served right now, without pinning it."""
+        with self._lock:
+            return self._current.get(key)
+
+    def lock_stats(self) -> dict:
+        """Returns the lock wait-time counters of every index, by key."""
+        with self._lock:
+            locks = dict(self._rw_locks)
+        return {key: lock.stats() for key, lock in locks.items()}
+
+    def _guard(self, key, vector_store):
+        # Stores are searched and mutated under the index's lock
+        lock = self.lock(key)
+        if isinstance(vector_store, LockedFAISS):
+            vector_store.lock = lock
+            return vector_store
+        return LockedFAISS.from_store(vector_store, lock)
+
+    def pin(self, key, index_path: str, version: tuple, load) -> IndexGeneration:
+        """
+        Returns the current generation of ``key`` with its reference count
+        raised, loading ``index_path`` with ``load`` if this process has not
+        seen ``version`` yet. Pair every call with release().
+        """
+        entry = self._pin_current(key, version)
+        if entry is not None:
+            return entry
+        # Searches arriving during a load wait for it instead of loading too
+        with self._load_lock(key):
+            entry = self._pin_current(key, version)
+            if entry is not None:
+                return entry
+            vector_store = self._guard(key, load(index_path))
+            entry = IndexGeneration(key, version, index_path, vector_store)
+            entry.refs = 1
+            self._install(entry)
+            return entry
+
+    def release(self, entry: IndexGeneration):
+        """Drops a reference taken by pin()."""
+        with self._lock:
+            entry.refs -= 1
+            drained = entry.retired and entry.refs == 0
+        if drained:
+            self._free(entry)
+
+    @contextmanager
+    def acquire(self, key, index_path: str, version: tuple, load):
+        """Pins the current generation for the duration of a ``with`` block."""
+        entry = self.pin(key, index_path, version, load)
+        try:
+            yield entry.vector_store
+        finally:
+            self.release(entry)
+
+    def publish(
+        self, key, version: tuple, index_path: str, vector_store=None, on_released=None
+    ):
+        """
+        Makes generation ``version`` current and retires the previous one.
+
+        Without a ``vector_store`` the next search loads ``index_path``.
+        ``on_released`` runs once no search uses the previous generation any
+        more, or straight away if this process was not serving it.
+        """
+        entry = None
+        if vector_store is not None:
+            vector_store = self._guard(key, vector_store)
+            entry = IndexGeneration(key, version, index_path, vector_store)
+        with self._lock:
+            previous = self._current.get(key)
+            if previous is not None and previous.version >= version:
+                # A newer generation was already installed; drop this one
+                return False
+            if entry is not None:
+                self._current[key] = entry
+            else:
+                self._current.pop(key, None)
+            if previous is not None:
+                previous.retired = True
+                previous.on_released = on_released
+                drained = previous.refs == 0
+        logger.info(f"Index {key} now serves generation {version[1]}.")
+        if previous is None:
+            if on_released:
+                on_released()
+        elif drained:
+            self._free(previous)
+        return True
+
+    def evict(self, key, on_released=None):
+        """Stops serving ``key``; running searches finish on what they pinned."""
+        with self._lock:
+            previous = self._current.pop(key, None)
+            self._load_locks.pop(key, None)
+            self._rw_locks.pop(key, None)
+            if previous is not None:
+                previous.retired = True
+                previous.on_released = on_released
+                drained = previous.refs == 0
+        if previous is None:
+            if on_released:
+                on_released()
+        elif drained:
+            self._free(previous)
+
+    def forget(self, predicate):
+        """
+        Drops the current generations whose store matches ``predicate``
+        without releasing them, for a forked child whose copies of them are
+        unusable. The next search of each index loads it again.
+        """
+        with self._lock:
+            for key, entry in list(self._current.items()):
+                if predicate(entry.vector_store):
+                    del self._current[key]
+
+    def _install(self, entry: IndexGeneration):
+        with self._lock:
+            previous = self._current.get(entry.key)
+            if previous is not None and previous.version >= entry.version:
+                # Published while this one loaded; serve it once, then free it
+                entry.retired = True
+                return
+            self._current[entry.key] = entry
+            if previous is not None:
+                previous.retired = True
+                drained = previous.refs == 0
+        if previous is not None and drained:
+            self._free(previous)
+
+    def _free(self, entry: IndexGeneration):
+        entry.vector_store = None
+        logger.info(f"Released generation {entry.generation} of index {entry.key}.")
+        if entry.on_released:
+            try:
+                entry.on_released()
+            except Exception:
+                logger.exception(
+                    f"Cleanup of generation {entry.generation} of {entry.key} failed."
+                )
+
+
+# Process-wide registry of loaded FAISS indexes, keyed by (user_id, index_name)
+INDEX_REGISTRY = IndexRegistry()
+
+
+def _forget_inherited_onnx_stores():
+    # Stores preloaded by a parent embed queries with its ONNX model, whose
+    # inference threads this child does not have
+    INDEX_REGISTRY.forget(
+        lambda store: is_inherited_onnx_model(
+            getattr(store, "embedding_function", None)
+        )
+    )
+
+
+# Runs after data_embed's own hook, which was registered on its import
+os.register_at_fork(after_in_child=_forget_inherited_onnx_stores)
+
+
+def incarnation_dir(user_id: str, index_name: str, index_id: int) -> str:
+    """
+    Returns the folder of the generations of one incarnation of a FAISS
+    index, so an index created again under the same name never writes to,
+    or deletes, the folders of the one it replaced.
+    """
+    return os.path.join(faiss_index_dir(user_id, index_name), str(index_id))
+
+
+def generation_dir(
+    user_id: str, index_name: str, generation: int, index_id: int
+) -> str:
+    """Returns the artifact folder of one generation of a FAISS index."""
+    return os.path.join(
+        incarnation_dir(user_id, index_name, index_id), f"{generation:06d}"
+    )
+
+
+def publish_faiss_index(
+    user_id: str,
+    index_name: str,
+    write,
+    vector_store=None,
+    index_path: str = None,
+    file_name: str = None,
+    file_path: str = None,
+    base_version: tuple = None,
+) -> dict:
+    """
+    Builds the next generation of a registered FAISS index and swaps it in.
+
+    ``write(path)`` writes the artifact and returns its manifest; by default
+    the path is a new generation folder. The database pointer is moved
+    only after the artifact is complete, then this process's registry is
+    updated, with ``vector_store`` preloaded if given. The previous
+    generation's folder, and the file it was built from if ``file_path``
+    replaces it, are removed once its searches drain. Readers are
+    never blocked and never see a partial index. Publishes of one index are
+    serialized within this process.
+
+    ``base_version`` is the version of the generation that ``write`` saves a
+    changed copy of. The publish then only succeeds if that generation is
+    still live in the database, whichever process changed it since.
+
+    Returns:
+    - dict: The artifact manifest, with the published ``generation``.
+
+    Raises:
+    - RuntimeError: If ``base_version`` is no longer live; nothing is
+      published, and this process stops serving its copy of it.
+    """
+    key = (user_id, index_name)
+    with INDEX_REGISTRY.writer(key):
+        generation, index_id = database.allocate_faiss_generation(user_id, index_name)
+        if base_version is not None and base_version[0] != index_id:
+            _reject_stale_change(key, index_name)
+        index_path = index_path or generation_dir(
+            user_id, index_name, generation, index_id
+        )
+        manifest = write(index_path)
+        published, previous_path, previous_file = database.publish_faiss_generation(
+            user_id,
+            index_name,
+            generation,
+            index_path,
+            embedding=manifest.get("embedding"),
+            file_name=file_name,
+            file_path=file_path,
+            base_generation=base_version[1] if base_version else None,
+        )
+        if not published and base_version is not None:
+            if index_path.startswith(faiss_index_dir(user_id, index_name) + os.sep):
+                delete_faiss_index(index_path)
+            _reject_stale_change(key, index_name)
+        if not published:
+            # A build that started later has already been published
+            logger.warning(
+                f"Discarding generation {generation} of index '{index_name}'; "
+                "a newer generation is live."
+            )
+            if index_path.startswith(faiss_index_dir(user_id, index_name) + os.sep):
+                delete_faiss_index(index_path)
+            return {**manifest, "generation": None}
+
+        # Only sibling generation folders are ours to remove
+        if not (
+            previous_path
+            and previous_path != index_path
+            and os.path.dirname(previous_path) == os.path.dirname(index_path)
+        ):
+            previous_path = None
+        # A generation built from a new upload replaces the previous upload
+        if not (file_path and previous_file and previous_file != file_path):
+            previous_file = None
+        on_released = partial(_remove_previous, previous_path, previous_file)
+        INDEX_REGISTRY.publish(
+            (user_id, index_name),
+            (index_id, generation),
+            index_path,
+            vector_store,
+            on_released,
+        )
+        return {**manifest, "generation": generation}
+
+
+def _remove_previous(index_path: str = None, file_path: str = None):
+    if index_path:
+        delete_faiss_index(index_path)
+    if file_path and os.path.isfile(file_path):
+        os.remove(file_path)
+
+
+def _reject_stale_change(key, index_name: str):
+    # The changed store is behind the database; the next search loads the
+    # live generation instead
+    INDEX_REGISTRY.evict(key)
+    raise RuntimeError(
+        f"Index '{index_name}' was changed by another process while it was "
+        "being modified; retry the change."
+    )
+
+
+def commit_faiss_index(
+    user_id: str, index_name: str, vector_store, edit_manifest=None
+) -> dict:
+    """
+    Persists changes made in place to the live store of a FAISS index by
+    publishing it as the next generation.
+
+    The store is saved under its read lock, so searches continue while
+    further writes wait. ``edit_manifest``, if given, receives the current
+    generation's manifest and returns the one to save. The publish is a
+    compare-and-swap on the generation the store was loaded from, so changes
+    that another worker published in the meantime are never overwritten.
+
+    Raises:
+    - RuntimeError: If another generation replaced the store while it was
+      being modified, in this process or another; the changes are not
+      persisted.
+    """
+    key = (user_id, index_name)
+    with INDEX_REGISTRY.writer(key):
+        entry = INDEX_REGISTRY.current(key)
+        if entry is None or entry.vector_store is not vector_store:
+            raise RuntimeError(
+                f"Index '{index_name}' was rebuilt while it was being modified; "
+                "retry the change."
+            )
+        manifest = read_faiss_manifest(entry.index_path)
+        if edit_manifest:
+            manifest = edit_manifest(manifest)
+        return publish_faiss_index(
+            user_id,
+            index_name,
+            partial(save_faiss_index, vector_store, manifest=manifest),
+            vector_store=vector_store,
+            base_version=entry.version,
+        )
+
+
+def faiss_lock_stats() -> list:
+    """
+    Returns the read and write lock wait times of every FAISS index served
+    by this process.
+    """
+    return [
+        {"user_id": user_id, "index_name": index_name, **stats}
+        for (user_id, index_name), stats in INDEX_REGISTRY.lock_stats().items()
+    ]
+
+
+def acquire_faiss_index(user_id: str, index_name: str, embeddings):
+    """
+    Pins the live generation of a FAISS index for the caller's searches.
+
+    Returns:
+    - A context manager yielding the FAISS vector store, or None if the
+      index has no prebuilt artifact and must be built from its file.
+    """
+    key = (user_id, index_name)
+    index_path, generation, index_id = database.get_faiss_index_generation(
+        user_id, index_name
+    )
+    if not index_path:
+        if INDEX_REGISTRY.current(key) is not None:
+            # Deleted, or recreated without an artifact, by another process
+            INDEX_REGISTRY.evict(key)
+        return None
+
+    def load(path):
+        return load_faiss_index(path, embeddings)
+
+    try:
+        entry = INDEX_REGISTRY.pin(key, index_path, (index_id, generation), load)
+    except FileNotFoundError:
+        # Another process swapped generations and removed this one meanwhile
+        index_path, generation, index_id = database.get_faiss_index_generation(
+            user_id, index_name
+        )
+        if not index_path:
+            return None
+        entry = INDEX_REGISTRY.pin(key, index_path, (index_id, generation), load)
+    return _lease(entry)
+
+
+@contextmanager
+def _lease(entry: IndexGeneration):
+    try:
+        yield entry.vector_store
+    finally:
+        INDEX_REGISTRY.release(entry)
+
+
+def preload_faiss_indexes() -> int:
+    """
+    Loads the live generation of every FAISS index with a prebuilt artifact
+    into this process's registry, with its embedding model.
+
+    Run before forking workers, the indexes are shared by them: artifacts
+    are mapped with IO_FLAG_MMAP, so their pages come from the page cache,
+    and the docstores are inherited copy-on-write. Indexes that fail to load
+    are logged and skipped; they load on their first search instead.
+
+    Returns:
+    - int: The number of indexes loaded.
+    """
+    loaded = 0
+    for user_id, index_name, embedding in database.list_faiss_artifacts():
+        try:
+            lease = acquire_faiss_index(user_id, index_name, get_embeddings(embedding))
+        except Exception:
+            logger.exception(f"Could not preload FAISS index '{index_name}'.")
+            continue
+        if lease is not None:
+            with lease:
+                loaded += 1
+    return loaded
+
+
+def drop_faiss_index(
+    user_id: str, index_name: str, index_path: str = None, index_id: int = None
+):
+    """
+    Stops serving a deleted FAISS index and removes its artifacts once
+    running searches have finished.
+
+    Only the deleted incarnation's generation folders and ``index_path`` are
+    removed, never the index's root folder, which an index created again
+    under the same name may already be using.
+    """
+
+    def remove():
+        if index_id is not None:
+            delete_faiss_index(incarnation_dir(user_id, index_name, index_id))
+        if index_path:
+            delete_faiss_index(index_path)
+
+    INDEX_REGISTRY.evict((user_id, index_name), remove)
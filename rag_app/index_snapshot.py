@@ -0,0 +1,466 @@
+"""
+Exports and imports FAISS indexes as self-contained snapshot archives.
+
+A snapshot is an uncompressed tar holding, in this order:
+
+- snapshot.json: format version, index name, embedding model, PDF backend,
+  index spec (FAISS type, metric, dimension, vector count), the chunk
+  manifest of the source files, and the size and SHA-256 of every member.
+- index.faiss: the FAISS index, byte for byte as FAISS wrote it.
+- docstore.jsonl: one chunk per line, in vector order.
+
+Members are verified against their checksums while the archive is read.
+The docstore travels as JSON, never as a pickle, so importing an archive
+cannot execute code. A restored snapshot is an ordinary artifact folder
+that is loaded with IO_FLAG_MMAP, so a new node serves an index by copying
+its snapshot instead of re-embedding the source files.
+
+Usage:
+    python -m rag_app.index_snapshot export --user-id alice --index-name handbook
+    python -m rag_app.index_snapshot import handbook.snapshot.tar --user-id alice
+    python -m rag_app.index_snapshot verify handbook.snapshot.tar
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import uuid
+from functools import partial
+
+import database
+import faiss
+from fastapi import HTTPException
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from .build_index import register_faiss_index
+from .config import UPLOAD_CHUNK_SIZE
+from .faiss_store import (
+    INDEX_FILE,
+    delete_faiss_index,
+    faiss_index_dir,
+    publish_faiss_artifact,
+    read_faiss_docstore,
+    read_faiss_manifest,
+    save_faiss_index,
+    staging_dir,
+    write_faiss_docstore,
+)
+from .index_registry import publish_faiss_index
+from .rag_main import build_faiss_from_file
+
+SNAPSHOT_FORMAT = "agentx-faiss-snapshot"
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_MANIFEST = "snapshot.json"
+SNAPSHOT_INDEX = INDEX_FILE
+SNAPSHOT_DOCSTORE = "docstore.jsonl"
+SNAPSHOT_MEMBERS = (SNAPSHOT_INDEX, SNAPSHOT_DOCSTORE)
+
+# snapshot.json is read into memory before anything is verified
+MAX_MANIFEST_BYTES = 16 * 1024 * 1024
+
+# Artifact manifest keys that snapshot.json records at the top level
+_TOP_LEVEL_KEYS = ("version", "vectors", "dimension", "embedding", "pdf_backend")
+
+_METRICS = {faiss.METRIC_L2: "l2", faiss.METRIC_INNER_PRODUCT: "inner_product"}
+
+
+class SnapshotError(ValueError):
+    """Raised when an archive is not a valid, intact index snapshot."""
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_member(stream, target):
+    """Copies a tar member to ``target`` (or nowhere) and returns its digest and size."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+        if target is not None:
+            target.write(chunk)
+    return digest.hexdigest(), size
+
+
+def ensure_faiss_artifact(user_id: str, index_name: str) -> str:
+    """
+    Returns the artifact folder of a FAISS index, first building it as the
+    index's next generation if the index has so far been rebuilt from its
+    uploaded file on every query.
+    """
+    file_name, file_path, embedding, index_path = database.get_data_from_faiss_db(
+        user_id, index_name
+    )
+    if index_path and os.path.isdir(index_path):
+        return index_path
+
+    pdf_backend = database.get_index_pdf_backend(user_id, index_name)
+    vector_store, manifest = build_faiss_from_file(
+        file_path, file_name, embedding, pdf_backend
+    )
+    publish_faiss_index(
+        user_id,
+        index_name,
+        partial(save_faiss_index, vector_store, manifest=manifest),
+        vector_store=vector_store,
+    )
+    # A concurrent rebuild may have published a newer generation instead
+    index_path, _, _ = database.get_faiss_index_generation(user_id, index_name)
+    return index_path
+
+
+def write_snapshot(index_path: str, dest: str, index_name: str) -> dict:
+    """
+    Packages the artifact in ``index_path`` into a snapshot archive at
+    ``dest``. The archive is written under a temporary name and renamed into
+    place once complete.
+
+    Returns:
+    - dict: The snapshot manifest.
+    """
+    artifact = read_faiss_manifest(index_path)
+    index = faiss.read_index(os.path.join(index_path, INDEX_FILE), faiss.IO_FLAG_MMAP)
+    docstore, index_to_docstore_id = read_faiss_docstore(index_path)
+
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    partial_path = f"{dest}.part"
+    with tempfile.TemporaryDirectory(dir=dest_dir) as scratch:
+        docstore_path = os.path.join(scratch, SNAPSHOT_DOCSTORE)
+        with open(docstore_path, "w", encoding="utf-8") as f:
+            for position in range(index.ntotal):
+                doc_id = index_to_docstore_id[position]
+                doc = docstore.search(doc_id)
+                entry = {
+                    "id": doc_id,
+                    "page_content": doc.page_content,
+                    "metadata": doc.metadata,
+                }
+                f.write(json.dumps(entry, default=str) + "\n")
+
+        paths = {
+            SNAPSHOT_INDEX: os.path.join(index_path, INDEX_FILE),
+            SNAPSHOT_DOCSTORE: docstore_path,
+        }
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created_at": time.time(),
+            "index_name": index_name,
+            "embedding": artifact["embedding"],
+            "pdf_backend": artifact.get("pdf_backend"),
+            "index": {
+                "type": type(index).__name__,
+                "metric": _METRICS.get(index.metric_type, str(index.metric_type)),
+                "dimension": index.d,
+                "vectors": index.ntotal,
+            },
+            "artifact": {
+                key: value
+                for key, value in artifact.items()
+                if key not in _TOP_LEVEL_KEYS
+            },
+            "members": {
+                name: {"size": os.path.getsize(path), "sha256": _sha256_file(path)}
+                for name, path in paths.items()
+            },
+        }
+
+        try:
+            with tarfile.open(partial_path, "w", format=tarfile.PAX_FORMAT) as tar:
+                data = json.dumps(manifest, indent=2).encode("utf-8")
+                info = tarfile.TarInfo(SNAPSHOT_MANIFEST)
+                info.size = len(data)
+                info.mtime = int(manifest["created_at"])
+                tar.addfile(info, io.BytesIO(data))
+                for name, path in paths.items():
+                    tar.add(path, arcname=name)
+            os.replace(partial_path, dest)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+    return manifest
+
+
+def _check_manifest(manifest: dict):
+    if not isinstance(manifest, dict) or manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError("Archive is not an index snapshot.")
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(
+            f"Unsupported snapshot version {manifest.get('version')}; "
+            f"expected {SNAPSHOT_VERSION}."
+        )
+    members = manifest.get("members")
+    if not isinstance(members, dict) or set(members) != set(SNAPSHOT_MEMBERS):
+        raise SnapshotError("Snapshot manifest does not list the expected members.")
+
+
+def read_snapshot(fileobj, staging_path: str = None) -> dict:
+    """
+    Reads a snapshot archive as a stream and verifies every member against
+    the checksums in its manifest. With ``staging_path`` the members are
+    also extracted there.
+
+    Returns:
+    - dict: The snapshot manifest.
+
+    Raises:
+    - SnapshotError: If the archive is not a snapshot or a member is
+      missing, unexpected or corrupt.
+    """
+    manifest = None
+    verified = set()
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            for member in tar:
+                if manifest is None:
+                    if (
+                        member.name != SNAPSHOT_MANIFEST
+                        or not member.isfile()
+                        or member.size > MAX_MANIFEST_BYTES
+                    ):
+                        raise SnapshotError("Archive is not an index snapshot.")
+                    manifest = json.load(tar.extractfile(member))
+                    _check_manifest(manifest)
+                    continue
+
+                expected = manifest["members"].get(member.name)
+                if expected is None or not member.isfile() or member.name in verified:
+                    raise SnapshotError(f"Unexpected snapshot member '{member.name}'.")
+                stream = tar.extractfile(member)
+                if staging_path is None:
+                    digest, size = _copy_member(stream, None)
+                else:
+                    # Member names come from the fixed SNAPSHOT_MEMBERS set
+                    with open(os.path.join(staging_path, member.name), "wb") as target:
+                        digest, size = _copy_member(stream, target)
+                if size != expected.get("size") or digest != expected.get("sha256"):
+                    raise SnapshotError(
+                        f"Checksum mismatch for snapshot member '{member.name}'."
+                    )
+                verified.add(member.name)
+    except (tarfile.TarError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise SnapshotError(f"Archive is not a readable index snapshot: {e}")
+
+    if manifest is None:
+        raise SnapshotError("Archive is not an index snapshot.")
+    missing = set(SNAPSHOT_MEMBERS) - verified
+    if missing:
+        raise SnapshotError(f"Snapshot is missing {', '.join(sorted(missing))}.")
+    return manifest
+
+
+def _rebuild_docstore(staging_path: str, manifest: dict):
+    docstore_path = os.path.join(staging_path, SNAPSHOT_DOCSTORE)
+    documents = {}
+    index_to_docstore_id = {}
+    try:
+        with open(docstore_path, encoding="utf-8") as f:
+            for position, line in enumerate(f):
+                entry = json.loads(line)
+                doc_id = str(entry["id"])
+                documents[doc_id] = Document(
+                    page_content=entry["page_content"],
+                    metadata=entry.get("metadata") or {},
+                )
+                index_to_docstore_id[position] = doc_id
+    except (KeyError, TypeError, ValueError) as e:
+        raise SnapshotError(f"Snapshot docstore is malformed: {e}")
+    os.remove(docstore_path)
+
+    index = faiss.read_index(
+        os.path.join(staging_path, INDEX_FILE), faiss.IO_FLAG_MMAP
+    )
+    spec = manifest.get("index", {})
+    if index.ntotal != len(index_to_docstore_id) or index.ntotal != spec.get(
+        "vectors"
+    ):
+        raise SnapshotError(
+            f"Snapshot holds {index.ntotal} vectors but "
+            f"{len(index_to_docstore_id)} chunks."
+        )
+    if index.d != spec.get("dimension"):
+        raise SnapshotError(
+            f"Snapshot index has dimension {index.d}, "
+            f"manifest says {spec.get('dimension')}."
+        )
+    write_faiss_docstore(
+        staging_path, InMemoryDocstore(documents), index_to_docstore_id
+    )
+
+
+def restore_snapshot(fileobj, index_path: str) -> dict:
+    """
+    Verifies a snapshot archive and installs it as the artifact folder
+    ``index_path``, replacing any previous artifact only once the snapshot
+    is fully verified.
+
+    Returns:
+    - dict: The snapshot manifest.
+    """
+    staging_path = staging_dir(index_path)
+    try:
+        manifest = read_snapshot(fileobj, staging_path)
+        _rebuild_docstore(staging_path, manifest)
+        publish_faiss_artifact(
+            staging_path,
+            index_path,
+            {
+                **manifest.get("artifact", {}),
+                "embedding": manifest["embedding"],
+                "pdf_backend": manifest.get("pdf_backend"),
+                "snapshot": {
+                    "index_name": manifest.get("index_name"),
+                    "created_at": manifest.get("created_at"),
+                },
+            },
+        )
+    except BaseException:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+    return manifest
+
+
+def export_index_snapshot(user_id: str, index_name: str, dest: str) -> dict:
+    """
+    Writes a snapshot of a user's FAISS index to ``dest``.
+
+    Returns:
+    - dict: The snapshot manifest.
+
+    Raises:
+    - SnapshotError: If the index is not a FAISS index.
+    """
+    index_type = database.get_index_name_type_db(user_id, index_name)
+    if index_type != "FAISS":
+        raise SnapshotError(
+            f"Only FAISS indexes can be exported; '{index_name}' is {index_type}."
+        )
+    index_path = ensure_faiss_artifact(user_id, index_name)
+    return write_snapshot(index_path, dest, index_name)
+
+
+def _move_artifact(source: str, index_path: str) -> dict:
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    os.replace(source, index_path)
+    return read_faiss_manifest(index_path)
+
+
+def import_index_snapshot(fileobj, user_id: str, index_name: str) -> dict:
+    """
+    Restores a snapshot as the next generation of a user's FAISS index,
+    creating the index if needed. Agents querying an existing index switch
+    to the snapshot atomically once it is verified and in place.
+
+    Returns:
+    - dict: The snapshot manifest.
+
+    Raises:
+    - SnapshotError: If the archive is invalid or the name is used by a
+      Pinecone index.
+    """
+    index_type = database.find_index_type_db(user_id, index_name)
+    if index_type not in (None, "FAISS"):
+        raise SnapshotError(
+            f"Index '{index_name}' of user '{user_id}' is a {index_type} index."
+        )
+    incoming_path = (
+        f"{faiss_index_dir(user_id, index_name)}.incoming-{uuid.uuid4().hex}"
+    )
+    try:
+        manifest = restore_snapshot(fileobj, incoming_path)
+        source = f"snapshot:{manifest.get('index_name')}"
+        register_faiss_index(
+            user_id,
+            index_name,
+            manifest["embedding"],
+            source,
+            manifest.get("pdf_backend"),
+        )
+        publish_faiss_index(
+            user_id,
+            index_name,
+            partial(_move_artifact, incoming_path),
+            file_name=source,
+            file_path=source,
+        )
+    finally:
+        delete_faiss_index(incoming_path)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m rag_app.index_snapshot",
+        description="Export, import and verify FAISS index snapshots.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write an index snapshot")
+    export_parser.add_argument("--user-id", required=True)
+    export_parser.add_argument("--index-name", required=True)
+    export_parser.add_argument(
+        "-o", "--output", help="Archive path (default: <index-name>.snapshot.tar)"
+    )
+
+    import_parser = commands.add_parser("import", help="Restore an index snapshot")
+    import_parser.add_argument("archive")
+    import_parser.add_argument("--user-id", required=True)
+    import_parser.add_argument(
+        "--index-name", help="Target index (default: the exported index name)"
+    )
+
+    verify_parser = commands.add_parser("verify", help="Check a snapshot's checksums")
+    verify_parser.add_argument("archive")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "export":
+            database.init_db()
+            dest = args.output or f"{args.index_name}.snapshot.tar"
+            manifest = export_index_snapshot(args.user_id, args.index_name, dest)
+            print(f"Exported {manifest['index']['vectors']} vectors to {dest}")
+        elif args.command == "import":
+            database.init_db()
+            with open(args.archive, "rb") as f:
+                index_name = args.index_name
+                if index_name is None:
+                    index_name = read_snapshot(f)["index_name"]
+                    f.seek(0)
+                manifest = import_index_snapshot(f, args.user_id, index_name)
+            print(
+                f"Imported {manifest['index']['vectors']} vectors into index "
+                f"'{index_name}' for user '{args.user_id}'."
+            )
+        else:
+            with open(args.archive, "rb") as f:
+                manifest = read_snapshot(f)
+            json.dump(
+                {key: value for key, value in manifest.items() if key != "artifact"},
+                sys.stdout,
+                indent=2,
+            )
+            print()
+    except (SnapshotError, OSError) as e:
+        parser.exit(1, f"Error: {e}\n")
+    except HTTPException as e:
+        parser.exit(1, f"Error: {e.detail}\n")
+
+
+if __name__ == "__main__":
+    main()
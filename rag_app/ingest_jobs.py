@@ -0,0 +1,620 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+import database
+
+from .config import (
+    BULK_INGEST_WORKERS,
+    EMBED_SORT_WINDOW,
+    INGEST_WORKERS,
+)
+from .data_embed import get_embeddings
+from .document_loader import (
+    iter_documents_from_buffer,
+    iter_faiss_split_documents,
+    iter_split_documents,
+)
+from .faiss_insert import insert_data_to_faiss, open_faiss_index
+from .faiss_store import save_faiss_index
+from .index_registry import commit_faiss_index, publish_faiss_index
+from .ingest_pipeline import IngestPipeline
+from .pine_create import provision_pinecone_index
+from .pine_insert import (
+    insert_data_to_pinecone,
+    open_pinecone_index,
+    update_data_in_pinecone,
+)
+from .rag_main import build_faiss_from_file
+from .uploads import ArchiveEntry, is_archive, iter_archive_entries
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested."""
+
+
+class JobProgress:
+    """
+    Reports the stage and chunk counters of a running ingestion job.
+
+    Ingestion code receives an instance as ``progress`` and calls it after
+    each batch; every call also checks whether the job was cancelled.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.chunks_upserted = 0
+        self._lock = threading.Lock()
+
+    def check_cancelled(self):
+        if database.is_ingest_job_cancel_requested(self.job_id):
+            raise JobCancelled(f"Job '{self.job_id}' was cancelled.")
+
+    def set_stage(self, stage: str, chunks_total: int = None):
+        fields = {"stage": stage}
+        if chunks_total is not None:
+            with self._lock:
+                self.chunks_total = chunks_total
+            fields["chunks_total"] = chunks_total
+        database.update_ingest_job(self.job_id, **fields)
+        self.check_cancelled()
+
+    def add_total(self, count: int):
+        """Grows the chunk total as a streamed file is split."""
+        with self._lock:
+            self.chunks_total += count
+            total = self.chunks_total
+        database.update_ingest_job(self.job_id, chunks_total=total)
+        self.check_cancelled()
+
+    def add_embedded(self, count: int):
+        with self._lock:
+            self.chunks_embedded += count
+            total = self.chunks_embedded
+        database.update_ingest_job(self.job_id, chunks_embedded=total)
+        self.check_cancelled()
+
+    def add_upserted(self, count: int):
+        with self._lock:
+            self.chunks_upserted += count
+            total = self.chunks_upserted
+        database.update_ingest_job(self.job_id, chunks_upserted=total)
+        self.check_cancelled()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=INGEST_WORKERS, thread_name_prefix="ingest"
+            )
+        return _executor
+
+
+def _run_job(job_id: str, task, cleanup):
+    progress = JobProgress(job_id)
+    try:
+        progress.check_cancelled()
+        database.update_ingest_job(
+            job_id, status="running", stage="starting", started_at=time.time()
+        )
+        task(progress)
+        database.update_ingest_job(
+            job_id, status="completed", stage="done", finished_at=time.time()
+        )
+        logger.info(f"Ingestion job '{job_id}' completed.")
+    except JobCancelled:
+        database.update_ingest_job(
+            job_id, status="cancelled", finished_at=time.time()
+        )
+        logger.info(f"Ingestion job '{job_id}' cancelled.")
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        database.update_ingest_job(
+            job_id, status="failed", error=detail, finished_at=time.time()
+        )
+        logger.exception(f"Ingestion job '{job_id}' failed.")
+    finally:
+        if cleanup:
+            try:
+                cleanup()
+            except Exception:
+                logger.exception(f"Cleanup for ingestion job '{job_id}' failed.")
+
+
+def create_ingest_job(
+    user_id: str, index_name: str, file_name: str, content_hash: str = None
+) -> str:
+    """
+    Registers a queued ingestion job and returns its ID.
+    """
+    return database.create_ingest_job(user_id, index_name, file_name, content_hash)
+
+
+def start_ingest_job(job_id: str, task, cleanup=None):
+    """
+    Runs ``task(progress)`` for a registered job on the ingestion worker pool.
+
+    Parameters:
+    - job_id: ID returned by create_ingest_job
+    - task: Callable receiving a JobProgress; raising marks the job failed
+    - cleanup: Optional callable run after the job finishes, e.g. to remove
+      the uploaded file
+    """
+    _get_executor().submit(_run_job, job_id, task, cleanup)
+
+
+def get_ingest_job_status(job_id: str):
+    """
+    Returns the job record with its elapsed time and throughput, or None.
+    """
+    job = database.get_ingest_job(job_id)
+    if job is None:
+        return None
+
+    started_at = job["started_at"]
+    elapsed = None
+    throughput = None
+    if started_at:
+        elapsed = (job["finished_at"] or time.time()) - started_at
+        if elapsed > 0:
+            throughput = round(job["chunks_upserted"] / elapsed, 2)
+        elapsed = round(elapsed, 2)
+
+    return {
+        "job_id": job["id"],
+        "user_id": job["user_id"],
+        "index_name": job["index_name"],
+        "file_name": job["file_name"],
+        "content_hash": job["content_hash"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": {
+            "chunks_total": job["chunks_total"],
+            "chunks_embedded": job["chunks_embedded"],
+            "chunks_upserted": job["chunks_upserted"],
+        },
+        "elapsed_seconds": elapsed,
+        "chunks_per_second": throughput,
+        "cancel_requested": bool(job["cancel_requested"]),
+        "error": job["error"],
+        "report": json.loads(job["report"]) if job["report"] else None,
+    }
+
+
+def cancel_ingest_job(job_id: str) -> bool:
+    """
+    Requests cancellation of a queued or running job.
+
+    A queued job is cancelled before it starts; a running job stops at its
+    next progress update.
+    """
+    return database.request_ingest_job_cancel(job_id)
+
+
+def _provision_index(pinecone_setup, index_name: str):
+    """
+    Creates the index, waits for it to become ready and returns a handle.
+    """
+    host = provision_pinecone_index(pinecone_setup, index_name)
+    return open_pinecone_index(pinecone_setup.pinecone_api_key, index_name, host)
+
+
+def _stage_chunks(
+    pipeline: IngestPipeline,
+    buffer,
+    file_name: str,
+    pdf_backend,
+    split=iter_split_documents,
+):
+    """
+    Parses and splits an upload in two pipeline stages and returns the chunks.
+    ``split`` is the splitter of the target index.
+    """
+    pages = pipeline.stage(
+        "parse", iter_documents_from_buffer(buffer, file_name, pdf_backend)
+    )
+    return pipeline.stage("split", split(pages), queue_size=EMBED_SORT_WINDOW)
+
+
+def run_pinecone_insert(
+    progress: JobProgress,
+    pinecone_setup,
+    user_id: str,
+    index_name: str,
+    embedding: str,
+    buffer,
+    file_name: str,
+    pdf_backend: str = None,
+):
+    """
+    Job task: creates a Pinecone index and ingests one uploaded file into it.
+    The file is parsed straight from ``buffer``; parsing, splitting,
+    embedding and upserting run as concurrent pipeline stages.
+
+    The index is provisioned in the background while the file is parsed and
+    embedded, and the first upsert waits until it reports ready, so a new
+    index is searchable after max(provisioning, embedding) rather than
+    their sum.
+    """
+    progress.set_stage("provisioning")
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="provision") as pool:
+        index_ready = pool.submit(_provision_index, pinecone_setup, index_name)
+
+        progress.set_stage("parsing")
+        with IngestPipeline() as pipeline:
+            docs = _stage_chunks(pipeline, buffer, file_name, pdf_backend)
+            # The model loads, on first use, while the first pages are parsed
+            embeddings = get_embeddings(embedding)
+            insert_data_to_pinecone(
+                embeddings=embeddings,
+                docs=docs,
+                api_key=pinecone_setup.pinecone_api_key,
+                index_name=index_name,
+                user_id=user_id,
+                file_name=file_name,
+                dimension=pinecone_setup.dimension,
+                progress=progress,
+                index_ready=index_ready,
+            )
+
+
+def run_pinecone_update(
+    progress: JobProgress,
+    pinecone_api_key: str,
+    user_id: str,
+    index_name: str,
+    embedding: str,
+    dimension: int,
+    buffer,
+    file_name: str,
+    pdf_backend: str = None,
+):
+    """
+    Job task: replaces one file's chunks in an existing Pinecone index.
+    The file is parsed straight from ``buffer``; parsing, splitting,
+    embedding and upserting run as concurrent pipeline stages.
+    """
+    progress.set_stage("parsing")
+    with IngestPipeline() as pipeline:
+        docs = _stage_chunks(pipeline, buffer, file_name, pdf_backend)
+        # The model loads, on first use, while the first pages are parsed
+        embeddings = get_embeddings(embedding)
+        update_data_in_pinecone(
+            embeddings=embeddings,
+            docs=docs,
+            api_key=pinecone_api_key,
+            index_name=index_name,
+            user_id=user_id,
+            file_name=file_name,
+            dimension=dimension,
+            progress=progress,
+        )
+
+
+def run_faiss_rebuild(
+    progress: JobProgress,
+    user_id: str,
+    index_name: str,
+    file_path: str,
+    file_name: str,
+):
+    """
+    Job task: builds the next generation of a FAISS index from an uploaded
+    file and swaps it in once complete. Agents keep answering from the
+    current generation, at full speed, until the swap. The upload is
+    removed unless its generation is published, and then replaces the
+    file of the previous one.
+    """
+    published = False
+    try:
+        _, _, embedding, _ = database.get_data_from_faiss_db(user_id, index_name)
+        pdf_backend = database.get_index_pdf_backend(user_id, index_name)
+
+        progress.set_stage("building")
+        vector_store, manifest = build_faiss_from_file(
+            file_path, file_name, embedding, pdf_backend
+        )
+        progress.set_stage("publishing", chunks_total=vector_store.index.ntotal)
+        manifest = publish_faiss_index(
+            user_id,
+            index_name,
+            partial(save_faiss_index, vector_store, manifest=manifest),
+            vector_store=vector_store,
+            file_name=file_name,
+            file_path=file_path,
+        )
+        published = manifest["generation"] is not None
+    finally:
+        if not published and os.path.isfile(file_path):
+            os.remove(file_path)
+
+    if published:
+        # Track the served file like an insert does, so deleting removes it
+        database.insert_into_file_uploads(user_id, index_name, file_name, file_path)
+        database.update_file_upload(user_id, index_name, file_name, file_path)
+        logger.info(
+            f"Index '{index_name}' rebuilt as generation {manifest['generation']}."
+        )
+
+
+# File types bulk ingestion can parse
+BULK_FILE_SUFFIXES = (".pdf", ".txt")
+
+
+def _iter_bulk_entries(uploads):
+    """
+    Yields an ArchiveEntry for every file of a bulk upload, expanding
+    archives one member at a time.
+    """
+    for file_name, buffer in uploads:
+        if not is_archive(file_name):
+            yield ArchiveEntry(file_name, buffer, None)
+            continue
+        try:
+            yield from iter_archive_entries(buffer, file_name)
+        except Exception as e:
+            yield ArchiveEntry(file_name, None, f"Could not read archive: {e}")
+
+
+def _skipped_bulk_entry(entry):
+    """
+    Returns the report entry of a file that cannot be ingested, closing it,
+    or None if the file is ingestible.
+    """
+    supported = entry.name.lower().endswith(BULK_FILE_SUFFIXES)
+    if not entry.error and supported:
+        return None
+    if entry.file:
+        entry.file.close()
+    extension = os.path.splitext(entry.name)[1]
+    return {
+        "file_name": entry.name,
+        "status": "failed" if entry.error else "skipped",
+        "chunks": 0,
+        "seconds": 0.0,
+        "error": entry.error or f"Unsupported file type: '{extension}'",
+    }
+
+
+def _ingest_bulk_entry(progress, embeddings, index_ready, entry, pdf_backend, **target):
+    """
+    Ingests one file of a bulk upload and returns its report entry.
+    Failures are reported rather than raised, except cancellation.
+    """
+    report = {"file_name": entry.name, "status": "completed", "chunks": 0, "error": None}
+    started = time.monotonic()
+    try:
+        with IngestPipeline() as pipeline:
+            docs = _stage_chunks(pipeline, entry.file, entry.name, pdf_backend)
+            report["chunks"] = insert_data_to_pinecone(
+                embeddings=embeddings,
+                docs=docs,
+                file_name=entry.name,
+                progress=progress,
+                index_ready=index_ready,
+                **target,
+            )
+    except JobCancelled:
+        raise
+    except Exception as e:
+        report["status"] = "failed"
+        report["error"] = getattr(e, "detail", None) or str(e)
+    finally:
+        entry.file.close()
+    report["seconds"] = round(time.monotonic() - started, 2)
+    return report
+
+
+def _finish_bulk_report(progress: JobProgress, report: list, failed: int):
+    """
+    Records how many files of a bulk job failed. Raises, failing the job,
+    if no file was ingested.
+    """
+    error = f"{failed} of {len(report)} files failed." if failed else None
+    if not any(r["status"] == "completed" for r in report):
+        raise RuntimeError(" ".join(filter(None, ["No files were ingested.", error])))
+    if error:
+        database.update_ingest_job(progress.job_id, error=error)
+
+
+def run_pinecone_bulk_insert(
+    progress: JobProgress,
+    pinecone_api_key: str,
+    user_id: str,
+    index_name: str,
+    embedding: str,
+    dimension: int,
+    uploads,
+    pdf_backend: str = None,
+    pinecone_setup=None,
+):
+    """
+    Job task: ingests many files, or the files inside zip/tar archives, into
+    one Pinecone index.
+
+    Entries are extracted one at a time and ingested concurrently on
+    BULK_INGEST_WORKERS threads, each running its own parse/split/embed/
+    upsert pipeline with a shared embedding model. Every chunk carries its
+    file name in the metadata. A per-file report of chunks, time and errors
+    is stored on the job as files finish; one file failing does not stop
+    the others, but the job fails if the index cannot be provisioned or
+    opened, or if no file is ingested.
+
+    Parameters:
+    - uploads: List of ``(file_name, buffer)`` pairs
+    - pinecone_setup: Setup of a new index to provision, or None to write
+      into an existing one
+    """
+    report = []
+    failed = 0
+    progress.set_stage("provisioning" if pinecone_setup else "starting")
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="provision") as pool:
+        if pinecone_setup:
+            index_ready = pool.submit(_provision_index, pinecone_setup, index_name)
+        else:
+            index_ready = pool.submit(open_pinecone_index, pinecone_api_key, index_name)
+
+        embeddings = get_embeddings(embedding)
+        progress.set_stage("ingesting")
+
+        def record(done):
+            nonlocal failed
+            for future in done:
+                entry_report = future.result()
+                failed += entry_report["status"] != "completed"
+                report.append(entry_report)
+            database.update_ingest_job(progress.job_id, report=json.dumps(report))
+
+        with ThreadPoolExecutor(
+            max_workers=BULK_INGEST_WORKERS, thread_name_prefix="bulk"
+        ) as workers:
+            in_flight = set()
+            pending_files = {}
+            try:
+                for entry in _iter_bulk_entries(uploads):
+                    skipped = _skipped_bulk_entry(entry)
+                    if skipped:
+                        failed += skipped["status"] == "failed"
+                        report.append(skipped)
+                        continue
+
+                    # Bound the number of extracted files waiting in memory
+                    if len(in_flight) >= BULK_INGEST_WORKERS * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        record(done)
+                    future = workers.submit(
+                        _ingest_bulk_entry,
+                        progress,
+                        embeddings,
+                        index_ready,
+                        entry,
+                        pdf_backend,
+                        api_key=pinecone_api_key,
+                        index_name=index_name,
+                        user_id=user_id,
+                        dimension=dimension,
+                    )
+                    in_flight.add(future)
+                    pending_files[future] = entry.file
+                done, in_flight = wait(in_flight)
+                record(done)
+            finally:
+                # Entries that never started still own an open buffer
+                for future in in_flight:
+                    if future.cancel():
+                        pending_files[future].close()
+
+        # Fail the job with the provisioning error rather than per file
+        index_ready.result()
+
+    _finish_bulk_report(progress, report, failed)
+
+
+def _add_files(files, manifest: dict) -> dict:
+    return {**manifest, "files": manifest.get("files", []) + files}
+
+
+def run_faiss_bulk_insert(
+    progress: JobProgress,
+    user_id: str,
+    index_name: str,
+    uploads,
+    pdf_backend: str = None,
+):
+    """
+    Job task: appends many files, or the files inside zip/tar archives, to
+    an existing FAISS index while it keeps serving queries.
+
+    Files are parsed, split and embedded one at a time, and every embedded
+    window is added to the live index in a single write, so searches run in
+    parallel with the ingest and wait for at most one window. Once all files
+    are in, the index is saved and published as its next generation. A file
+    that fails is rolled back and reported; cancelling or failing the job
+    rolls back every file. The job fails if no file is ingested.
+
+    Parameters:
+    - uploads: List of ``(file_name, buffer)`` pairs
+    """
+    report = []
+    failed = 0
+    progress.set_stage("loading")
+    with open_faiss_index(user_id, index_name) as (vector_store, embeddings):
+        progress.set_stage("ingesting")
+        added = []
+        try:
+            for entry in _iter_bulk_entries(uploads):
+                entry_report = _skipped_bulk_entry(entry)
+                if entry_report is None:
+                    entry_report = {
+                        "file_name": entry.name,
+                        "status": "completed",
+                        "chunks": 0,
+                        "error": None,
+                    }
+                    started = time.monotonic()
+                    try:
+                        with IngestPipeline() as pipeline:
+                            # Chunk like the files the index was built from
+                            docs = _stage_chunks(
+                                pipeline,
+                                entry.file,
+                                entry.name,
+                                pdf_backend,
+                                split=iter_faiss_split_documents,
+                            )
+                            ids = insert_data_to_faiss(
+                                vector_store, embeddings, docs, entry.name, progress
+                            )
+                        added.extend(ids)
+                        entry_report["chunks"] = len(ids)
+                    except JobCancelled:
+                        raise
+                    except Exception as e:
+                        entry_report["status"] = "failed"
+                        entry_report["error"] = getattr(e, "detail", None) or str(e)
+                    finally:
+                        entry.file.close()
+                    entry_report["seconds"] = round(time.monotonic() - started, 2)
+                failed += entry_report["status"] == "failed"
+                report.append(entry_report)
+                database.update_ingest_job(progress.job_id, report=json.dumps(report))
+
+            if added:
+                progress.set_stage("publishing")
+                files = [
+                    {"file_name": r["file_name"], "chunks": r["chunks"]}
+                    for r in report
+                    if r["status"] == "completed"
+                ]
+                manifest = commit_faiss_index(
+                    user_id,
+                    index_name,
+                    vector_store,
+                    edit_manifest=partial(_add_files, files),
+                )
+                logger.info(
+                    f"Appended {len(added)} chunks to '{index_name}' as "
+                    f"generation {manifest['generation']}."
+                )
+        except BaseException:
+            vector_store.discard(added)
+            raise
+
+    _finish_bulk_report(progress, report, failed)
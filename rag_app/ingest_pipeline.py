@@ -0,0 +1,211 @@
+import logging
+import queue
+import threading
+import time
+
+from langchain_community.vectorstores import FAISS
+
+from .config import EMBED_BATCH_SIZE, EMBED_SORT_WINDOW, PIPELINE_QUEUE_SIZE
+from .data_embed import embed_documents_batched
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+# How often blocked stages re-check whether the pipeline was stopped
+_POLL_SECONDS = 0.1
+
+# Per-thread time spent waiting on upstream queues, shared across pipelines
+# so a stage fed by another pipeline's stage is timed correctly
+_wait_times = threading.local()
+
+
+def iter_windows(items, size: int):
+    """
+    Groups an iterable into lists of at most ``size`` items.
+    """
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+class IngestPipeline:
+    """
+    Runs ingestion stages concurrently, connected by bounded queues.
+
+    Each stage iterates a (usually lazy) iterable in its own thread and puts
+    the items on a queue that the next stage reads from. A full queue blocks
+    its producer, so a slow stage throttles the ones before it and memory
+    stays flat. The first error in any stage stops the whole pipeline and is
+    re-raised to whoever reads from it.
+
+    Usage:
+        with IngestPipeline() as pipeline:
+            pages = pipeline.stage("parse", iter_documents(path))
+            chunks = pipeline.stage("split", iter_split_documents(pages))
+            write(chunks)
+    """
+
+    def __init__(self, queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._stopped = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._threads = []
+        self._stats = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stage(self, name: str, items, queue_size: int = None):
+        """
+        Starts a thread that iterates ``items`` and returns an iterator over
+        its output, buffered by a queue of at most ``queue_size`` items.
+        """
+        out = queue.Queue(maxsize=queue_size or self.queue_size)
+        thread = threading.Thread(
+            target=self._run_stage,
+            args=(name, items, out),
+            name=f"ingest-{name}",
+            daemon=True,
+        )
+        self._threads.append(thread)
+        thread.start()
+        return self._drain(out)
+
+    def close(self):
+        """Stops every stage, waits for the threads and logs stage timings."""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+        if self._stats:
+            summary = ", ".join(
+                f"{name}: {count} items in {active:.2f}s"
+                for name, (count, active) in self._stats.items()
+            )
+            logger.info(f"Ingestion pipeline stages - {summary}")
+
+    def _fail(self, error: BaseException):
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+        self._stopped.set()
+
+    def _put(self, out: queue.Queue, item) -> bool:
+        while True:
+            try:
+                out.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                if self._stopped.is_set():
+                    return False
+
+    def _drain(self, out: queue.Queue):
+        while True:
+            started = time.perf_counter()
+            try:
+                item = out.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    raise self._error or RuntimeError("Ingestion pipeline stopped.")
+                continue
+            finally:
+                # Time blocked on upstream is not counted as the reader's work
+                _wait_times.waited = getattr(_wait_times, "waited", 0.0) + (
+                    time.perf_counter() - started
+                )
+            if item is _DONE:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+    def _run_stage(self, name: str, items, out: queue.Queue):
+        _wait_times.waited = 0.0
+        count = 0
+        busy = 0.0
+        iterator = iter(items)
+        try:
+            while not self._stopped.is_set():
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    busy += time.perf_counter() - started
+                if not self._put(out, item):
+                    break
+                count += 1
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception as e:
+                    self._fail(e)
+            self._stats[name] = (count, busy - _wait_times.waited)
+            self._put(out, _DONE)
+
+
+def iter_embedded_windows(
+    embeddings,
+    docs,
+    window_size: int = EMBED_SORT_WINDOW,
+    batch_size: int = EMBED_BATCH_SIZE,
+):
+    """
+    Embeds documents window by window and yields ``(window, vectors)`` pairs
+    with the vectors in document order.
+    """
+    for window in iter_windows(docs, window_size):
+        texts = [doc.page_content for doc in window]
+        yield window, embed_documents_batched(embeddings, texts, batch_size)
+
+
+def add_documents_to_faiss(
+    embeddings, docs, vector_store=None, batch_size: int = EMBED_BATCH_SIZE
+):
+    """
+    Embeds documents in a pipeline stage and adds them to a FAISS store as
+    each window is ready, creating the store from the first window if none
+    is given.
+
+    Returns:
+    - FAISS: The vector store holding the documents.
+    """
+    window_size = max(EMBED_SORT_WINDOW, batch_size)
+    with IngestPipeline() as pipeline:
+        embedded = pipeline.stage(
+            "embed", iter_embedded_windows(embeddings, docs, window_size, batch_size)
+        )
+        for window, vectors in embedded:
+            text_embeddings = [
+                (doc.page_content, vector) for doc, vector in zip(window, vectors)
+            ]
+            metadatas = [doc.metadata for doc in window]
+            if vector_store is None:
+                vector_store = FAISS.from_embeddings(
+                    text_embeddings, embeddings, metadatas=metadatas
+                )
+            else:
+                vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+
+    if vector_store is None:
+        raise ValueError("No documents to add to the FAISS index.")
+    return vector_store
@@ -0,0 +1,187 @@
+"""
+Compares the PDF extraction backends on a sample corpus.
+
+For every installed backend the benchmark reports pages per second and text
+fidelity. Fidelity is the word-level F1 score against a ground-truth text
+file stored next to each PDF (``report.pdf`` -> ``report.txt``) or, when
+there is none, against the reference backend's output.
+
+Usage:
+    python -m rag_app.pdf_benchmark samples/ --reference pypdf
+    python -m rag_app.pdf_benchmark a.pdf b.pdf --backends pypdf pymupdf --json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from .document_loader import PDF_BACKENDS, PdfBackendUnavailable, extract_pdf_pages
+
+_WORD = re.compile(r"\w+")
+
+
+def find_pdfs(paths):
+    """Expands files and directories into a sorted list of PDF paths."""
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                pdfs.extend(
+                    os.path.join(root, name)
+                    for name in files
+                    if name.lower().endswith(".pdf")
+                )
+        else:
+            pdfs.append(path)
+    return sorted(pdfs)
+
+
+def word_f1(text: str, reference: str) -> float:
+    """Returns the F1 score of the word multisets of two texts."""
+    words = Counter(_WORD.findall(text.lower()))
+    reference_words = Counter(_WORD.findall(reference.lower()))
+    if not words and not reference_words:
+        return 1.0
+    overlap = sum((words & reference_words).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(words.values())
+    recall = overlap / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def _ground_truth(pdf_path: str):
+    text_path = os.path.splitext(pdf_path)[0] + ".txt"
+    if not os.path.exists(text_path):
+        return None
+    with open(text_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def run_benchmark(pdfs, backends, reference: str, workers: int = 1):
+    """
+    Extracts every PDF with every backend and returns one result per backend.
+
+    Each result holds the backend name, pages, seconds, pages_per_second,
+    fidelity and the PDFs the backend failed on, or an error when the
+    backend is not installed. PDFs a backend fails on are left out of its
+    speed and fidelity.
+    """
+    texts = {}
+    results = []
+    for backend in backends:
+        pages = 0
+        seconds = 0.0
+        failed = []
+        texts[backend] = {}
+        try:
+            for pdf in pdfs:
+                start = time.perf_counter()
+                try:
+                    page_texts = extract_pdf_pages(
+                        pdf, workers=workers, backend=backend
+                    )
+                except PdfBackendUnavailable:
+                    raise
+                except Exception as e:
+                    failed.append({"pdf": pdf, "error": str(e)})
+                    continue
+                seconds += time.perf_counter() - start
+                pages += len(page_texts)
+                texts[backend][pdf] = "\n".join(page_texts)
+        except PdfBackendUnavailable as e:
+            results.append({"backend": backend, "error": str(e)})
+            continue
+        results.append(
+            {
+                "backend": backend,
+                "pages": pages,
+                "seconds": round(seconds, 3),
+                "pages_per_second": round(pages / seconds, 1) if seconds else None,
+                "failed": failed,
+            }
+        )
+
+    for result in results:
+        if "error" in result:
+            continue
+        scores = []
+        for pdf, text in texts[result["backend"]].items():
+            reference_text = _ground_truth(pdf)
+            if reference_text is None:
+                reference_text = texts.get(reference, {}).get(pdf)
+            if reference_text is not None:
+                scores.append(word_f1(text, reference_text))
+        result["fidelity"] = round(sum(scores) / len(scores), 4) if scores else None
+    return results
+
+
+def _print_table(results, reference: str):
+    print(f"{'backend':<10} {'pages':>7} {'seconds':>9} {'pages/s':>9} {'fidelity':>9}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:<10} {result['error']}")
+            continue
+        pages_per_second = result["pages_per_second"]
+        fidelity = result["fidelity"]
+        print(
+            f"{result['backend']:<10} {result['pages']:>7} {result['seconds']:>9} "
+            f"{pages_per_second if pages_per_second is not None else '-':>9} "
+            f"{fidelity if fidelity is not None else '-':>9}"
+        )
+    print(f"\nFidelity is word F1 against sidecar .txt files, else '{reference}'.")
+    for result in results:
+        for failure in result.get("failed", []):
+            print(f"{result['backend']} failed on {failure['pdf']}: {failure['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m rag_app.pdf_benchmark",
+        description="Compare PDF extraction backends by speed and text fidelity.",
+    )
+    parser.add_argument("paths", nargs="+", help="PDF files or directories")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=list(PDF_BACKENDS),
+        default=list(PDF_BACKENDS),
+        help="Backends to compare (default: all)",
+    )
+    parser.add_argument(
+        "--reference",
+        choices=list(PDF_BACKENDS),
+        default="pypdf",
+        help="Backend used as the fidelity baseline when no .txt file exists",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Extraction processes per document (default: 1, single process)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args(argv)
+
+    pdfs = find_pdfs(args.paths)
+    if not pdfs:
+        parser.error("no PDF files found")
+
+    backends = list(args.backends)
+    if args.reference not in backends:
+        backends.append(args.reference)
+    results = run_benchmark(pdfs, backends, args.reference, args.workers)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        _print_table(results, args.reference)
+
+
+if __name__ == "__main__":
+    main()
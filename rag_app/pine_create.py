@@ -1,21 +1,16 @@
 # Import necessary modules
 import logging
 import os
+import time
 
 import schemas
 import schemas.index_schemas
 from dotenv import load_dotenv
 from fastapi import HTTPException
-from langchain import PromptTemplate
-from langchain.document_loaders import TextLoader
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.llms import HuggingFaceHub
-from langchain.schema.output_parser import StrOutputParser
-from langchain.schema.runnable import RunnablePassthrough
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.vectorstores import Pinecone as pns
 from pinecone import Pinecone, PineconeException, ServerlessSpec
 
+from .config import PINECONE_READY_POLL_SECONDS, PINECONE_READY_TIMEOUT
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,  # Set to DEBUG for more detailed logs
@@ -26,10 +21,20 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Upper bound on the delay between readiness polls
+READY_POLL_MAX_SECONDS = 8.0
+
 
 def create_pinecone_index(
-    pinecone_setup: schemas.index_schemas.PineconeSetup, index_name
+    pinecone_setup: schemas.index_schemas.PineconeSetup, index_name, wait=True
 ):
+    """
+    Creates a serverless Pinecone index.
+
+    With ``wait=False`` the call returns as soon as Pinecone accepts the
+    request instead of blocking until the index is ready; use
+    wait_for_pinecone_index before the first upsert.
+    """
     try:
         api_key = pinecone_setup.pinecone_api_key
         index_name = index_name
@@ -44,7 +49,11 @@ def create_pinecone_index(
         if index_name not in pinecone_client.list_indexes().names():
             spec = ServerlessSpec(cloud=cloud, region=region)
             pinecone_client.create_index(
-                name=index_name, dimension=dimension, metric=metric, spec=spec
+                name=index_name,
+                dimension=dimension,
+                metric=metric,
+                spec=spec,
+                timeout=None if wait else -1,
             )
             logger.info(f"Index '{index_name}' created successfully.")
             return {
@@ -75,6 +84,59 @@ def create_pinecone_index(
         return {"status": "error", "message": error_message}
 
 
+def wait_for_pinecone_index(
+    pinecone_api_key: str, index_name: str, timeout: float = PINECONE_READY_TIMEOUT
+) -> str:
+    """
+    Polls describe_index with exponential backoff until the index is ready.
+
+    Returns:
+    - str: The index host, so callers can open it without another lookup.
+
+    Raises:
+    - TimeoutError: If the index is not ready within ``timeout`` seconds.
+    """
+    pinecone_client = Pinecone(api_key=pinecone_api_key)
+    deadline = time.monotonic() + timeout
+    delay = PINECONE_READY_POLL_SECONDS
+    while True:
+        description = pinecone_client.describe_index(index_name)
+        if description.status.ready:
+            logger.info(f"Index '{index_name}' is ready.")
+            return description.host
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(
+                f"Index '{index_name}' was not ready after {timeout} seconds "
+                f"(state: {description.status.state})."
+            )
+        logger.info(
+            f"Index '{index_name}' is {description.status.state}, "
+            f"checking again in {min(delay, remaining):.1f}s."
+        )
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, READY_POLL_MAX_SECONDS)
+
+
+def provision_pinecone_index(
+    pinecone_setup: schemas.index_schemas.PineconeSetup, index_name: str
+) -> str:
+    """
+    Creates a new Pinecone index and waits until it can accept upserts.
+
+    Returns:
+    - str: The index host.
+
+    Raises:
+    - RuntimeError: If the index could not be created or already exists.
+    """
+    response = create_pinecone_index(pinecone_setup, index_name, wait=False)
+    if response.get("status") != "success":
+        raise RuntimeError(response.get("message", "Error creating Pinecone index."))
+    return wait_for_pinecone_index(pinecone_setup.pinecone_api_key, index_name)
+
+
 def check_pinecone_index(pinecone_api_key: str, index_name: str):
     try:
         # Initialize Pinecone client
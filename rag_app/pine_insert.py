@@ -1,10 +1,30 @@
+import hashlib
+import json
 import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import chain
 
 import database
+import urllib3
 from fastapi import HTTPException
-from langchain.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from pinecone import Pinecone, PineconeException
 
+from .config import (
+    EMBED_SORT_WINDOW,
+    PINECONE_INDEX_HOST,
+    PROVISIONING_BUFFER_VECTORS,
+    UPSERT_BACKOFF_SECONDS,
+    UPSERT_BATCH_SIZE,
+    UPSERT_MAX_BATCH_BYTES,
+    UPSERT_MAX_IN_FLIGHT,
+    UPSERT_MAX_RETRIES,
+)
+from .data_embed import iter_embedding_batches
+from .ingest_pipeline import IngestPipeline, iter_windows
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -12,52 +32,361 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def insert_data_to_pinecone(embeddings, docs, api_key, index_name):
+# Pinecone accepts at most 1000 IDs per delete request
+DELETE_BATCH_SIZE = 1000
+
+# HTTP statuses that indicate a retryable Pinecone failure
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def make_file_id(user_id: str, index_name: str, file_name: str) -> str:
     """
-    Inserts data into a Pinecone index.
+    Returns a stable identifier for a source file within a user's index.
+    """
+    key = f"{user_id}/{index_name}/{file_name}".encode("utf-8")
+    return hashlib.sha1(key).hexdigest()[:16]
 
-    Parameters:
-    - embeddings: HuggingFaceEmbeddings object for generating embeddings
-    - docs: List of documents to be inserted
-    - api_key: Pinecone API key
-    - index_name: Name of the Pinecone index
+
+def make_vector_id(file_id: str, ordinal: int, text: str) -> str:
     """
-    logger.info("Starting data insertion into Pinecone index...")
-    try:
-        data_to_insert = []
-        for doc_id, doc in enumerate(docs):
-            logger.debug(f"Processing document ID {doc_id}: {doc}")
+    Returns a deterministic vector ID for a chunk of a source file.
 
-            # Convert document text to string (if not already)
-            doc = [str(part) for part in doc]
+    The ID combines the file ID, the chunk position and a short hash of the
+    chunk text, so re-ingesting the same file produces the same IDs while a
+    changed chunk gets a new one.
+    """
+    text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+    return f"{file_id}-{ordinal}-{text_hash}"
 
-            # Generate embeddings for the document
-            embedding = embeddings.embed_documents(doc)
-            logger.debug(
-                f"Embedding shape for doc {doc_id}: {len(embedding[0])} dimensions"
-            )
+
+def open_pinecone_index(api_key: str, index_name: str, host: str = None):
+    """
+    Returns a Pinecone index handle, honouring PINECONE_INDEX_HOST if set.
+    A known ``host`` skips the describe_index lookup.
+    """
+    pinecone_client = Pinecone(api_key=api_key)
+    host = PINECONE_INDEX_HOST or host
+    if host:
+        return pinecone_client.Index(index_name, host=host)
+    return pinecone_client.Index(index_name)
+
+
+def _hold_until_ready(batches, index_ready: Future, max_buffered: int):
+    """
+    Collects embedded batches while a new index is still being provisioned.
+
+    Stops at readiness, at the end of the input or once ``max_buffered``
+    vectors are held, so embedding overlaps provisioning with bounded memory.
+    """
+    held = []
+    held_vectors = 0
+    while not index_ready.done() and held_vectors < max_buffered:
+        batch = next(batches, None)
+        if batch is None:
+            break
+        held.append(batch)
+        held_vectors += len(batch)
+    if not index_ready.done():
+        logger.info(f"Waiting for the index with {held_vectors} vectors embedded.")
+    return held
+
+
+def _iter_vectors(
+    embeddings,
+    pending,
+    file_id: str,
+    file_name: str,
+    dimension,
+    progress=None,
+):
+    """
+    Embeds ``(ordinal, document, vector_id)`` entries and yields one list of
+    Pinecone vectors per embedding batch.
+
+    Only the chunk text is embedded, in batches of EMBED_BATCH_SIZE. The text
+    is stored in the metadata so the retriever can return it.
+    """
+    texts = [doc.page_content for _, doc, _ in pending]
+    for batch, batch_embeddings in iter_embedding_batches(embeddings, texts):
+        vectors = []
+        for i, embedding in zip(batch, batch_embeddings):
+            doc_id, doc, vector_id = pending[i]
 
             # Validate embedding dimension
-            if len(embedding[0]) != 768:
+            if len(embedding) != dimension:
                 raise ValueError(
-                    f"Embedding for document {doc_id} has invalid dimension: {len(embedding[0])}"
+                    f"Embedding for document {doc_id} has invalid dimension: {len(embedding)}"
                 )
 
             # Add metadata for each vector
-            metadata = {"source": f"doc_{doc_id}"}
+            metadata = {
+                "text": doc.page_content,
+                "source": file_name,
+                "file_id": file_id,
+                "chunk": doc_id,
+            }
+            if "page" in doc.metadata:
+                metadata["page"] = doc.metadata["page"]
+
+            vectors.append(
+                {"id": vector_id, "values": embedding, "metadata": metadata}
+            )
+
+        if progress:
+            progress.add_embedded(len(batch))
+        yield vectors
+
 
-            # Prepare data for insertion
-            data_to_insert.append(
-                {"id": str(doc_id), "values": embedding[0], "metadata": metadata}
+def _is_transient(error: Exception) -> bool:
+    """
+    Returns True if a Pinecone call failed in a way that is worth retrying.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError, urllib3.exceptions.HTTPError)):
+        return True
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    return status in TRANSIENT_STATUS_CODES
+
+
+def _with_retry(operation, description: str):
+    """
+    Runs a Pinecone call, retrying transient errors with exponential backoff.
+    """
+    for attempt in range(UPSERT_MAX_RETRIES + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == UPSERT_MAX_RETRIES or not _is_transient(e):
+                raise
+            delay = UPSERT_BACKOFF_SECONDS * 2**attempt
+            delay += random.uniform(0, UPSERT_BACKOFF_SECONDS)
+            logger.warning(
+                f"Transient error during {description} (attempt {attempt + 1}), "
+                f"retrying in {delay:.2f}s: {e}"
             )
+            time.sleep(delay)
 
-        # Initialize Pinecone client
-        pinecone_client = Pinecone(api_key=api_key)
-        index = pinecone_client.Index(index_name)
 
-        # Insert data into the Pinecone index
-        index.upsert(vectors=data_to_insert)
+def iter_upsert_batches(
+    vectors, max_count=UPSERT_BATCH_SIZE, max_bytes=UPSERT_MAX_BATCH_BYTES
+):
+    """
+    Groups vectors into upsert requests bounded by count and serialized size.
+    """
+    batch = []
+    batch_bytes = 0
+    for vector in vectors:
+        vector_bytes = len(json.dumps(vector))
+        if batch and (
+            len(batch) >= max_count or batch_bytes + vector_bytes > max_bytes
+        ):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(vector)
+        batch_bytes += vector_bytes
+    if batch:
+        yield batch
+
+
+def _upsert_batch(index, batch):
+    _with_retry(lambda: index.upsert(vectors=batch), "upsert")
+    return [vector["id"] for vector in batch]
+
+
+def _collect_acknowledged(done, on_batch_acked):
+    """
+    Reports every completed upsert, then re-raises the first failure if any.
+    """
+    error = None
+    count = 0
+    for future in done:
+        try:
+            vector_ids = future.result()
+        except Exception as e:
+            error = error or e
+            continue
+        count += len(vector_ids)
+        if on_batch_acked:
+            try:
+                on_batch_acked(vector_ids)
+            except Exception as e:
+                error = error or e
+    if error:
+        raise error
+    return count
+
+
+def upsert_vectors(
+    index, vectors, on_batch_acked=None, max_in_flight=UPSERT_MAX_IN_FLIGHT
+) -> int:
+    """
+    Upserts vectors in size-bounded batches with a bounded number in flight.
+
+    Parameters:
+    - index: Pinecone index handle
+    - vectors: Iterable of vectors; consumed lazily as batches are sent
+    - on_batch_acked: Called with the IDs of each batch Pinecone acknowledged
+    - max_in_flight: Maximum number of concurrent upsert requests
+
+    Returns:
+    - int: Number of vectors upserted.
+    """
+    upserted = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        try:
+            for batch in iter_upsert_batches(vectors):
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    upserted += _collect_acknowledged(done, on_batch_acked)
+                in_flight.add(executor.submit(_upsert_batch, index, batch))
+            done, in_flight = wait(in_flight)
+            upserted += _collect_acknowledged(done, on_batch_acked)
+        except Exception:
+            # Record batches that still succeed so a retry can resume after them
+            done, in_flight = wait(in_flight)
+            try:
+                _collect_acknowledged(done, on_batch_acked)
+            except Exception:
+                pass
+            raise
+    return upserted
+
+
+def _delete_vectors(index, vector_ids: list):
+    """
+    Deletes vectors from a Pinecone index in request-sized batches.
+    """
+    for start in range(0, len(vector_ids), DELETE_BATCH_SIZE):
+        batch = vector_ids[start : start + DELETE_BATCH_SIZE]
+        _with_retry(lambda: index.delete(ids=batch), "delete")
+
+
+def _write_documents(
+    embeddings,
+    docs,
+    index,
+    index_name,
+    user_id: str,
+    file_name: str,
+    dimension,
+    progress=None,
+):
+    """
+    Embeds and upserts the chunks of one file, skipping chunks already written.
+
+    ``docs`` may be any iterable, including a lazy splitter or a pipeline
+    stage. Chunks are embedded window by window in their own pipeline stage
+    while earlier batches are upserted from this thread, so the model and
+    the network are busy at the same time and memory stays bounded by the
+    queue and window sizes.
+
+    ``index`` may be a Future resolving to the index handle while a new index
+    is provisioned; chunks are embedded in the meantime and the first upsert
+    waits for it.
+
+    Each acknowledged batch is recorded in the vector manifest, which doubles
+    as the checkpoint: because vector IDs include a hash of the chunk text, a
+    chunk whose ID is already in the manifest is stored with the same content
+    and is neither embedded nor upserted again.
+
+    Returns:
+    - list: Vector IDs of all chunks in the file.
+    """
+    file_id = make_file_id(user_id, index_name, file_name)
+    acknowledged = set(database.get_vector_ids(user_id, index_name, file_id))
+    vector_ids = []
+    if progress:
+        progress.set_stage("embedding")
+
+    def iter_vector_batches():
+        for window in iter_windows(enumerate(docs), EMBED_SORT_WINDOW):
+            pending = []
+            for doc_id, doc in window:
+                vector_id = make_vector_id(file_id, doc_id, doc.page_content)
+                vector_ids.append(vector_id)
+                if vector_id not in acknowledged:
+                    pending.append((doc_id, doc, vector_id))
+            if progress:
+                skipped = len(window) - len(pending)
+                progress.add_total(len(window))
+                if skipped:
+                    progress.add_embedded(skipped)
+                    progress.add_upserted(skipped)
+            yield from _iter_vectors(
+                embeddings, pending, file_id, file_name, dimension, progress
+            )
+
+    def on_batch_acked(ids):
+        database.insert_vector_ids(user_id, index_name, file_id, file_name, ids)
+        if progress:
+            progress.add_upserted(len(ids))
+
+    with IngestPipeline() as pipeline:
+        batches = pipeline.stage("embed", iter_vector_batches())
+        if isinstance(index, Future):
+            held = _hold_until_ready(batches, index, PROVISIONING_BUFFER_VECTORS)
+            index = index.result()
+            batches = chain(held, batches)
+        upserted = upsert_vectors(
+            index, chain.from_iterable(batches), on_batch_acked=on_batch_acked
+        )
+    if upserted < len(vector_ids):
+        logger.info(
+            f"Resumed '{file_name}': {len(vector_ids) - upserted} of "
+            f"{len(vector_ids)} chunks were already in the index."
+        )
+    return vector_ids
+
+
+def insert_data_to_pinecone(
+    embeddings,
+    docs,
+    api_key,
+    index_name,
+    user_id: str,
+    file_name: str,
+    dimension=768,
+    progress=None,
+    index_ready: Future = None,
+):
+    """
+    Inserts data into a Pinecone index.
+
+    Vector IDs are derived from the file and chunk, so retrying an ingest
+    overwrites the same vectors instead of duplicating or clobbering others,
+    and an interrupted ingest resumes after the last acknowledged batch.
+
+    Parameters:
+    - embeddings: HuggingFaceEmbeddings object for generating embeddings
+    - docs: Iterable of documents to be inserted
+    - api_key: Pinecone API key
+    - index_name: Name of the Pinecone index
+    - user_id: Owner of the index, used to scope the vector manifest
+    - file_name: Name of the source file the documents came from
+    - dimension: Expected embedding dimension of the index
+    - progress: Optional JobProgress receiving chunk counters
+    - index_ready: Optional Future resolving to the index handle once a newly
+      created index is ready; embedding proceeds while it is pending
+
+    Returns:
+    - int: Number of chunks in the file.
+    """
+    logger.info("Starting data insertion into Pinecone index...")
+    try:
+        index = index_ready or open_pinecone_index(api_key, index_name)
+        vector_ids = _write_documents(
+            embeddings,
+            docs,
+            index,
+            index_name,
+            user_id,
+            file_name,
+            dimension,
+            progress,
+        )
         logger.info("Data successfully inserted into Pinecone index.")
+        return len(vector_ids)
 
     except Exception as e:
         logger.error(f"An error occurred while inserting data into Pinecone: {e}")
@@ -65,57 +394,98 @@ def insert_data_to_pinecone(embeddings, docs, api_key, index_name):
 
 
 def update_data_in_pinecone(
-    embeddings: HuggingFaceEmbeddings, docs: list, api_key: str, index_name: str
+    embeddings: Embeddings,
+    docs,
+    api_key: str,
+    index_name: str,
+    user_id: str,
+    file_name: str,
+    dimension=768,
+    progress=None,
 ):
     """
     Updates data in a Pinecone index by replacing existing vectors with new ones.
 
+    Unchanged chunks are kept as they are, and vectors recorded for the same
+    file that are not part of the new version are deleted, so a shorter
+    document does not leave stale chunks behind.
+
     Parameters:
     - embeddings: HuggingFaceEmbeddings object for generating embeddings
-    - docs: List of documents to update
+    - docs: Iterable of documents to update
     - api_key: Pinecone API key
     - index_name: Name of the Pinecone index
+    - user_id: Owner of the index, used to scope the vector manifest
+    - file_name: Name of the source file the documents came from
+    - dimension: Expected embedding dimension of the index
+    - progress: Optional JobProgress receiving chunk counters
     """
     logger.info("Starting data update in Pinecone index...")
     try:
-        data_to_update = []
-        for doc_id, doc in enumerate(docs):
-            logger.debug(f"Processing document ID {doc_id}: {doc}")
+        file_id = make_file_id(user_id, index_name, file_name)
+        old_ids = set(database.get_vector_ids(user_id, index_name, file_id))
+
+        index = open_pinecone_index(api_key, index_name)
+        new_ids = _write_documents(
+            embeddings,
+            docs,
+            index,
+            index_name,
+            user_id,
+            file_name,
+            dimension,
+            progress,
+        )
 
-            # Convert document text to string
-            doc = [str(part) for part in doc]
+        # Remove vectors left over from the previous version of the file
+        stale_ids = sorted(old_ids.difference(new_ids))
+        if stale_ids:
+            _delete_vectors(index, stale_ids)
+            database.delete_vector_ids(user_id, index_name, stale_ids)
+            logger.info(f"Deleted {len(stale_ids)} stale vectors for '{file_name}'.")
+        logger.info("Data successfully updated in Pinecone index.")
 
-            # Generate embeddings
-            embedding = embeddings.embed_documents(doc)
-            logger.debug(
-                f"Embedding shape for doc {doc_id}: {len(embedding[0])} dimensions"
-            )
+    except Exception as e:
+        logger.error(f"An error occurred while updating data in Pinecone: {e}")
+        raise
 
-            # Validate embedding dimension
-            if len(embedding[0]) != 768:
-                raise ValueError(
-                    f"Embedding for document {doc_id} has invalid dimension: {len(embedding[0])}"
-                )
 
-            # Add metadata
-            metadata = {"source": f"doc_{doc_id}"}
+def delete_document_from_pinecone(
+    api_key: str, index_name: str, user_id: str, file_name: str
+) -> int:
+    """
+    Deletes every vector of a single source file from a Pinecone index.
 
-            # Prepare data for update
-            data_to_update.append(
-                {"id": str(doc_id), "values": embedding[0], "metadata": metadata}
-            )
+    Parameters:
+    - api_key: Pinecone API key
+    - index_name: Name of the Pinecone index
+    - user_id: Owner of the index
+    - file_name: Name of the source file to remove
 
-        # Initialize Pinecone client
-        pinecone_client = Pinecone(api_key=api_key)
-        index = pinecone_client.Index(index_name)
+    Returns:
+    - int: Number of vectors deleted.
+    """
+    logger.info(f"Deleting document '{file_name}' from Pinecone index: {index_name}")
+    try:
+        file_id = make_file_id(user_id, index_name, file_name)
+        vector_ids = database.get_vector_ids(user_id, index_name, file_id)
+        if not vector_ids:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Document '{file_name}' not found in index '{index_name}'.",
+            )
 
-        # Update data in Pinecone index
-        index.upsert(vectors=data_to_update)
-        logger.info("Data successfully updated in Pinecone index.")
+        index = open_pinecone_index(api_key, index_name)
+        _delete_vectors(index, vector_ids)
+        database.delete_vector_ids(user_id, index_name, vector_ids)
+        logger.info(f"Deleted {len(vector_ids)} vectors for '{file_name}'.")
+        return len(vector_ids)
 
-    except Exception as e:
-        logger.error(f"An error occurred while updating data in Pinecone: {e}")
+    except HTTPException:
         raise
+    except PineconeException as e:
+        logger.error(f"Pinecone error occurred: {e}")
+        raise HTTPException(status_code=400, detail=f"Pinecone error: {str(e)}")
 
 
 def delete_pinecone_index(user_id: str, index_name: str) -> bool:
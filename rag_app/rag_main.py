@@ -1,23 +1,23 @@
 import logging
+import time
+from contextlib import ExitStack
 
 import database
-from langchain.document_loaders import PyPDFLoader, TextLoader
 from langchain.prompts import PromptTemplate
 from langchain.schema.output_parser import StrOutputParser
 from langchain.schema.runnable import RunnablePassthrough
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
 # from langchain.vectorstores import Pinecone as pns
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone as pns
 
 
 # New imports
 # from langchain_community.vectorstores import Pinecone as pns
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from rag_app.data_embed import get_embeddings
+from rag_app.document_loader import iter_faiss_data_splitter
 from rag_app.factories.gemini_factory import GeminiFactory
 from rag_app.factories.huggingface_factory import HuggingFaceFactory
 from rag_app.factories.openai_factory import OpenAIFactory
+from rag_app.index_registry import acquire_faiss_index
+from rag_app.ingest_pipeline import IngestPipeline, add_documents_to_faiss
 
 # Configure the logger
 logging.basicConfig(
@@ -39,6 +39,9 @@ def initialize_docsearch(index_name, embeddings, api_key):
     Returns:
         docsearch: A Pinecone retriever instance.
     # """
+    # The Pinecone client is only loaded by agents that query Pinecone
+    from langchain_pinecone import PineconeVectorStore
+
     # new_pns = pns(api_key = api_key)
     # index = new_pns.Index(name=index_name)
     docsearch = PineconeVectorStore(pinecone_api_key = api_key, index_name=index_name, embedding=embeddings)
@@ -48,41 +51,49 @@ def initialize_docsearch(index_name, embeddings, api_key):
 
 
 # Step 1: Load and clean PDF files
-def load_pdf(pdf_path):
-    """Load PDF using PyPDFLoader and clean the text."""
-    if pdf_path.lower().endswith(".pdf"):
-        loader = PyPDFLoader(pdf_path)
-        pages = loader.load_and_split()
-    elif pdf_path.lower().endswith(".txt"):
-        loader = TextLoader(pdf_path)
-        pages = loader.load()
-
-    new_pages = [remove_ws(page) for page in pages]
-
-    text_splitter = CharacterTextSplitter(
-        separator="\n", chunk_size=1000, chunk_overlap=150, length_function=len
-    )
-    docs = text_splitter.split_documents(new_pages)
-    return docs
+def iter_load_pdf(pdf_path, pdf_backend=None):
+    """Load PDF pages and clean the text, yielding chunks page by page."""
+    # Pages are extracted in parallel for large PDFs
+    return iter_faiss_data_splitter(pdf_path, pdf_backend)
 
 
-def remove_ws(page):
-    """Remove any newlines, extra spaces, etc., from page content."""
-    page_content = page.page_content.replace("\n", " ").strip()
-    page.page_content = page_content
-    return page
+def load_pdf(pdf_path, pdf_backend=None):
+    """Load PDF pages and clean the text."""
+    return list(iter_load_pdf(pdf_path, pdf_backend))
 
 
 # Step 2: Create a FAISS VectorStore
 def create_vector_store(pages):
-    """Create a FAISS VectorStore from the loaded and processed PDF pages."""
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-mpnet-base-v2"
-    )
-    vector_store = FAISS.from_documents(pages, embeddings)
+    """
+    Create a FAISS VectorStore from the loaded and processed PDF pages.
+    ``pages`` may be a lazy iterable; embedding overlaps with loading.
+    """
+    embeddings = get_embeddings("sentence-transformers/all-mpnet-base-v2")
+    vector_store = add_documents_to_faiss(embeddings, pages)
     return vector_store
 
 
+def build_faiss_from_file(file_path, file_name, embedding, pdf_backend=None):
+    """
+    Builds a FAISS VectorStore from an uploaded file, chunked exactly as
+    the query path chunks it, and returns it with the manifest to save
+    alongside it.
+    """
+    embeddings = get_embeddings(embedding)
+    started = time.perf_counter()
+    with IngestPipeline() as pipeline:
+        pages = pipeline.stage("parse", iter_load_pdf(file_path, pdf_backend))
+        vector_store = add_documents_to_faiss(embeddings, pages)
+    manifest = {
+        "embedding": embedding,
+        "pdf_backend": pdf_backend,
+        "files": [{"file_name": file_name, "chunks": vector_store.index.ntotal}],
+        "built_at": time.time(),
+        "build_seconds": round(time.perf_counter() - started, 3),
+    }
+    return vector_store, manifest
+
+
 def create_faiss_retriever(vector_store):
     """Create a FAISS retriever for document search."""
     retriever = vector_store.as_retriever(search_kwargs={"k": 3})
@@ -223,6 +234,38 @@ def Agent(
     question,
     user_id,
     index_type,
+    pinecone_api_key=None,
+):
+    # The FAISS generation a question starts on stays pinned until it is
+    # answered, so a concurrent rebuild can swap in the next one
+    with ExitStack() as leases:
+        return _run_agent(
+            leases,
+            index_name=index_name,
+            embeddings=embeddings,
+            model_name=model_name,
+            api_key=api_key,
+            prompt_template=prompt_template,
+            use_llm=use_llm,
+            question=question,
+            user_id=user_id,
+            index_type=index_type,
+            pinecone_api_key=pinecone_api_key,
+        )
+
+
+def _run_agent(
+    leases,
+    index_name,
+    embeddings,
+    model_name,
+    api_key,
+    prompt_template,
+    use_llm,
+    question,
+    user_id,
+    index_type,
+    pinecone_api_key=None,
 ):
     docsearch = None
     print(f"\n--- Agent Function Called ---")
@@ -232,9 +275,10 @@ def Agent(
     print(f"  User ID: {user_id}")
 
     if index_type == "Pinecone":
-        pinecone_api_key = database.get_pinecone_api_index_name_type_db(
-            user_id, index_name
-        )
+        if not pinecone_api_key:
+            pinecone_api_key = database.get_pinecone_api_index_name_type_db(
+                user_id, index_name
+            )
         print(f"  Retrieved Pinecone API Key: {'*' * (len(pinecone_api_key) - 4) + pinecone_api_key[-4:] if pinecone_api_key else 'Not Found'}")
         print(f"  Initializing Pinecone docsearch...")
         docsearch = initialize_docsearch(index_name, embeddings, pinecone_api_key)
@@ -255,12 +299,19 @@ def Agent(
             print(f"  Pinecone docsearch initialization failed.")
 
     elif index_type == "FAISS":
-        file_addr = database.get_file_from_faiss_db(user_id, index_name)
-        if not file_addr:
-            logger.warning("Data Not Found. Kindly upload files to the database.")
-            return "Data Not Found kindly upload files to db"
-        pages = load_pdf(file_addr)
-        vector_store = create_vector_store(pages)
+        lease = acquire_faiss_index(user_id, index_name, embeddings)
+        if lease is not None:
+            # Prebuilt artifact, e.g. from python -m rag_app.build_index
+            vector_store = leases.enter_context(lease)
+        else:
+            file_addr = database.get_file_from_faiss_db(user_id, index_name)
+            if not file_addr:
+                logger.warning("Data Not Found. Kindly upload files to the database.")
+                return "Data Not Found kindly upload files to db"
+            pdf_backend = database.get_index_pdf_backend(user_id, index_name)
+            with IngestPipeline() as pipeline:
+                pages = pipeline.stage("parse", iter_load_pdf(file_addr, pdf_backend))
+                vector_store = create_vector_store(pages)
         docsearch = create_faiss_retriever(vector_store)
 
 
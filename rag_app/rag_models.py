@@ -1,6 +1,5 @@
 # rag_app/rag_models.py
-from langchain.llms import HuggingFaceHub, OpenAI
-from langchain_openai import ChatOpenAI
+# Provider packages are imported when a model of theirs is initialized
 
 
 # Placeholder for Gemini integration
@@ -15,12 +14,16 @@ class GeminiLLM:
 
 
 def initialize_huggingface_llm(repo_id, temperature=0.8, top_k=50):
+    from langchain.llms import HuggingFaceHub
+
     return HuggingFaceHub(
         repo_id=repo_id, model_kwargs={"temperature": temperature, "top_k": top_k}
     )
 
 
 def initialize_openai_llm(model_name, api_key, temperature=0.8, max_tokens=256):
+    from langchain.llms import OpenAI
+
     return OpenAI(
         model=model_name,
         temperature=temperature,
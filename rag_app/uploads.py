@@ -0,0 +1,222 @@
+import hashlib
+import os
+import posixpath
+import tarfile
+import tempfile
+import zipfile
+from typing import BinaryIO, NamedTuple, Optional
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from .config import MAX_UPLOAD_BYTES, SPOOL_MAX_MEMORY, UPLOAD_CHUNK_SIZE
+
+
+class SavedUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+
+class SpooledUpload(NamedTuple):
+    file: BinaryIO
+    size: int
+    sha256: str
+
+
+class ArchiveEntry(NamedTuple):
+    name: str
+    file: Optional[BinaryIO]
+    error: Optional[str]
+
+
+# Archive formats accepted by bulk ingestion
+ARCHIVE_SUFFIXES = (
+    ".zip",
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+
+
+async def _iter_upload_chunks(file: UploadFile, max_bytes: int, chunk_size: int):
+    """
+    Yields the upload in chunks, enforcing the size limit as it goes.
+    """
+    size = 0
+    while chunk := await file.read(chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File '{file.filename}' exceeds the {max_bytes} byte upload limit.",
+            )
+        yield chunk
+
+
+async def save_upload_file(
+    file: UploadFile,
+    dest_path: str,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> SavedUpload:
+    """
+    Streams an upload to disk without holding the whole file in memory.
+
+    The file is written in chunks to a unique temporary name next to
+    ``dest_path`` and renamed into place once complete, while its SHA-256
+    is computed on the fly.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        dest_path (str): Where to store the file.
+        max_bytes (int): Maximum accepted size; larger uploads are rejected with 413.
+        chunk_size (int): Number of bytes read and written per step.
+
+    Returns:
+        SavedUpload: Path, size in bytes and hex SHA-256 of the stored file.
+    """
+    # A private partial file, so concurrent uploads to one path never mix
+    fd, partial_path = tempfile.mkstemp(
+        dir=os.path.dirname(dest_path) or ".", suffix=".part"
+    )
+    os.close(fd)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(partial_path, "wb") as buffer:
+            async for chunk in _iter_upload_chunks(file, max_bytes, chunk_size):
+                size += len(chunk)
+                digest.update(chunk)
+                await buffer.write(chunk)
+        os.replace(partial_path, dest_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return SavedUpload(dest_path, size, digest.hexdigest())
+
+
+async def spool_upload_file(
+    file: UploadFile,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_memory: int = SPOOL_MAX_MEMORY,
+) -> SpooledUpload:
+    """
+    Copies an upload into a private spooled buffer for in-memory parsing.
+
+    Small files stay in memory; larger ones roll over to an anonymous
+    temporary file, so concurrent uploads never share a path and memory per
+    upload stays bounded. The caller owns the returned file and must close it.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        max_bytes (int): Maximum accepted size; larger uploads are rejected with 413.
+        chunk_size (int): Number of bytes read and written per step.
+        max_memory (int): Size above which the buffer spills to disk.
+
+    Returns:
+        SpooledUpload: Buffer positioned at the start, size and hex SHA-256.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in _iter_upload_chunks(file, max_bytes, chunk_size):
+            size += len(chunk)
+            digest.update(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+        buffer.seek(0)
+    except BaseException:
+        buffer.close()
+        raise
+    return SpooledUpload(buffer, size, digest.hexdigest())
+
+
+def is_archive(file_name: str) -> bool:
+    """Returns True if the file name has a supported archive extension."""
+    return file_name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_metadata_entry(name: str) -> bool:
+    # Resource forks and folders added by macOS archivers
+    return name.startswith("__MACOSX/") or posixpath.basename(name).startswith("._")
+
+
+def _spool_stream(
+    stream: BinaryIO, name: str, max_bytes: int, chunk_size: int, max_memory: int
+) -> BinaryIO:
+    buffer = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    size = 0
+    try:
+        while chunk := stream.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"'{name}' exceeds the {max_bytes} byte limit.")
+            buffer.write(chunk)
+        buffer.seek(0)
+    except BaseException:
+        buffer.close()
+        raise
+    return buffer
+
+
+def _extract_entry(open_member, name, max_bytes, chunk_size, max_memory):
+    try:
+        with open_member() as stream:
+            buffer = _spool_stream(stream, name, max_bytes, chunk_size, max_memory)
+        return ArchiveEntry(name, buffer, None)
+    except Exception as e:
+        return ArchiveEntry(name, None, str(e))
+
+
+def iter_archive_entries(
+    buffer: BinaryIO,
+    archive_name: str,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_memory: int = SPOOL_MAX_MEMORY,
+):
+    """
+    Extracts a zip or tar archive one entry at a time.
+
+    Each regular file is decompressed into its own spooled buffer, bounded by
+    ``max_bytes`` whatever size the archive declares, and yielded before the
+    next entry is read. Tar archives are read as a stream. Nothing is written
+    under the entry's own path, so member names cannot escape a directory.
+
+    Yields:
+        ArchiveEntry: The member path, its buffer (owned by the caller) or
+        None, and an error message if the entry could not be extracted.
+    """
+    buffer.seek(0)
+    if archive_name.lower().endswith(".zip"):
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _is_metadata_entry(info.filename):
+                    continue
+                yield _extract_entry(
+                    lambda: archive.open(info),
+                    info.filename,
+                    max_bytes,
+                    chunk_size,
+                    max_memory,
+                )
+    else:
+        with tarfile.open(fileobj=buffer, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or _is_metadata_entry(member.name):
+                    continue
+                yield _extract_entry(
+                    lambda: archive.extractfile(member),
+                    member.name,
+                    max_bytes,
+                    chunk_size,
+                    max_memory,
+                )
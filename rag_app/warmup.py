@@ -0,0 +1,95 @@
+import importlib
+import logging
+import threading
+import time
+
+import database
+
+from .config import PRELOAD_EMBEDDING_MODELS, PRELOAD_FAISS_INDEXES, WARMUP_ON_STARTUP
+from .data_embed import get_embeddings, preload_embeddings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Text each model embeds once during warm-up
+WARMUP_TEXT = "warm-up"
+
+_lock = threading.Lock()
+_thread = None
+_status = {"ready": False, "status": "pending"}
+
+
+def preload(run_models: bool = False) -> dict:
+    """
+    Imports the modules of the query path and loads the embedding models
+    of the registered indexes and of PRELOAD_EMBEDDING_MODELS and, with
+    PRELOAD_FAISS_INDEXES, the FAISS index artifacts.
+
+    With ``run_models`` every model also embeds a short text, so one-off
+    setup such as allocating inference threads is done before the first
+    query. Leave it off in a process that forks afterwards.
+
+    Returns:
+    - dict: The loaded ``models``, the number of ``indexes`` and the
+      ``seconds`` taken.
+    """
+    started = time.perf_counter()
+    # Imported here rather than at import time, as they pull in FAISS and
+    # LangChain
+    importlib.import_module(".agent_services", __package__)
+    from .index_registry import preload_faiss_indexes
+
+    # In order, without duplicates
+    names = dict.fromkeys(PRELOAD_EMBEDDING_MODELS + database.list_embedding_models())
+    models = preload_embeddings(list(names))
+    if run_models:
+        for model in models:
+            get_embeddings(model).embed_query(WARMUP_TEXT)
+    indexes = preload_faiss_indexes() if PRELOAD_FAISS_INDEXES else 0
+    return {
+        "models": models,
+        "indexes": indexes,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _warm_up():
+    try:
+        result = preload(run_models=True)
+        logger.info(
+            f"Warmed {len(result['models'])} embedding models and "
+            f"{result['indexes']} FAISS indexes in {result['seconds']}s."
+        )
+        _status.update(result)
+    except Exception as e:
+        # Whatever did not warm loads on first use instead
+        logger.exception("Warm-up failed.")
+        _status["error"] = str(e)
+    finally:
+        _status.update(ready=True, status="ready")
+
+
+def start_warmup():
+    """
+    Starts warming this process in a background thread, once. Until it
+    finishes, warmup_status() reports the process as not ready. With
+    WARMUP_ON_STARTUP off the process is ready straight away.
+    """
+    global _thread
+    with _lock:
+        if _thread is not None or _status["ready"]:
+            return
+        if not WARMUP_ON_STARTUP:
+            _status.update(ready=True, status="ready")
+            return
+        _status["status"] = "warming"
+        _thread = threading.Thread(target=_warm_up, name="warmup", daemon=True)
+        _thread.start()
+
+
+def warmup_status() -> dict:
+    """Returns whether this process is ready, with the warm-up results."""
+    return dict(_status)
@@ -1,11 +1,18 @@
 import os
-from typing import Optional
+import tempfile
+import uuid
+from functools import partial
+from typing import List, Optional
 
 import database
 import rag_app
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from fastapi.responses import FileResponse
+from rag_app.config import SNAPSHOT_MAX_BYTES
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from schemas.index_schemas import (
+    DeleteDocumentRequest,
     PineconeDeleteIndex,
     PineconeSetup,
     VectorDB,
@@ -23,6 +30,7 @@ async def insert_data_to_index(
     file: UploadFile = File(...),
     vectordb: VectorDB = Form(...),
     pinecone_setup: Optional[PineconeSetup] = Depends(get_pinecone_setup),
+    pdf_backend: Optional[str] = Form(default=None),
 ):
     # Print the data received
     print("\n\n\nNEWwwww")
@@ -33,19 +41,22 @@ async def insert_data_to_index(
     print(f"vectordb: {vectordb}")
     print(f"pinecone_setup: {pinecone_setup}")
     try:
-        file_extesion = file.filename.split(".")[-1]
+        if pdf_backend:
+            # Reject an unknown PDF engine before reading the upload
+            try:
+                pdf_backend = rag_app.resolve_pdf_backend(pdf_backend)
+            except ValueError as ve:
+                raise HTTPException(status_code=400, detail=str(ve))
 
         if vectordb == VectorDB.pinecone:
-            filename = f"temp_data_A711A.{file_extesion}"
-        else:
-            filename = f"temp_{file.filename}"
-
-        file_path = f"media/{filename}"
-        file_data = await file.read()
+            # Copy the upload into a private buffer that is parsed in memory
+            upload = await rag_app.spool_upload_file(file)
 
         # Attempt to insert data into the vector_db table (track db_type)
         try:
-            database.insert_into_vector_db(user_id, index_name, vectordb.value)
+            await database.aio.insert_into_vector_db(
+                user_id, index_name, vectordb.value, pdf_backend
+            )
         except ValueError as ve:
             # Catch the specific exception raised in insert_into_vector_db
             raise HTTPException(status_code=400, detail=str(ve))
@@ -59,53 +70,56 @@ async def insert_data_to_index(
                     status_code=400, detail="Pinecone setup details are required."
                 )
 
-            # Save file to media folder with the fixed name
-            with open(file_path, "wb") as buffer:
-                buffer.write(file_data)
-
             # Insert Pinecone configuration into the pinecone_db table
-            database.insert_into_pinecone_db(
+            await database.aio.insert_into_pinecone_db(
                 pinecone_setup, user_id, index_name, embedding
             )
 
-            # Call function to create Pinecone index (external logic)
-            response = rag_app.create_pinecone_index(
-                pinecone_setup=pinecone_setup,
-                index_name=index_name,
+            job_id = await database.aio.create_ingest_job(
+                user_id, index_name, file.filename, upload.sha256
             )
-            if response.get("status") != "success":
-                raise HTTPException(
-                    status_code=400,
-                    detail=response.get("message", "Error creating Pinecone index."),
-                )
-
-            # Load and split document into chunks
-            docs = rag_app.data_splitter(file_path)
-            embeddings = HuggingFaceEmbeddings(model_name=embedding)
 
-            # Insert data into Pinecone index (external logic)
-            rag_app.insert_data_to_pinecone(
-                embeddings=embeddings,
-                docs=docs,
-                api_key=pinecone_setup.pinecone_api_key,
-                index_name=index_name,
+            # Create the index, split, embed and upsert in the background
+            rag_app.start_ingest_job(
+                job_id,
+                partial(
+                    rag_app.run_pinecone_insert,
+                    pinecone_setup=pinecone_setup,
+                    user_id=user_id,
+                    index_name=index_name,
+                    embedding=embedding,
+                    buffer=upload.file,
+                    file_name=file.filename,
+                    pdf_backend=pdf_backend,
+                ),
+                cleanup=upload.file.close,
             )
-
-            # Remove the temporary file after processing
-            os.remove(file_path)
+            return {
+                "message": "Data ingestion into Index started",
+                "job_id": job_id,
+                "content_hash": upload.sha256,
+            }
 
         elif vectordb == VectorDB.faiss:
-            # Save file to media folder
-            with open(file_path, "wb") as buffer:
-                buffer.write(file_data)
-
-            # Insert Faiss-specific data into faiss_db table
-            database.insert_into_faiss_db(
-                user_id, index_name, filename, file_path, embedding
-            )
+            # Stream the upload to disk in bounded chunks, only once the index
+            # is registered and under a name no other upload uses
+            filename = f"temp_{uuid.uuid4().hex[:8]}_{file.filename}"
+            file_path = f"media/{filename}"
+            await rag_app.save_upload_file(file, file_path)
+
+            try:
+                # Insert Faiss-specific data into faiss_db table
+                await database.aio.insert_into_faiss_db(
+                    user_id, index_name, filename, file_path, embedding
+                )
 
-            # Insert the PDF file info into the file_uploads table
-            database.insert_into_file_uploads(user_id, index_name, filename, file_path)
+                # Insert the PDF file info into the file_uploads table
+                await database.aio.insert_into_file_uploads(
+                    user_id, index_name, filename, file_path
+                )
+            except BaseException:
+                os.remove(file_path)
+                raise
 
         return {"message": "Data inserted into Index successfully"}
 
@@ -119,6 +133,140 @@ async def insert_data_to_index(
         )
 
 
+@index_router.post("/bulk_insert_to_index")
+async def bulk_insert_to_index(
+    user_id: str = Form(...),
+    index_name: str = Form(...),
+    embedding: str = Form(default="sentence-transformers/all-mpnet-base-v2"),
+    files: List[UploadFile] = File(...),
+    vectordb: VectorDB = Form(...),
+    pinecone_setup: Optional[PineconeSetup] = Depends(get_pinecone_setup),
+    pdf_backend: Optional[str] = Form(default=None),
+):
+    """
+    API endpoint for ingesting many PDF/TXT files, or zip/tar archives of
+    them, into one index in a single background job.
+
+    A new Pinecone index is created from the Pinecone setup; an existing
+    Pinecone index keeps its stored embedding model and dimension. Files
+    are appended to an existing FAISS index while it keeps serving queries.
+    Poll /index/jobs/{job_id} for progress and the per-file report.
+    """
+    uploads = []
+
+    def close_uploads():
+        for upload in uploads:
+            upload.file.close()
+
+    try:
+        if pdf_backend:
+            try:
+                pdf_backend = rag_app.resolve_pdf_backend(pdf_backend)
+            except ValueError as ve:
+                raise HTTPException(status_code=400, detail=str(ve))
+
+        index_type = await database.aio.find_index_type_db(user_id, index_name)
+        if vectordb == VectorDB.faiss and index_type != "FAISS":
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    "Bulk ingestion into FAISS needs an existing FAISS index; "
+                    "create it with /index/insert_data_to_index first."
+                ),
+            )
+        if vectordb == VectorDB.pinecone and index_type == "FAISS":
+            raise HTTPException(
+                status_code=400,
+                detail=f"Index '{index_name}' is a FAISS index.",
+            )
+
+        # Copy every upload into a private buffer; archives are expanded later
+        for file in files:
+            uploads.append(await rag_app.spool_upload_file(file))
+
+        label = files[0].filename if len(files) == 1 else f"{len(files)} files"
+        if index_type == "FAISS":
+            job_id = await database.aio.create_ingest_job(user_id, index_name, label)
+            rag_app.start_ingest_job(
+                job_id,
+                partial(
+                    rag_app.run_faiss_bulk_insert,
+                    user_id=user_id,
+                    index_name=index_name,
+                    uploads=[
+                        (file.filename, upload.file)
+                        for file, upload in zip(files, uploads)
+                    ],
+                    pdf_backend=pdf_backend
+                    or await database.aio.get_index_pdf_backend(user_id, index_name),
+                ),
+                cleanup=close_uploads,
+            )
+            return {
+                "message": f"Bulk ingestion of {len(files)} upload(s) into Index started",
+                "job_id": job_id,
+            }
+
+        if index_type is None:
+            if not pinecone_setup:
+                raise HTTPException(
+                    status_code=400, detail="Pinecone setup details are required."
+                )
+            await database.aio.insert_into_vector_db(
+                user_id, index_name, vectordb.value, pdf_backend
+            )
+            await database.aio.insert_into_pinecone_db(
+                pinecone_setup, user_id, index_name, embedding
+            )
+            pinecone_api_key = pinecone_setup.pinecone_api_key
+            dimension = pinecone_setup.dimension
+        else:
+            stored_setup = await database.aio.get_data_from_pinecone_db(
+                user_id, index_name
+            )
+            pinecone_api_key = stored_setup[1]
+            dimension = stored_setup[5]
+            embedding = stored_setup[6]
+            pdf_backend = pdf_backend or await database.aio.get_index_pdf_backend(
+                user_id, index_name
+            )
+            # Only a new index is provisioned by the job
+            pinecone_setup = None
+
+        job_id = await database.aio.create_ingest_job(user_id, index_name, label)
+        rag_app.start_ingest_job(
+            job_id,
+            partial(
+                rag_app.run_pinecone_bulk_insert,
+                pinecone_api_key=pinecone_api_key,
+                user_id=user_id,
+                index_name=index_name,
+                embedding=embedding,
+                dimension=dimension,
+                uploads=[
+                    (file.filename, upload.file)
+                    for file, upload in zip(files, uploads)
+                ],
+                pdf_backend=pdf_backend,
+                pinecone_setup=pinecone_setup,
+            ),
+            cleanup=close_uploads,
+        )
+        return {
+            "message": f"Bulk ingestion of {len(files)} upload(s) into Index started",
+            "job_id": job_id,
+        }
+
+    except HTTPException as he:
+        close_uploads()
+        raise he
+    except Exception as e:
+        close_uploads()
+        raise HTTPException(
+            status_code=500, detail=f"Error starting bulk ingestion: {str(e)}"
+        )
+
+
 @index_router.post("/update_data_in_index")
 async def update_data_in_index(
     user_id: str = Form(...),
@@ -134,22 +282,14 @@ async def update_data_in_index(
     - file: Uploaded file containing data to be updated
     """
     try:
-
-        # Save the uploaded file
-        filename = f"temp_{file.filename}"
-        file_path = f"media/{filename}"
-        file_data = await file.read()
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_data)
-
         # Determine the index type from the database (e.g., Pinecone or Faiss)
-        index_type = database.get_index_name_type_db(
+        index_type = await database.aio.get_index_name_type_db(
             user_id, index_name
         )  # Function to retrieve the index type from DB
+
         if index_type == "Pinecone":
-            # pass
             # Retrieve Pinecone setup details from the database
-            pinecone_setup = database.get_data_from_pinecone_db(
+            pinecone_setup = await database.aio.get_data_from_pinecone_db(
                 user_id, index_name
             )  # Fetch Pinecone setup
             if not pinecone_setup:
@@ -168,28 +308,75 @@ async def update_data_in_index(
                     detail=f"Pinecone index '{index_name}' does not exist.",
                 )
 
-            # Load and split the document into chunks
-            docs = rag_app.data_splitter(file_path)
-            embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-mpnet-base-v2"
+            # Copy the upload into a private buffer that is parsed in memory
+            upload = await rag_app.spool_upload_file(file)
+
+            # Skip the re-ingest if this exact content was already ingested
+            previous_job_id = await database.aio.find_completed_ingest_job(
+                user_id, index_name, file.filename, upload.sha256
+            )
+            if previous_job_id:
+                upload.file.close()
+                return {
+                    "message": "File is unchanged since the last update",
+                    "job_id": previous_job_id,
+                    "content_hash": upload.sha256,
+                }
+
+            job_id = await database.aio.create_ingest_job(
+                user_id, index_name, file.filename, upload.sha256
             )
 
-            # Update data in Pinecone
-            rag_app.update_data_in_pinecone(
-                embeddings=embeddings,
-                docs=docs,
-                api_key=pinecone_setup[1],
-                index_name=index_name,
+            # Split, embed and replace the file's chunks in the background
+            rag_app.start_ingest_job(
+                job_id,
+                partial(
+                    rag_app.run_pinecone_update,
+                    pinecone_api_key=pinecone_setup[1],
+                    user_id=user_id,
+                    index_name=index_name,
+                    embedding=pinecone_setup[6],
+                    dimension=pinecone_setup[5],
+                    buffer=upload.file,
+                    file_name=file.filename,
+                    pdf_backend=await database.aio.get_index_pdf_backend(
+                        user_id, index_name
+                    ),
+                ),
+                cleanup=upload.file.close,
             )
+            return {
+                "message": "Data update in Index started",
+                "job_id": job_id,
+                "content_hash": upload.sha256,
+            }
 
         elif index_type == "FAISS":
-            # Replace the existing file and update the database
-            database.update_pdf_file(
-                user_id=user_id,
-                index_name=index_name,
-                file_name=filename,
-                file_path=file_path,
+            # Save the uploaded file next to, never over, the one being served
+            filename = f"temp_{file.filename}"
+            file_path = f"media/{filename}"
+            if os.path.exists(file_path):
+                filename = f"temp_{uuid.uuid4().hex[:8]}_{file.filename}"
+                file_path = f"media/{filename}"
+            await rag_app.save_upload_file(file, file_path)
+
+            job_id = await database.aio.create_ingest_job(
+                user_id, index_name, file.filename
+            )
+
+            # Build the next generation in the background; agents keep
+            # querying the current one until it is swapped in
+            rag_app.start_ingest_job(
+                job_id,
+                partial(
+                    rag_app.run_faiss_rebuild,
+                    user_id=user_id,
+                    index_name=index_name,
+                    file_path=file_path,
+                    file_name=filename,
+                ),
             )
+            return {"message": "Data update in Index started", "job_id": job_id}
 
         else:
             raise HTTPException(
@@ -211,19 +398,194 @@ async def delete_index_api(request: PineconeDeleteIndex):
         index_name = request.index_name
         user_id = request.user_id
         # Determine the index type from the database (e.g., Pinecone or Faiss)
-        index_type = database.get_index_name_type_db(
+        index_type = await database.aio.get_index_name_type_db(
             user_id, index_name
         )  # Function to retrieve the index type from DB
         if index_type == "Pinecone":
             pinecone_deleted = rag_app.delete_pinecone_index(user_id, index_name)
             if pinecone_deleted:
-                database.delete_pinecone_index_from_db(user_id, index_name)
+                await database.aio.delete_pinecone_index_from_db(user_id, index_name)
 
         elif index_type == "FAISS":
-            database.delete_pdf_file(user_id, index_name)
-            database.delete_faiss_index_from_db(user_id, index_name)
+            _, file_path, _, _ = await database.aio.get_data_from_faiss_db(
+                user_id, index_name
+            )
+            index_path, _, index_id = await database.aio.get_faiss_index_generation(
+                user_id, index_name
+            )
+            # Indexes built offline or imported from a snapshot have no upload
+            if file_path and os.path.isfile(file_path):
+                await database.aio.delete_pdf_file(user_id, index_name)
+            await database.aio.delete_faiss_index_from_db(user_id, index_name)
+            # Artifacts go once searches still running on them have finished
+            rag_app.drop_faiss_index(user_id, index_name, index_path, index_id)
 
         return {"message": f"Index '{index_name}' deleted successfully."}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting Index: {str(e)}")
+
+
+@index_router.get("/export")
+async def export_index_api(user_id: str, index_name: str):
+    """
+    API endpoint for downloading a FAISS index as a snapshot archive.
+
+    The archive holds the vectors, chunks, embedding model and index spec
+    with per-member checksums; restore it on another node with /index/import.
+    """
+    fd, snapshot_path = tempfile.mkstemp(suffix=".snapshot.tar")
+    os.close(fd)
+    try:
+        await run_in_threadpool(
+            rag_app.export_index_snapshot, user_id, index_name, snapshot_path
+        )
+    except rag_app.SnapshotError as se:
+        os.remove(snapshot_path)
+        raise HTTPException(status_code=400, detail=str(se))
+    except HTTPException:
+        os.remove(snapshot_path)
+        raise
+    except Exception as e:
+        os.remove(snapshot_path)
+        raise HTTPException(
+            status_code=500, detail=f"Error exporting Index: {str(e)}"
+        )
+    return FileResponse(
+        snapshot_path,
+        media_type="application/x-tar",
+        filename=f"{index_name}.snapshot.tar",
+        background=BackgroundTask(os.remove, snapshot_path),
+    )
+
+
+@index_router.post("/import")
+async def import_index_api(
+    user_id: str = Form(...),
+    index_name: str = Form(...),
+    file: UploadFile = File(...),
+):
+    """
+    API endpoint for restoring a FAISS index from a snapshot archive made by
+    /index/export. Every member is verified against its checksum before the
+    index is replaced or created.
+    """
+    upload = None
+    try:
+        upload = await rag_app.spool_upload_file(file, max_bytes=SNAPSHOT_MAX_BYTES)
+        manifest = await run_in_threadpool(
+            rag_app.import_index_snapshot, upload.file, user_id, index_name
+        )
+        return {
+            "message": f"Index '{index_name}' imported successfully.",
+            "embedding": manifest["embedding"],
+            "vectors": manifest["index"]["vectors"],
+            "content_hash": upload.sha256,
+        }
+    except rag_app.SnapshotError as se:
+        raise HTTPException(status_code=400, detail=str(se))
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing Index: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.file.close()
+
+
+@index_router.delete("/delete_document")
+async def delete_document_api(request: DeleteDocumentRequest):
+    """
+    API endpoint for removing a single document from an Index without dropping it.
+
+    Parameters:
+    - user_id: User ID
+    - index_name: Name of the Index
+    - file_name: Name of the file originally uploaded to the Index
+    """
+    try:
+        index_type = await database.aio.get_index_name_type_db(
+            request.user_id, request.index_name
+        )
+        if index_type == "FAISS":
+            # Searches on the index keep running while the chunks are removed
+            deleted = await run_in_threadpool(
+                rag_app.delete_document_from_faiss,
+                request.user_id,
+                request.index_name,
+                request.file_name,
+            )
+            # A later upload of the same content is ingested again
+            await database.aio.delete_ingest_jobs(
+                request.user_id, request.index_name, request.file_name
+            )
+            return {
+                "message": f"Document '{request.file_name}' deleted from Index '{request.index_name}'.",
+                "vectors_deleted": deleted,
+            }
+        if index_type != "Pinecone":
+            raise HTTPException(
+                status_code=400,
+                detail="Deleting single documents is only supported for Pinecone and FAISS indexes.",
+            )
+
+        pinecone_api_key = await database.aio.get_pinecone_api_index_name_type_db(
+            request.user_id, request.index_name
+        )
+        # Reads the file's vector IDs and deletes them over the network
+        deleted = await run_in_threadpool(
+            rag_app.delete_document_from_pinecone,
+            api_key=pinecone_api_key,
+            index_name=request.index_name,
+            user_id=request.user_id,
+            file_name=request.file_name,
+        )
+        await database.aio.delete_ingest_jobs(
+            request.user_id, request.index_name, request.file_name
+        )
+        return {
+            "message": f"Document '{request.file_name}' deleted from Index '{request.index_name}'.",
+            "vectors_deleted": deleted,
+        }
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error deleting document: {str(e)}"
+        )
+
+
+@index_router.get("/lock_metrics")
+async def faiss_lock_metrics_api():
+    """
+    API endpoint reporting, for every FAISS index this worker serves, how
+    often searches (read) and inserts/deletes (write) had to wait for the
+    index lock and for how long.
+    """
+    return {"indexes": rag_app.faiss_lock_stats()}
+
+
+@index_router.get("/jobs/{job_id}")
+async def get_ingest_job_api(job_id: str):
+    """
+    API endpoint reporting the stage, progress, throughput and errors of an
+    ingestion job.
+    """
+    job = await database.aio.run(rag_app.get_ingest_job_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+
+@index_router.post("/jobs/{job_id}/cancel")
+async def cancel_ingest_job_api(job_id: str):
+    """
+    API endpoint for cancelling a queued or running ingestion job.
+    """
+    if not await database.aio.request_ingest_job_cancel(job_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job '{job_id}' not found or already finished.",
+        )
+    return {"message": f"Cancellation of job '{job_id}' requested.", "job_id": job_id}
@@ -7,6 +7,7 @@ from .agent_schemas import (
     UpdateAgentRequest,
 )
 from .index_schemas import (
+    DeleteDocumentRequest,
     PineconeDeleteIndex,
     PineconeSetup,
     VectorDB,
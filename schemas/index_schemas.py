@@ -124,3 +124,9 @@ def get_pinecone_setup(
 class PineconeDeleteIndex(BaseModel):
     user_id: str
     index_name: str
+
+
+class DeleteDocumentRequest(BaseModel):
+    user_id: str
+    index_name: str
+    file_name: str
@@ -0,0 +1,306 @@
+"""
+Production server: a preforking supervisor running uvicorn workers.
+
+The supervisor imports the app, initializes the database and loads the
+embedding models and FAISS indexes once, then forks the workers. Workers
+share those pages copy-on-write instead of each loading its own copy, and
+all of them accept connections from one listening socket. uvloop and
+httptools are used when installed.
+
+Workers are recycled gracefully: each one exits after serving
+WEB_MAX_REQUESTS requests (plus jitter, so they do not all restart at
+once) and is replaced by a fresh fork. SIGHUP replaces every worker, one
+at a time; SIGTERM or SIGINT lets in-flight requests and ingestion jobs
+finish, within WEB_GRACEFUL_TIMEOUT, and stops the server. Jobs of a
+worker that is killed or crashes are marked failed once it is reaped. Code changes
+need a full restart, since workers are forked from the loaded supervisor.
+
+Usage:
+    python serve.py
+    WEB_WORKERS=8 WEB_PORT=8000 python serve.py
+"""
+
+import gc
+import importlib.util
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+# Address the server listens on
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+
+# Worker processes, each with its own event loop and GIL
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+
+# Requests a worker serves before it is replaced, 0 to never recycle, plus a
+# random extra of up to WEB_MAX_REQUESTS_JITTER per worker
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "10000"))
+WEB_MAX_REQUESTS_JITTER = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "1000"))
+
+# Seconds a stopping worker has to finish its requests before it is killed
+WEB_GRACEFUL_TIMEOUT = float(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+
+# Pending connections queued on the listening socket
+WEB_BACKLOG = int(os.getenv("WEB_BACKLOG", "2048"))
+
+# Workers that exit sooner than this after starting are restarted with a delay
+MIN_WORKER_LIFETIME = 1.0
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("serve")
+
+
+def _event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def _http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def preload():
+    """
+    Loads everything the workers share: the app and database, the embedding
+    models of registered indexes and PRELOAD_EMBEDDING_MODELS, and the FAISS
+    index artifacts.
+
+    Models are loaded but never run here, so no inference thread pool exists
+    when the workers are forked. ONNX Runtime models, whose sessions start
+    their threads on load, are exported here and loaded again by each worker.
+
+    Returns:
+    - The ASGI app.
+    """
+    from main import app
+
+    import rag_app
+
+    result = rag_app.preload()
+    logger.info(
+        f"Preloaded {len(result['models'])} embedding models and "
+        f"{result['indexes']} FAISS indexes in {result['seconds']}s."
+    )
+    # Keep the collector from writing to the preloaded objects in the
+    # workers, which would copy the pages holding them
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def bind_socket(host: str = WEB_HOST, port: int = WEB_PORT) -> socket.socket:
+    """Opens the listening socket every worker accepts connections from."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(WEB_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """
+    Forks the workers, replaces those that exit and relays signals.
+
+    Signals only set flags and wake the supervisor through a pipe; workers
+    are started, stopped and reaped from the main loop.
+    """
+
+    def __init__(self, app, sock: socket.socket, workers: int = WEB_WORKERS):
+        self.app = app
+        self.sock = sock
+        self.workers = max(1, workers)
+        # Started time of each live worker, by PID
+        self.children = {}
+        self.stopping = False
+        self.reload_requested = False
+        self._wakeup_r, self._wakeup_w = os.pipe()
+
+    def _handle_signal(self, signum, frame):
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            self.stopping = True
+        elif signum == signal.SIGHUP:
+            self.reload_requested = True
+
+    def _install_signals(self):
+        os.set_blocking(self._wakeup_w, False)
+        signal.set_wakeup_fd(self._wakeup_w)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, self._handle_signal)
+
+    def _wait(self, timeout: float):
+        readable, _, _ = select.select([self._wakeup_r], [], [], timeout)
+        if readable:
+            os.read(self._wakeup_r, 4096)
+
+    def _worker_config(self) -> uvicorn.Config:
+        limit = None
+        if WEB_MAX_REQUESTS > 0:
+            limit = WEB_MAX_REQUESTS + random.randint(0, WEB_MAX_REQUESTS_JITTER)
+        return uvicorn.Config(
+            self.app,
+            loop=_event_loop(),
+            http=_http_protocol(),
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=WEB_GRACEFUL_TIMEOUT,
+            backlog=WEB_BACKLOG,
+        )
+
+    def spawn(self) -> int:
+        """Forks one worker and returns its PID."""
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        # Worker: drop the supervisor's signal setup; uvicorn installs its own
+        signal.set_wakeup_fd(-1)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        random.seed()
+        try:
+            uvicorn.Server(self._worker_config()).run(sockets=[self.sock])
+        except Exception:
+            logger.exception(f"Worker {os.getpid()} crashed.")
+            sys.exit(1)
+        # A normal exit waits for the worker's running ingestion jobs
+        sys.exit(0)
+
+    def _forget(self, pid: int):
+        """
+        Drops an exited worker and fails the ingestion jobs that died with
+        it. Returns the time it was started, or None if it was not a worker.
+        """
+        started = self.children.pop(pid, None)
+        if started is None:
+            return None
+        import database
+
+        try:
+            failed = database.fail_worker_ingest_jobs(pid)
+        except Exception:
+            logger.exception(f"Could not fail the ingestion jobs of worker {pid}.")
+        else:
+            if failed:
+                logger.warning(f"Failed {failed} ingestion jobs of worker {pid}.")
+        return started
+
+    def reap(self) -> list:
+        """Collects exited workers and returns ``(pid, exit status, lifetime)``."""
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self._forget(pid)
+            if started is not None:
+                lifetime = time.monotonic() - started
+                exited.append((pid, os.waitstatus_to_exitcode(status), lifetime))
+        return exited
+
+    def stop_worker(self, pid: int, timeout: float = WEB_GRACEFUL_TIMEOUT):
+        """Asks a worker to finish its work and exit, killing it past ``timeout``."""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                self._forget(pid)
+                return
+            time.sleep(0.1)
+        logger.warning(f"Worker {pid} did not stop within {timeout}s; killing it.")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        self._forget(pid)
+
+    def reload(self):
+        """Replaces every worker, each one only after its replacement is started."""
+        for pid in list(self.children):
+            if self.stopping:
+                return
+            self.spawn()
+            self.stop_worker(pid)
+        logger.info("Replaced all workers.")
+
+    def shutdown(self):
+        """Stops every worker, letting in-flight requests finish."""
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + WEB_GRACEFUL_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning(f"Worker {pid} did not stop in time; killing it.")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self._forget(pid)
+
+    def run(self):
+        self._install_signals()
+        logger.info(
+            f"Serving on {WEB_HOST}:{WEB_PORT} with {self.workers} workers "
+            f"({_event_loop()}, {_http_protocol()})."
+        )
+        for _ in range(self.workers):
+            self.spawn()
+
+        while not self.stopping:
+            for pid, code, lifetime in self.reap():
+                if code == 0:
+                    logger.info(
+                        f"Worker {pid} exited after {lifetime:.0f}s; replacing it."
+                    )
+                else:
+                    logger.warning(f"Worker {pid} exited with status {code}.")
+                if lifetime < MIN_WORKER_LIFETIME:
+                    # Do not spin when workers fail right after starting
+                    time.sleep(MIN_WORKER_LIFETIME)
+            if self.stopping:
+                break
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            while len(self.children) < self.workers and not self.stopping:
+                self.spawn()
+            self._wait(1.0)
+
+        logger.info("Shutting down.")
+        self.shutdown()
+
+
+def main():
+    app = preload()
+    sock = bind_socket()
+    try:
+        Supervisor(app, sock).run()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
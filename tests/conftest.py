@@ -0,0 +1,19 @@
+import pytest
+
+import database
+from database import connection
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Points the metadata store at an empty SQLite file and returns its path."""
+    path = tmp_path / "agentX.db"
+    monkeypatch.setattr(connection, "DATABASE_URL", f"sqlite:///{path}")
+    yield path
+    connection.get_engine().dispose()
+
+
+@pytest.fixture
+def db(db_path):
+    """A metadata store with every table created."""
+    database.init_db()
@@ -0,0 +1,194 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import func, inspect, insert, select
+
+import database
+from database.tables import (
+    faiss_db,
+    file_uploads,
+    ingest_jobs,
+    metadata,
+    multi_agent,
+    vector_db,
+    vector_manifest,
+)
+
+# Tables as created by releases before foreign keys were enforced
+OLD_SCHEMA = """
+CREATE TABLE vector_db (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    index_name TEXT NOT NULL,
+    db_type TEXT NOT NULL
+);
+CREATE TABLE faiss_db (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_name TEXT,
+    file_path TEXT,
+    embedding TEXT NOT NULL,
+    index_name TEXT NOT NULL,
+    user_id TEXT NOT NULL
+);
+CREATE TABLE multi_agent (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    index_name TEXT,
+    llm_provider TEXT NOT NULL,
+    llm_model_name TEXT NOT NULL,
+    llm_api_key TEXT NOT NULL,
+    prompt_template TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES vector_db (user_id)
+);
+INSERT INTO vector_db (user_id, index_name, db_type) VALUES ('user', 'docs', 'FAISS');
+INSERT INTO faiss_db (file_name, file_path, embedding, index_name, user_id)
+VALUES ('notes.pdf', 'media/notes.pdf', 'model', 'docs', 'user');
+INSERT INTO multi_agent (
+    agent_name, user_id, index_name, llm_provider, llm_model_name, llm_api_key,
+    prompt_template
+) VALUES ('helper', 'user', 'docs', 'openai', 'gpt', 'key', 'prompt');
+"""
+
+
+def add_agent(conn, user_id: str, agent_name: str, index_name: str):
+    conn.execute(
+        insert(multi_agent),
+        {
+            "agent_name": agent_name,
+            "user_id": user_id,
+            "index_name": index_name,
+            "llm_provider": "openai",
+            "llm_model_name": "gpt",
+            "llm_api_key": "key",
+            "prompt_template": "prompt",
+        },
+    )
+
+
+def add_faiss_index(user_id: str, index_name: str):
+    database.insert_into_vector_db(user_id, index_name, "FAISS")
+    database.insert_into_faiss_db(
+        user_id, index_name, "notes.pdf", f"media/{index_name}.pdf", "model"
+    )
+
+
+def count_rows(table, **filters) -> int:
+    with database.connect() as conn:
+        query = select(func.count()).select_from(table)
+        for column, value in filters.items():
+            query = query.where(table.c[column] == value)
+        return conn.execute(query).scalar()
+
+
+def test_init_db_creates_every_table(db):
+    database.init_db()
+
+    with database.connect() as conn:
+        tables = set(inspect(conn).get_table_names())
+    assert set(metadata.tables) <= tables
+
+
+def test_init_db_migrates_old_schema(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(OLD_SCHEMA)
+
+    database.init_db()
+
+    with database.connect() as conn:
+        inspector = inspect(conn)
+        assert not inspector.get_foreign_keys("multi_agent")
+        columns = {c["name"] for c in inspector.get_columns("faiss_db")}
+        assert {"index_path", "generation", "last_generation"} <= columns
+        agent = conn.execute(select(multi_agent)).mappings().one()
+    assert (agent["agent_name"], agent["index_name"]) == ("helper", "docs")
+
+    # Writes to both tables are accepted with foreign keys enforced
+    database.insert_into_vector_db("user", "more", "FAISS")
+    with database.transaction() as conn:
+        add_agent(conn, "user", "writer", "more")
+    assert count_rows(multi_agent) == 2
+    assert database.get_faiss_index_generation("user", "docs") == (None, 0, None)
+
+
+def test_deleting_an_index_cascades_to_its_rows(db):
+    add_faiss_index("user", "docs")
+    add_faiss_index("user", "other")
+    for index_name in ("docs", "other"):
+        database.insert_into_file_uploads(
+            "user", index_name, "notes.pdf", f"media/{index_name}.pdf"
+        )
+        database.insert_vector_ids("user", index_name, "f1", "notes.pdf", ["a", "b"])
+        job_id = database.create_ingest_job("user", index_name, "notes.pdf")
+        database.update_ingest_job(job_id, status="completed")
+    with database.transaction() as conn:
+        add_agent(conn, "user", "helper", "docs")
+
+    database.delete_faiss_index_from_db("user", "docs")
+
+    for table in (vector_db, faiss_db, file_uploads, vector_manifest, ingest_jobs):
+        assert count_rows(table, index_name="docs") == 0
+        assert count_rows(table, index_name="other") > 0
+    # Agents outlive their index, detached from it
+    assert count_rows(multi_agent, agent_name="helper") == 1
+    assert count_rows(multi_agent, index_name="docs") == 0
+
+
+def test_insert_ignoring_conflicts_skips_existing_rows(db):
+    add_faiss_index("user", "docs")
+
+    database.insert_vector_ids("user", "docs", "f1", "notes.pdf", ["a", "b"])
+    database.insert_vector_ids("user", "docs", "f1", "notes.pdf", ["b", "c"])
+    database.insert_into_file_uploads("user", "docs", "notes.pdf", "media/a.pdf")
+    database.insert_into_file_uploads("user", "docs", "notes.pdf", "media/b.pdf")
+
+    assert sorted(database.get_vector_ids("user", "docs", "f1")) == ["a", "b", "c"]
+    with database.connect() as conn:
+        paths = conn.execute(select(file_uploads.c.file_path)).scalars().all()
+    assert paths == ["media/a.pdf"]
+
+
+def test_generations_are_allocated_and_published_in_order(db):
+    add_faiss_index("user", "docs")
+
+    first, index_id = database.allocate_faiss_generation("user", "docs")
+    second, _ = database.allocate_faiss_generation("user", "docs")
+    assert (first, second) == (1, 2)
+
+    assert database.publish_faiss_generation("user", "docs", second, "g2") == (
+        True,
+        None,
+        "media/docs.pdf",
+    )
+    # A slower build of an older generation never replaces a newer one
+    assert database.publish_faiss_generation("user", "docs", first, "g1")[0] is False
+    assert database.get_faiss_index_generation("user", "docs") == ("g2", 2, index_id)
+
+    third, _ = database.allocate_faiss_generation("user", "docs")
+    # A change made to a generation that is no longer live is rejected
+    stale = database.publish_faiss_generation(
+        "user", "docs", third, "g3", base_generation=first
+    )
+    assert stale == (False, None, None)
+    published, previous_path, _ = database.publish_faiss_generation(
+        "user", "docs", third, "g3", base_generation=second
+    )
+    assert (published, previous_path) == (True, "g2")
+    assert database.get_faiss_index_generation("user", "docs") == ("g3", 3, index_id)
+
+
+def test_recreated_index_gets_a_new_row(db):
+    add_faiss_index("user", "docs")
+    _, old_id = database.allocate_faiss_generation("user", "docs")
+    database.delete_faiss_index_from_db("user", "docs")
+    add_faiss_index("user", "docs")
+
+    generation, new_id = database.allocate_faiss_generation("user", "docs")
+
+    assert generation == 1
+    assert new_id != old_id
+
+
+def test_allocating_for_a_missing_index_fails(db):
+    with pytest.raises(Exception):
+        database.allocate_faiss_generation("user", "missing")
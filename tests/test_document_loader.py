@@ -0,0 +1,70 @@
+import io
+
+import pytest
+from langchain_core.documents import Document
+
+from rag_app import document_loader
+from rag_app.document_loader import iter_split_documents, read_data_from_buffer
+
+
+def page(text: str, number: int) -> Document:
+    return Document(page_content=text, metadata={"page": number})
+
+
+def test_split_carries_overlap_across_pages():
+    pages = [
+        page("one two three\nfour five six", 1),
+        page("seven eight\nnine ten", 2),
+        page("  ", 3),
+        page(" eleven", 4),
+    ]
+
+    chunks = list(iter_split_documents(pages, chunk_size=20, chunk_overlap=10))
+
+    assert [(c.page_content, c.metadata["page"]) for c in chunks] == [
+        ("one two three", 1),
+        ("four five six", 1),
+        # The tail of page 1 starts page 2, joined at a line break
+        ("five six\nseven eight", 2),
+        ("nine ten", 2),
+        # Blank pages are skipped; a page starting with whitespace is joined as is
+        ("nine ten eleven", 4),
+    ]
+
+
+def test_split_without_overlap_keeps_pages_apart():
+    pages = [page("alpha beta", 1), page("gamma", 2)]
+
+    chunks = list(iter_split_documents(pages, chunk_size=20, chunk_overlap=0))
+
+    assert [c.page_content for c in chunks] == ["alpha beta", "gamma"]
+
+
+def test_text_blocks_keep_words_whole(monkeypatch):
+    monkeypatch.setattr(document_loader, "TEXT_BLOCK_SIZE", 8)
+    text = "alpha beta gamma delta"
+
+    blocks = read_data_from_buffer(io.BytesIO(text.encode()), "notes.txt")
+
+    assert [b.page_content for b in blocks] == ["alpha", " beta", " gamma delta"]
+    assert "".join(b.page_content for b in blocks) == text
+    assert {b.metadata["source"] for b in blocks} == {"notes.txt"}
+
+
+def test_text_blocks_cut_only_words_longer_than_two_blocks(monkeypatch):
+    monkeypatch.setattr(document_loader, "TEXT_BLOCK_SIZE", 4)
+
+    blocks = read_data_from_buffer(io.BytesIO(b"abcdefghij kl"), "notes.txt")
+
+    assert [b.page_content for b in blocks] == ["abcdefgh", "ij", " kl"]
+
+
+def test_short_text_is_one_block():
+    blocks = read_data_from_buffer(io.BytesIO(b"hi there"), "notes.txt")
+
+    assert [b.page_content for b in blocks] == ["hi there"]
+
+
+def test_unsupported_buffers_are_rejected():
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        list(document_loader.iter_documents_from_buffer(io.BytesIO(b""), "a.docx"))
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from rag_app.embed_batching import MicroBatcher
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting for the batcher"
+        time.sleep(0.001)
+
+
+class Model:
+    """Embeds each text as ``[text]``; the first call blocks until released."""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.release = threading.Event()
+        self.error = error
+
+    def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        if len(self.calls) == 1:
+            self.release.wait(5)
+        elif self.error is not None:
+            raise self.error
+        return [[text] for text in texts]
+
+
+def run_callers(batcher, model, requests):
+    """
+    Embeds ``requests`` concurrently while a first batch is running, so they
+    all join the next one, and returns each caller's result or error.
+    """
+    results = {}
+
+    def call(name, texts):
+        try:
+            results[name] = batcher.embed(texts)
+        except Exception as e:
+            results[name] = e
+
+    first = threading.Thread(target=call, args=("first", ["a"]))
+    first.start()
+    wait_until(lambda: len(model.calls) == 1)
+    threads = [
+        threading.Thread(target=call, args=(name, texts))
+        for name, texts in requests.items()
+    ]
+    for thread in threads:
+        thread.start()
+    joined = sum(len(texts) for texts in requests.values())
+    wait_until(lambda: batcher._open is not None and len(batcher._open.texts) == joined)
+    model.release.set()
+    for thread in [first, *threads]:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_calls_share_a_batch_and_get_their_own_rows():
+    model = Model()
+    batcher = MicroBatcher(model.embed_batch, window=0.01, max_batch=8)
+
+    results = run_callers(batcher, model, {"b": ["b1", "b2"], "c": ["c1"]})
+
+    assert len(model.calls) == 2
+    assert sorted(model.calls[1]) == ["b1", "b2", "c1"]
+    assert results == {"first": [["a"]], "b": [["b1"], ["b2"]], "c": [["c1"]]}
+
+
+def test_a_failed_batch_raises_in_every_caller():
+    error = RuntimeError("model crashed")
+    model = Model(error=error)
+    batcher = MicroBatcher(model.embed_batch, window=0.01, max_batch=8)
+
+    results = run_callers(batcher, model, {"b": ["b1", "b2"], "c": ["c1"]})
+
+    assert results["first"] == [["a"]]
+    assert results["b"] is error
+    assert results["c"] is error
+    # The next batch is unaffected
+    model.error = None
+    assert batcher.embed(["d"]) == [["d"]]
+
+
+@pytest.mark.parametrize(
+    "window, max_batch, texts", [(0, 8, ["a"]), (0.01, 2, ["a", "b"])]
+)
+def test_unbatched_calls_are_embedded_directly(window, max_batch, texts):
+    calls = []
+
+    def embed_batch(batch):
+        calls.append(batch)
+        return [[text] for text in batch]
+
+    batcher = MicroBatcher(embed_batch, window=window, max_batch=max_batch)
+
+    assert batcher.embed(texts) == [[text] for text in texts]
+    assert calls == [texts]
+    assert batcher._open is None
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from rag_app.index_lock import ReadWriteLock
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting for the lock"
+        time.sleep(0.001)
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    both_inside = threading.Barrier(2, timeout=5)
+
+    def reader():
+        with lock.read():
+            both_inside.wait()
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert lock.stats()["read"]["acquired"] == 2
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    events = []
+    lock.acquire_read()
+
+    def writer():
+        with lock.write():
+            events.append("write")
+
+    def late_reader():
+        with lock.read():
+            events.append("read")
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    wait_until(lambda: lock._writers_waiting == 1)
+    reader_thread = threading.Thread(target=late_reader)
+    reader_thread.start()
+    wait_until(lambda: lock._readers_waiting == 1)
+
+    # Neither may enter while the first reader still holds the lock
+    assert events == []
+    lock.release_read()
+    writer_thread.join(5)
+    reader_thread.join(5)
+
+    assert events == ["write", "read"]
+    assert lock.stats()["write"]["contended"] == 1
+
+
+def test_readers_waiting_on_a_writer_go_before_the_next_writer():
+    lock = ReadWriteLock()
+    events = []
+    lock.acquire_write()
+
+    def reader():
+        with lock.read():
+            events.append("read")
+
+    def writer():
+        with lock.write():
+            events.append("write")
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    wait_until(lambda: lock._readers_waiting == 1)
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    wait_until(lambda: lock._writers_waiting == 1)
+
+    lock.release_write()
+    reader_thread.join(5)
+    writer_thread.join(5)
+
+    assert events == ["read", "write"]
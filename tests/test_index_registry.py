@@ -0,0 +1,150 @@
+import pytest
+
+import database
+from rag_app import index_registry
+from rag_app.index_registry import IndexRegistry, publish_faiss_index
+
+KEY = ("user", "docs")
+
+
+class Store:
+    """Stands in for a loaded FAISS store."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = None
+
+    @classmethod
+    def from_store(cls, store, lock=None):
+        store.lock = lock
+        return store
+
+
+@pytest.fixture(autouse=True)
+def fake_locked_faiss(monkeypatch):
+    monkeypatch.setattr(index_registry, "LockedFAISS", Store)
+
+
+def test_pin_loads_once_and_shares_the_generation():
+    registry = IndexRegistry()
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        return Store(path)
+
+    first = registry.pin(KEY, "gen1", (1, 1), load)
+    second = registry.pin(KEY, "gen1", (1, 1), load)
+
+    assert first is second
+    assert first.refs == 2
+    assert loads == ["gen1"]
+    assert first.vector_store.lock is registry.lock(KEY)
+    registry.release(first)
+    registry.release(second)
+    assert first.refs == 0
+    assert first.vector_store is not None
+
+
+def test_publish_frees_the_previous_generation_once_drained():
+    registry = IndexRegistry()
+    released = []
+    old = registry.pin(KEY, "gen1", (1, 1), Store)
+
+    assert registry.publish(
+        KEY, (1, 2), "gen2", Store("gen2"), lambda: released.append("gen1")
+    )
+
+    # The running search keeps the generation it pinned
+    assert old.retired and old.vector_store is not None
+    assert released == []
+    with registry.acquire(KEY, "gen2", (1, 2), Store) as store:
+        assert store.name == "gen2"
+    registry.release(old)
+    assert old.vector_store is None
+    assert released == ["gen1"]
+
+
+def test_publish_of_an_older_version_is_ignored():
+    registry = IndexRegistry()
+    registry.publish(KEY, (1, 3), "gen3", Store("gen3"))
+
+    assert not registry.publish(KEY, (1, 2), "gen2", Store("gen2"))
+    assert registry.current(KEY).version == (1, 3)
+    # A recreated index has a newer row id, whatever its generation
+    assert registry.publish(KEY, (2, 1), "gen1", Store("gen1"))
+    assert registry.current(KEY).version == (2, 1)
+
+
+def test_evict_releases_after_running_searches():
+    registry = IndexRegistry()
+    released = []
+    entry = registry.pin(KEY, "gen1", (1, 1), Store)
+
+    registry.evict(KEY, lambda: released.append(True))
+
+    assert registry.current(KEY) is None
+    assert released == []
+    registry.release(entry)
+    assert released == [True]
+    registry.evict(KEY, lambda: released.append(True))
+    assert released == [True, True]
+
+
+def test_forget_drops_matching_generations_without_releasing_them():
+    registry = IndexRegistry()
+    released = []
+    registry.publish(KEY, (1, 1), "gen1", Store("gen1"))
+    registry.publish(("user", "other"), (2, 1), "gen1", Store("keep"))
+    registry.current(KEY).on_released = lambda: released.append(True)
+
+    registry.forget(lambda store: store.name == "gen1")
+
+    assert registry.current(KEY) is None
+    assert registry.current(("user", "other")) is not None
+    assert released == []
+
+
+def test_publish_faiss_index_rejects_a_change_to_a_replaced_generation(
+    db, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(index_registry, "INDEX_REGISTRY", IndexRegistry())
+    database.insert_into_vector_db("user", "docs", "FAISS")
+    database.insert_into_faiss_db("user", "docs", "notes.txt", "notes.txt", "model")
+
+    def write(name):
+        def save(path):
+            return {"embedding": "model", "name": name}
+
+        return save
+
+    first = publish_faiss_index(
+        "user", "docs", write("a"), Store("a"), index_path=str(tmp_path / "a")
+    )
+    _, generation, index_id = database.get_faiss_index_generation("user", "docs")
+    assert first["generation"] == generation == 1
+
+    second = publish_faiss_index(
+        "user",
+        "docs",
+        write("b"),
+        Store("b"),
+        index_path=str(tmp_path / "b"),
+        base_version=(index_id, 1),
+    )
+    assert second["generation"] == 2
+
+    # A change made to generation 1 would drop generation 2's changes
+    with pytest.raises(RuntimeError):
+        publish_faiss_index(
+            "user",
+            "docs",
+            write("c"),
+            Store("c"),
+            index_path=str(tmp_path / "c"),
+            base_version=(index_id, 1),
+        )
+
+    index_path, generation, _ = database.get_faiss_index_generation("user", "docs")
+    assert (index_path, generation) == (str(tmp_path / "b"), 2)
+    assert index_registry.INDEX_REGISTRY.current(("user", "docs")) is None
@@ -0,0 +1,73 @@
+import io
+import tarfile
+
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from rag_app.faiss_store import read_faiss_docstore, save_faiss_index
+from rag_app.index_snapshot import (
+    SNAPSHOT_DOCSTORE,
+    SnapshotError,
+    read_snapshot,
+    restore_snapshot,
+    write_snapshot,
+)
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    store = FAISS.from_texts(["alpha", "beta"], FakeEmbeddings(size=4))
+    save_faiss_index(store, str(tmp_path / "index"), {"embedding": "fake"})
+    path = tmp_path / "docs.snapshot.tar"
+    write_snapshot(str(tmp_path / "index"), str(path), "docs")
+    return path
+
+
+def rewrite_member(snapshot, name: str, change) -> bytes:
+    """Returns the archive with member ``name`` replaced by ``change(data)``."""
+    out = io.BytesIO()
+    with tarfile.open(snapshot) as source, tarfile.open(fileobj=out, mode="w") as tar:
+        for member in source:
+            data = source.extractfile(member).read()
+            if member.name == name:
+                data = change(data)
+                member.size = len(data)
+            tar.addfile(member, io.BytesIO(data))
+    return out.getvalue()
+
+
+def test_snapshot_round_trip(snapshot, tmp_path):
+    with open(snapshot, "rb") as f:
+        manifest = restore_snapshot(f, str(tmp_path / "restored"))
+
+    assert manifest["index_name"] == "docs"
+    assert manifest["index"]["vectors"] == 2
+    docstore, index_to_docstore_id = read_faiss_docstore(str(tmp_path / "restored"))
+    assert [
+        docstore.search(index_to_docstore_id[i]).page_content for i in range(2)
+    ] == ["alpha", "beta"]
+
+
+def test_tampered_member_is_rejected(snapshot, tmp_path):
+    tampered = rewrite_member(
+        snapshot, SNAPSHOT_DOCSTORE, lambda data: data.replace(b"alpha", b"omega")
+    )
+
+    with pytest.raises(SnapshotError, match="Checksum mismatch"):
+        read_snapshot(io.BytesIO(tampered))
+    with pytest.raises(SnapshotError):
+        restore_snapshot(io.BytesIO(tampered), str(tmp_path / "restored"))
+
+    # Nothing is installed, and no staging folder is left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "docs.snapshot.tar",
+        "index",
+    ]
+
+
+def test_truncated_snapshot_is_rejected(snapshot):
+    data = snapshot.read_bytes()
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(io.BytesIO(data[: len(data) // 2]))
@@ -0,0 +1,65 @@
+import itertools
+
+import pytest
+
+from rag_app.ingest_pipeline import IngestPipeline, iter_windows
+
+
+def test_stages_pass_items_through_in_order():
+    with IngestPipeline(queue_size=2) as pipeline:
+        numbers = pipeline.stage("parse", iter(range(10)))
+        squares = pipeline.stage("split", (n * n for n in numbers))
+        assert list(squares) == [n * n for n in range(10)]
+
+
+def test_stage_error_reaches_the_reader():
+    closed = []
+
+    def failing():
+        yield 1
+        yield 2
+        raise ValueError("bad page")
+
+    def downstream(items):
+        try:
+            yield from items
+        finally:
+            closed.append(True)
+
+    received = []
+    with pytest.raises(ValueError, match="bad page"):
+        with IngestPipeline(queue_size=1) as pipeline:
+            pages = pipeline.stage("parse", failing())
+            for item in pipeline.stage("split", downstream(pages)):
+                received.append(item)
+
+    assert received == [1, 2]
+    assert closed == [True]
+
+
+def test_close_stops_stages_blocked_on_a_full_queue():
+    produced = []
+    closed = []
+
+    def endless():
+        try:
+            for n in itertools.count():
+                produced.append(n)
+                yield n
+        finally:
+            closed.append(True)
+
+    with IngestPipeline(queue_size=1) as pipeline:
+        items = pipeline.stage("parse", endless())
+        assert next(items) == 0
+        # The reader stops early, as when a job is cancelled
+
+    assert closed == [True]
+    assert not any(thread.is_alive() for thread in pipeline._threads)
+    # The bounded queue kept the producer from running ahead
+    assert len(produced) <= 4
+
+
+def test_iter_windows():
+    assert list(iter_windows(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_windows([], 2)) == []
@@ -0,0 +1,66 @@
+import os
+import socket
+import subprocess
+import sys
+
+from sqlalchemy import update
+
+import database
+from database.tables import ingest_jobs
+
+
+def exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def add_job(worker: str, status: str = "running") -> str:
+    job_id = database.create_ingest_job("user", "docs", "notes.txt")
+    with database.transaction() as conn:
+        conn.execute(
+            update(ingest_jobs)
+            .where(ingest_jobs.c.id == job_id)
+            .values(worker=worker, status=status)
+        )
+    return job_id
+
+
+def status(job_id: str) -> str:
+    return database.get_ingest_job(job_id)["status"]
+
+
+def test_jobs_record_their_worker(db):
+    job_id = database.create_ingest_job("user", "docs", "notes.txt")
+
+    job = database.get_ingest_job(job_id)
+
+    assert job["worker"] == f"{socket.gethostname()}:{os.getpid()}"
+
+
+def test_fail_interrupted_jobs_only_fails_exited_local_workers(db):
+    host = socket.gethostname()
+    live = add_job(f"{host}:{os.getpid()}")
+    dead = add_job(f"{host}:{exited_pid()}")
+    queued = add_job(f"{host}:{exited_pid()}", status="queued")
+    other_host = add_job(f"not-{host}:{exited_pid()}")
+    finished = add_job(f"{host}:{exited_pid()}", status="completed")
+
+    assert database.fail_interrupted_ingest_jobs() == 2
+
+    assert status(dead) == status(queued) == "failed"
+    assert database.get_ingest_job(dead)["finished_at"] is not None
+    assert status(live) == status(other_host) == "running"
+    assert status(finished) == "completed"
+
+
+def test_fail_worker_jobs_fails_only_that_worker(db):
+    pid = exited_pid()
+    host = socket.gethostname()
+    mine = add_job(f"{host}:{pid}")
+    other = add_job(f"{host}:{os.getpid()}")
+
+    assert database.fail_worker_ingest_jobs(pid) == 1
+
+    assert status(mine) == "failed"
+    assert status(other) == "running"
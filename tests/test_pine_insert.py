@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.documents import Document
+
+import database
+from rag_app import pine_insert
+
+DIMENSION = 4
+
+
+class StubPinecone(ThreadingHTTPServer):
+    """
+    Local stand-in for the data plane of a Pinecone index.
+
+    Stores upserted vectors by ID and answers the first ``fail_first``
+    upserts, or every upsert after ``succeed_first`` ones, with
+    ``fail_status``. Tracks how many upserts were in flight at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.url = f"http://127.0.0.1:{self.server_port}"
+        self.vectors = {}
+        self.upserts = []
+        self.fail_first = 0
+        self.succeed_first = None
+        self.fail_status = 503
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def upsert(self, vectors: list):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            attempt = len(self.upserts)
+            self.upserts.append([vector["id"] for vector in vectors])
+            failed = attempt < self.fail_first or (
+                self.succeed_first is not None and attempt >= self.succeed_first
+            )
+        try:
+            time.sleep(self.delay)
+            if failed:
+                return self.fail_status, {"error": {"message": "stub failure"}}
+            with self.lock:
+                for vector in vectors:
+                    self.vectors[vector["id"]] = vector
+            return 200, {"upsertedCount": len(vectors)}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/vectors/upsert":
+            status, reply = self.server.upsert(body["vectors"])
+        else:
+            status, reply = 404, {}
+        payload = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0, 0.0, 0.0] for text in texts]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubPinecone()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # Reached through the same setting as any other stand-in server
+    monkeypatch.setattr(pine_insert, "PINECONE_INDEX_HOST", server.url)
+    monkeypatch.setattr(pine_insert, "UPSERT_BACKOFF_SECONDS", 0.001)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_vectors(count: int):
+    return (
+        {"id": f"v{i}", "values": [float(i), 0.0, 0.0, 0.0], "metadata": {}}
+        for i in range(count)
+    )
+
+
+def test_upsert_vectors_bounds_batches_in_flight(stub):
+    stub.delay = 0.05
+    index = pine_insert.open_pinecone_index("test", "docs")
+    acked = []
+
+    upserted = pine_insert.upsert_vectors(
+        index, make_vectors(450), on_batch_acked=acked.extend, max_in_flight=2
+    )
+
+    assert upserted == 450
+    assert [len(ids) for ids in stub.upserts] == [100, 100, 100, 100, 50]
+    assert stub.max_in_flight == 2
+    assert sorted(acked) == sorted(stub.vectors) == sorted(f"v{i}" for i in range(450))
+
+
+def test_upsert_vectors_retries_transient_errors(stub):
+    stub.fail_first = 2
+    index = pine_insert.open_pinecone_index("test", "docs")
+
+    assert pine_insert.upsert_vectors(index, make_vectors(10)) == 10
+    assert len(stub.upserts) == 3
+    assert len(stub.vectors) == 10
+
+
+def test_upsert_vectors_gives_up_after_max_retries(stub, monkeypatch):
+    monkeypatch.setattr(pine_insert, "UPSERT_MAX_RETRIES", 2)
+    stub.fail_first = 10
+    index = pine_insert.open_pinecone_index("test", "docs")
+
+    with pytest.raises(Exception) as error:
+        pine_insert.upsert_vectors(index, make_vectors(10))
+    assert pine_insert._is_transient(error.value)
+    assert len(stub.upserts) == 3
+    assert not stub.vectors
+
+
+def test_upsert_vectors_does_not_retry_client_errors(stub):
+    stub.fail_first = 1
+    stub.fail_status = 400
+    index = pine_insert.open_pinecone_index("test", "docs")
+
+    with pytest.raises(Exception):
+        pine_insert.upsert_vectors(index, make_vectors(10))
+    assert len(stub.upserts) == 1
+
+
+def test_insert_resumes_after_acknowledged_batches(db, stub):
+    database.insert_into_vector_db("user", "docs", "Pinecone")
+    docs = [Document(page_content=f"chunk {i}") for i in range(250)]
+
+    def insert():
+        return pine_insert.insert_data_to_pinecone(
+            FakeEmbeddings(),
+            docs,
+            api_key="test",
+            index_name="docs",
+            user_id="user",
+            file_name="notes.txt",
+            dimension=DIMENSION,
+        )
+
+    # Only the first upsert is acknowledged; the ingest fails after it
+    stub.succeed_first = 1
+    stub.fail_status = 400
+    with pytest.raises(Exception):
+        insert()
+    acknowledged = set(stub.upserts[0])
+    file_id = pine_insert.make_file_id("user", "docs", "notes.txt")
+    assert set(database.get_vector_ids("user", "docs", file_id)) == acknowledged
+
+    stub.succeed_first = None
+    stub.upserts.clear()
+    assert insert() == 250
+
+    resent = [vector_id for ids in stub.upserts for vector_id in ids]
+    assert acknowledged.isdisjoint(resent)
+    assert len(resent) == 250 - len(acknowledged)
+    assert len(stub.vectors) == 250
+    assert len(database.get_vector_ids("user", "docs", file_id)) == 250
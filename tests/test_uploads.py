@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from rag_app.uploads import save_upload_file, spool_upload_file
+
+
+def make_upload(data: bytes, name: str = "notes.txt") -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=name)
+
+
+def test_save_upload_file_streams_and_hashes(tmp_path):
+    data = b"0123456789" * 1000
+    dest = tmp_path / "notes.txt"
+
+    saved = asyncio.run(save_upload_file(make_upload(data), str(dest), chunk_size=64))
+
+    assert dest.read_bytes() == data
+    assert saved.size == len(data)
+    assert saved.sha256 == hashlib.sha256(data).hexdigest()
+    assert [p.name for p in tmp_path.iterdir()] == ["notes.txt"]
+
+
+def test_save_upload_file_rejects_oversized_uploads(tmp_path):
+    dest = tmp_path / "notes.txt"
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(
+            save_upload_file(make_upload(b"x" * 100), str(dest), max_bytes=99)
+        )
+
+    assert error.value.status_code == 413
+    # Neither the destination nor a partial file is left behind
+    assert not list(tmp_path.iterdir())
+
+
+def test_concurrent_uploads_to_one_path_never_mix(tmp_path):
+    dest = str(tmp_path / "notes.txt")
+    uploads = [bytes([65 + i]) * 10000 for i in range(4)]
+
+    async def save_all():
+        saves = [
+            save_upload_file(make_upload(data), dest, chunk_size=7) for data in uploads
+        ]
+        return await asyncio.gather(*saves)
+
+    asyncio.run(save_all())
+
+    with open(dest, "rb") as f:
+        assert f.read() in uploads
+    assert [p.name for p in tmp_path.iterdir()] == ["notes.txt"]
+
+
+def test_spool_upload_file_returns_a_rewound_buffer(tmp_path):
+    data = b"abc" * 50
+
+    upload = asyncio.run(spool_upload_file(make_upload(data), max_memory=16))
+
+    with upload.file:
+        assert upload.file.read() == data
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.size == len(data)
+
+
+def test_spool_upload_file_rejects_oversized_uploads():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(spool_upload_file(make_upload(b"x" * 100), max_bytes=10))
+    assert error.value.status_code == 413